@@ -0,0 +1,255 @@
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# PyMuPDF span flag: 굵은 글꼴
+BOLD_FLAG = 16
+
+
+@dataclass
+class Chunk:
+    """구조 정보가 포함된 청크"""
+    text: str
+    page: int
+    page_end: int
+    section: str
+    chunk_type: str = "text"  # text, table
+    tokens: int = 0
+
+
+class StructuredPDFChunker:
+    """PyMuPDF 블록/폰트 정보를 이용해 제목 단위로 분할하는 청커
+
+    - 본문보다 큰 글꼴(또는 짧은 굵은 줄)을 제목으로 보고 섹션 경로를 만든다.
+    - 표는 하나의 청크로 유지한다.
+    - 청크 크기는 tiktoken 토큰 수로 측정한다.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        max_tokens: int = 512,
+        min_tokens: int = 64,
+        overlap_tokens: int = 50,
+        heading_ratio: float = 1.15,
+        sample_pages: int = 20
+    ):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.overlap_tokens = overlap_tokens
+        self.heading_ratio = heading_ratio
+        self.sample_pages = sample_pages
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text))
+
+    def chunk_pdf(self, pdf_path: str) -> List[Chunk]:
+        """PDF 파일을 구조 단위 청크로 분할"""
+        return list(self.iter_pdf_chunks(pdf_path))
+
+    def chunk_document(self, doc) -> List[Chunk]:
+        """열린 PyMuPDF 문서를 구조 단위 청크로 분할"""
+        return list(self.iter_chunks(doc))
+
+    def iter_pdf_chunks(self, pdf_path: str) -> Iterator[Chunk]:
+        """PDF 파일을 페이지 단위로 읽으며 청크를 순차 생성"""
+        with fitz.open(pdf_path) as doc:
+            yield from self.iter_chunks(doc)
+
+    def iter_chunks(self, doc) -> Iterator[Chunk]:
+        """페이지를 하나씩 처리하며 완성된 청크를 즉시 반환 (문서 크기와 무관한 메모리 사용)"""
+        body_size = self._body_font_size(doc)
+
+        # 섹션 스택: (글꼴 크기, 제목)
+        section_stack: List[Tuple[float, str]] = []
+        # 현재 섹션 버퍼: (텍스트, 페이지, 토큰 수)
+        buffer: List[Tuple[str, int, int]] = []
+        buffer_section = ""
+        buffer_has_body = False
+
+        for page_index in range(len(doc)):
+            page_no = page_index + 1
+            items = self._page_items(doc.load_page(page_index))
+
+            for kind, payload in items:
+                if kind == "table":
+                    yield from self._flush(buffer, buffer_section)
+                    buffer, buffer_has_body = [], False
+                    yield Chunk(
+                        text=payload,
+                        page=page_no,
+                        page_end=page_no,
+                        section=self._section_path(section_stack),
+                        chunk_type="table",
+                        tokens=self.count_tokens(payload)
+                    )
+                    continue
+
+                text, size, bold = payload
+                if self._is_heading(text, size, bold, body_size):
+                    # 짧은 섹션은 다음 섹션과 합쳐 청크 수를 줄인다
+                    if buffer_has_body and sum(t for _, _, t in buffer) >= self.min_tokens:
+                        yield from self._flush(buffer, buffer_section)
+                        buffer, buffer_has_body = [], False
+
+                    while section_stack and section_stack[-1][0] <= size:
+                        section_stack.pop()
+                    section_stack.append((size, text))
+
+                    # 본문 없이 제목만 쌓인 경우 가장 깊은 섹션 경로를 사용
+                    if not buffer_has_body:
+                        buffer_section = self._section_path(section_stack)
+                else:
+                    if not buffer:
+                        buffer_section = self._section_path(section_stack)
+                    buffer_has_body = True
+
+                buffer.append((text, page_no, self.count_tokens(text)))
+
+            # 제목 없이 이어지는 긴 본문이 버퍼에 무한히 쌓이지 않도록 분할
+            if sum(t for _, _, t in buffer) > self.max_tokens * 4:
+                yield from self._flush(buffer, buffer_section)
+                buffer, buffer_has_body = [], False
+
+            # MuPDF 내부 캐시 정리
+            fitz.TOOLS.store_shrink(100)
+
+        yield from self._flush(buffer, buffer_section)
+
+    def _body_font_size(self, doc) -> float:
+        """앞쪽 페이지를 샘플링하여 본문 글꼴 크기(문자 수 기준 최빈값) 추정"""
+        sizes = Counter()
+        for page_index in range(min(len(doc), self.sample_pages)):
+            page_dict = doc[page_index].get_text("dict")
+            for block in page_dict.get("blocks", []):
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        sizes[round(span["size"], 1)] += len(span["text"].strip())
+        if not sizes:
+            return 0.0
+        return sizes.most_common(1)[0][0]
+
+    def _page_items(self, page):
+        """페이지의 텍스트 블록과 표를 읽기 순서대로 반환"""
+        items = []
+
+        table_rects = []
+        try:
+            for table in page.find_tables().tables:
+                rect = fitz.Rect(table.bbox)
+                table_text = self._table_text(table)
+                if table_text:
+                    table_rects.append(rect)
+                    items.append((rect.y0, rect.x0, "table", table_text))
+        except Exception as e:
+            logger.warning(f"Table detection failed on page {page.number + 1}: {e}")
+
+        for block in page.get_text("dict").get("blocks", []):
+            if block.get("type") != 0:
+                continue
+            rect = fitz.Rect(block["bbox"])
+            if any(rect.intersects(t) for t in table_rects):
+                continue
+
+            lines = []
+            max_size = 0.0
+            bold = True
+            for line in block.get("lines", []):
+                line_text = "".join(span["text"] for span in line.get("spans", []))
+                if line_text.strip():
+                    lines.append(line_text.strip())
+                for span in line.get("spans", []):
+                    if not span["text"].strip():
+                        continue
+                    max_size = max(max_size, span["size"])
+                    bold = bold and bool(span["flags"] & BOLD_FLAG)
+
+            text = " ".join(lines).strip()
+            if text:
+                items.append((rect.y0, rect.x0, "text", (text, round(max_size, 1), bold)))
+
+        items.sort(key=lambda item: (item[0], item[1]))
+        return [(kind, payload) for _, _, kind, payload in items]
+
+    @staticmethod
+    def _table_text(table) -> str:
+        rows = []
+        for row in table.extract():
+            cells = [(cell or "").replace("\n", " ").strip() for cell in row]
+            if any(cells):
+                rows.append(" | ".join(cells))
+        return "\n".join(rows)
+
+    def _is_heading(self, text: str, size: float, bold: bool, body_size: float) -> bool:
+        if len(text) > 200:
+            return False
+        if body_size and size >= body_size * self.heading_ratio:
+            return True
+        return bold and len(text.split()) <= 15
+
+    @staticmethod
+    def _section_path(section_stack: List[Tuple[float, str]]) -> str:
+        return " > ".join(title for _, title in section_stack)
+
+    def _flush(self, buffer: List[Tuple[str, int, int]], section: str) -> List[Chunk]:
+        """섹션 버퍼를 max_tokens 이하의 청크로 변환"""
+        if not buffer:
+            return []
+
+        pieces: List[Tuple[str, int, int]] = []
+        for text, page_no, tokens in buffer:
+            if tokens > self.max_tokens:
+                pieces.extend(self._split_long(text, page_no))
+            else:
+                pieces.append((text, page_no, tokens))
+
+        chunks = []
+        current: List[Tuple[str, int, int]] = []
+        current_tokens = 0
+        for piece in pieces:
+            if current and current_tokens + piece[2] > self.max_tokens:
+                chunks.append(self._make_chunk(current, section))
+                current = self._overlap_tail(current)
+                current_tokens = sum(t for _, _, t in current)
+                if current_tokens + piece[2] > self.max_tokens:
+                    current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece[2]
+
+        if current:
+            chunks.append(self._make_chunk(current, section))
+        return chunks
+
+    def _split_long(self, text: str, page_no: int) -> List[Tuple[str, int, int]]:
+        """max_tokens를 넘는 단락을 토큰 단위로 분할"""
+        token_ids = self.tokenizer.encode(text)
+        step = max(self.max_tokens - self.overlap_tokens, 1)
+        pieces = []
+        for start in range(0, len(token_ids), step):
+            window = token_ids[start:start + self.max_tokens]
+            pieces.append((self.tokenizer.decode(window), page_no, len(window)))
+            if start + self.max_tokens >= len(token_ids):
+                break
+        return pieces
+
+    def _overlap_tail(self, pieces: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+        """다음 청크로 이어질 마지막 단락 (overlap_tokens 이하일 때만)"""
+        if self.overlap_tokens and pieces and pieces[-1][2] <= self.overlap_tokens:
+            return [pieces[-1]]
+        return []
+
+    @staticmethod
+    def _make_chunk(pieces: List[Tuple[str, int, int]], section: str) -> Chunk:
+        return Chunk(
+            text="\n".join(text for text, _, _ in pieces),
+            page=pieces[0][1],
+            page_end=pieces[-1][1],
+            section=section,
+            tokens=sum(t for _, _, t in pieces)
+        )
@@ -0,0 +1,135 @@
+import re
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+HASH_BITS = 64
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """단어 shingle 기반 64비트 SimHash"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * HASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(HASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit in range(HASH_BITS):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ChunkDeduplicator:
+    """SimHash + LSH 밴딩으로 근사 중복 청크 탐지
+
+    64비트 지문을 bands개 구간으로 나누어 색인한다. 해밍 거리가
+    max_distance 이하인 두 지문은 (bands > max_distance 이면) 적어도 한
+    구간이 정확히 일치하므로 후보 탐색만으로 누락 없이 찾을 수 있다.
+
+    check 로 등록한 청크와 태그 연결은 commit 전까지 대기 상태로 두고, 임베딩 배치가
+    벡터 DB에 저장된 뒤 commit 한다. 저장에 실패하면 discard 하여 이후의 근사 중복이
+    저장되지 않은 청크에 연결되어 사라지지 않도록 한다.
+    """
+
+    def __init__(self, max_distance: int = 3, bands: int = 4):
+        if bands <= max_distance:
+            raise ValueError("bands must be greater than max_distance")
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = HASH_BITS // bands
+        self.band_mask = (1 << self.band_bits) - 1
+
+        # (밴드 번호, 밴드 값) -> 대표 청크 id 목록
+        self.buckets: Dict[tuple, List[str]] = defaultdict(list)
+        self.fingerprints: Dict[str, int] = {}
+        # 대표 청크 id -> 추가로 연결된 태그
+        self.linked_tags: Dict[str, Set[str]] = defaultdict(set)
+        # 대표 청크 id -> 중복으로 제거된 청크의 문서 id
+        self.linked_documents: Dict[str, Set[int]] = defaultdict(set)
+
+        self.stats = {
+            "chunks": 0,
+            "duplicates": 0,
+            "chars": 0,
+            "duplicate_chars": 0,
+        }
+        self.discard()
+
+    def _bands(self, fingerprint: int):
+        for band in range(self.bands):
+            yield band, (fingerprint >> (band * self.band_bits)) & self.band_mask
+
+    def find(self, fingerprint: int) -> Optional[str]:
+        """근사 중복인 대표 청크 id 반환 (없으면 None, 같은 배치의 대기 중인 청크 포함)"""
+        indexes = (
+            (self.buckets, self.fingerprints),
+            (self._pending_buckets, self._pending_fingerprints),
+        )
+        for buckets, fingerprints in indexes:
+            for key in self._bands(fingerprint):
+                for chunk_id in buckets.get(key, ()):
+                    if hamming_distance(fingerprint, fingerprints[chunk_id]) <= self.max_distance:
+                        return chunk_id
+        return None
+
+    def check(self, chunk_id: str, text: str, tag: str, document_id: Optional[int] = None) -> Optional[str]:
+        """청크를 (대기 상태로) 등록하거나, 중복이면 대표 청크에 태그를 연결하고 그 id를 반환"""
+        fingerprint = simhash(text)
+        self._pending_stats["chunks"] += 1
+        self._pending_stats["chars"] += len(text)
+
+        canonical_id = self.find(fingerprint)
+        if canonical_id:
+            self._pending_stats["duplicates"] += 1
+            self._pending_stats["duplicate_chars"] += len(text)
+            self._pending_links.append((canonical_id, tag, document_id))
+            return canonical_id
+
+        self._pending_fingerprints[chunk_id] = fingerprint
+        for key in self._bands(fingerprint):
+            self._pending_buckets[key].append(chunk_id)
+        return None
+
+    def commit(self):
+        """대기 중인 청크/태그 연결 확정 (배치가 벡터 DB에 저장된 뒤 호출)"""
+        for chunk_id, fingerprint in self._pending_fingerprints.items():
+            self.fingerprints[chunk_id] = fingerprint
+            for key in self._bands(fingerprint):
+                self.buckets[key].append(chunk_id)
+        for canonical_id, tag, document_id in self._pending_links:
+            self.linked_tags[canonical_id].add(tag)
+            if document_id is not None:
+                self.linked_documents[canonical_id].add(document_id)
+        for key, value in self._pending_stats.items():
+            self.stats[key] += value
+        self.discard()
+
+    def discard(self):
+        """대기 중인 청크/태그 연결 버림 (배치 저장 실패 시)"""
+        self._pending_buckets: Dict[tuple, List[str]] = defaultdict(list)
+        self._pending_fingerprints: Dict[str, int] = {}
+        self._pending_links: List[Tuple[str, str, Optional[int]]] = []
+        self._pending_stats = dict.fromkeys(self.stats, 0)
+
+    def report(self) -> Dict[str, float]:
+        """중복 제거 통계"""
+        saved_ratio = self.stats["duplicate_chars"] / self.stats["chars"] if self.stats["chars"] else 0.0
+        return {
+            **self.stats,
+            "canonical_chunks": self.stats["chunks"] - self.stats["duplicates"],
+            "linked_chunks": len(self.linked_tags),
+            "saved_ratio": round(saved_ratio, 4),
+        }
@@ -0,0 +1,28 @@
+import google.generativeai as genai
+from deep_translator import GoogleTranslator
+from django.conf import settings
+
+# 외부 AI 서비스 주소 재정의 (벤치마크용 가짜 서버, 프록시 등)
+# OPENAI_BASE_URL 은 OpenAI 클라이언트 생성 시 base_url 로 직접 전달한다.
+
+
+def google_translator(source: str, target: str) -> GoogleTranslator:
+    """Google 번역기 (GOOGLE_TRANSLATE_URL 이 있으면 해당 주소 사용)"""
+    translator = GoogleTranslator(source=source, target=target)
+    if settings.GOOGLE_TRANSLATE_URL:
+        translator._base_url = settings.GOOGLE_TRANSLATE_URL
+    return translator
+
+
+def configure_gemini():
+    """Gemini 클라이언트 설정 (GEMINI_API_ENDPOINT 가 있으면 REST 로 해당 주소 사용)"""
+    if not settings.GOOGLE_API_KEY:
+        return
+    if settings.GEMINI_API_ENDPOINT:
+        genai.configure(
+            api_key=settings.GOOGLE_API_KEY,
+            transport='rest',
+            client_options={'api_endpoint': settings.GEMINI_API_ENDPOINT}
+        )
+    else:
+        genai.configure(api_key=settings.GOOGLE_API_KEY)
@@ -22,6 +22,27 @@ async def main():
                        help='Maximum concurrent API calls')
     parser.add_argument('--batch_size', type=int, default=50,
                        help='Batch size for processing questions')
+    # 학습 설정 (CPU 학습: --threads, --bf16, --gradient_checkpointing)
+    parser.add_argument('--num_epochs', type=int, default=3,
+                       help='Number of training epochs')
+    parser.add_argument('--train_batch_size', type=int, default=4,
+                       help='Per-device training batch size')
+    parser.add_argument('--gradient_accumulation_steps', type=int, default=1,
+                       help='Gradient accumulation steps')
+    parser.add_argument('--max_length', type=int, default=512,
+                       help='Maximum tokens per training example')
+    parser.add_argument('--packing', action='store_true',
+                       help='Pack examples into max_length blocks')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='torch intra-op threads (0: torch default)')
+    parser.add_argument('--interop_threads', type=int, default=0,
+                       help='torch inter-op threads (0: torch default)')
+    parser.add_argument('--bf16', action=argparse.BooleanOptionalAction, default=None,
+                       help='bf16 autocast on CPU (default: when the CPU supports it)')
+    parser.add_argument('--gradient_checkpointing', action='store_true',
+                       help='Trade compute for memory during training')
+    parser.add_argument('--resume', action='store_true',
+                       help='Resume from the last checkpoint in the model output directory')
     args = parser.parse_args()
     
     if args.step in ['questions', 'all']:
@@ -50,14 +71,30 @@ async def main():
             import traceback
             traceback.print_exc()
     
-    # if args.step in ['train', 'all']:
-    #     print("=== Training Model ===")
-    #     trainer = ModelTrainer(args.model_name, args.use_qlora)
-    #     trainer.load_model()
+    if args.step in ['train', 'all']:
+        print("=== Training Model ===")
+        trainer = ModelTrainer(
+            args.model_name,
+            args.use_qlora,
+            threads=args.threads,
+            interop_threads=args.interop_threads,
+            bf16=args.bf16,
+            gradient_checkpointing=args.gradient_checkpointing
+        )
+        trainer.load_model()
         
-    #     qa_pairs_file = f"{args.output_dir}/qa_pairs.json"
-    #     model_output_dir = f"{args.output_dir}/finetuned_model"
-    #     trainer.train(qa_pairs_file, model_output_dir)
+        qa_pairs_file = f"{args.output_dir}/qa_pairs_insurance.json"
+        model_output_dir = f"{args.output_dir}/finetuned_model"
+        trainer.train(
+            qa_pairs_file,
+            model_output_dir,
+            num_epochs=args.num_epochs,
+            batch_size=args.train_batch_size,
+            gradient_accumulation_steps=args.gradient_accumulation_steps,
+            max_length=args.max_length,
+            packing=args.packing,
+            resume_from_checkpoint=True if args.resume else None
+        )
     
     print("Pipeline completed!")
 
@@ -1,19 +1,120 @@
 import torch
 from transformers import (
     AutoModelForCausalLM, AutoTokenizer, TrainingArguments, 
-    Trainer, DataCollatorForLanguageModeling, BitsAndBytesConfig
+    Trainer, TrainerCallback, DataCollatorForLanguageModeling, BitsAndBytesConfig
 )
+from transformers.trainer_utils import get_last_checkpoint
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-from datasets import Dataset
-import pandas as pd
-import json
+from datasets import load_dataset, load_from_disk
+from typing import Optional, Union
+import time
+import os
+
+try:
+    # Django 에서 패키지로 import 하는 경우
+    from ai_services.fine_tuning.prompts import build_training_text
+    from ai_services.fine_tuning.preprocessing import dataset_cache_key, dataset_cache_path, pack_token_ids
+except ImportError:
+    from prompts import build_training_text
+    from preprocessing import dataset_cache_key, dataset_cache_path, pack_token_ids
+
+def cpu_supports_bf16() -> bool:
+    """CPU 가 bf16 연산을 하드웨어로 지원하는지 (AVX512-BF16/AMX, 미지원 CPU 에서는 오히려 느림)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class TokenCountingCollator:
+    """배치를 만들면서 실제(패딩 제외) 토큰 수를 누적하는 collator 래퍼"""
+
+    def __init__(self, collator):
+        self.collator = collator
+        self.tokens = 0
+
+    def __call__(self, features):
+        batch = self.collator(features)
+        self.tokens += int(batch["attention_mask"].sum())
+        return batch
+
+
+class ThroughputCallback(TrainerCallback):
+    """optimizer step 마다 초당 학습 토큰 수 측정 (logging_steps 마다 출력, 평가 시간은 제외)"""
+
+    def __init__(self, counter: TokenCountingCollator):
+        self.counter = counter
+        self.history = []
+        self._tokens = 0
+        self._started = 0.0
+
+    def _reset(self):
+        self._tokens = self.counter.tokens
+        self._started = time.perf_counter()
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._reset()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        self._reset()
+
+    def on_save(self, args, state, control, **kwargs):
+        self._reset()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        seconds = time.perf_counter() - self._started
+        tokens = self.counter.tokens - self._tokens
+        record = {
+            "step": state.global_step,
+            "tokens": tokens,
+            "seconds": round(seconds, 3),
+            "tokens_per_second": round(tokens / seconds, 1) if seconds > 0 else 0.0,
+        }
+        self.history.append(record)
+        if args.logging_steps and state.global_step % args.logging_steps == 0:
+            print(f"step {record['step']}: {record['tokens_per_second']} tokens/s ({tokens} tokens, {record['seconds']}s)")
+        self._reset()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        total_tokens = sum(r["tokens"] for r in self.history)
+        total_seconds = sum(r["seconds"] for r in self.history)
+        if total_seconds:
+            print(f"Trained {total_tokens} tokens in {total_seconds:.1f}s ({total_tokens / total_seconds:.1f} tokens/s)")
+
 
 class ModelTrainer:
-    def __init__(self, model_name: str = "microsoft/phi-2", use_qlora: bool = False):
+    def __init__(
+        self,
+        model_name: str = "microsoft/phi-2",
+        use_qlora: bool = False,
+        threads: int = 0,
+        interop_threads: int = 0,
+        bf16: Optional[bool] = None,
+        gradient_checkpointing: bool = False
+    ):
+        """
+        threads / interop_threads - torch intra-op / inter-op 스레드 수 (0 이면 torch 기본값)
+        bf16 - CPU 에서 bf16 autocast 사용 여부 (None 이면 CPU 가 지원할 때만)
+        gradient_checkpointing - 활성값을 다시 계산해 메모리 절약 (대신 step 이 느려짐)
+        """
         self.model_name = model_name
-        self.use_qlora = use_qlora
         self.model = None
         self.tokenizer = None
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.gradient_checkpointing = gradient_checkpointing
+        
+        # QLoRA 는 bitsandbytes 4bit 양자화라 CUDA 에서만 가능
+        if use_qlora and self.device == "cpu":
+            print("Warning: QLoRA requires CUDA, training LoRA adapters in full precision on CPU instead")
+            use_qlora = False
+        self.use_qlora = use_qlora
+        
+        # CPU 는 가중치를 float32 로 두고 bf16 autocast 로 연산 (GPU 는 float16 가중치)
+        if bf16 and self.device == "cpu" and not cpu_supports_bf16():
+            print("Warning: this CPU has no native bf16 support, bf16 autocast may be slower than float32")
+        self.bf16 = cpu_supports_bf16() if bf16 is None and self.device == "cpu" else bool(bf16) and self.device == "cpu"
         
         # LoRA 설정
         self.lora_config = LoraConfig(
@@ -39,6 +140,17 @@ class ModelTrainer:
         """모델과 토크나이저 로드"""
         print(f"Loading model: {self.model_name}")
         
+        # inter-op 스레드 수는 torch 병렬 작업이 시작되기 전에만 바꿀 수 있음
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError as e:
+                print(f"Warning: could not set inter-op threads: {e}")
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        if self.device == "cpu":
+            print(f"CPU training: {torch.get_num_threads()} intra-op / {torch.get_num_interop_threads()} inter-op threads, bf16={self.bf16}")
+        
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
@@ -46,46 +158,92 @@ class ModelTrainer:
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
             quantization_config=self.bnb_config,
-            device_map="auto" if torch.cuda.is_available() else "cpu",
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+            device_map="auto" if self.device == "cuda" else "cpu",
+            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
         )
         
         if self.use_qlora:
-            self.model = prepare_model_for_kbit_training(self.model)
+            self.model = prepare_model_for_kbit_training(
+                self.model,
+                use_gradient_checkpointing=self.gradient_checkpointing
+            )
+        elif self.gradient_checkpointing:
+            # LoRA 는 입력 임베딩이 고정이라 non-reentrant 체크포인팅을 사용
+            self.model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
+        if self.gradient_checkpointing:
+            self.model.config.use_cache = False
         
         self.model = get_peft_model(self.model, self.lora_config)
         self.model.print_trainable_parameters()
 
-    def prepare_dataset(self, qa_pairs_file: str):
-        """QA 쌍을 학습용 데이터셋으로 변환"""
-        with open(qa_pairs_file, 'r', encoding='utf-8') as f:
-            qa_pairs = json.load(f)
+    def _dataset_cache_path(self, qa_pairs_file: str, max_length: int, packing: bool, cache_dir: Optional[str]) -> str:
+        """QA 파일 내용 + 토크나이저 + 전처리 설정 해시로 토큰화 캐시 경로 결정"""
+        key = dataset_cache_key(qa_pairs_file, self.model_name, len(self.tokenizer), max_length, packing)
+        return dataset_cache_path(qa_pairs_file, key, cache_dir)
+
+    def prepare_dataset(
+        self,
+        qa_pairs_file: str,
+        max_length: int = 512,
+        packing: bool = False,
+        cache_dir: Optional[str] = None
+    ):
+        """QA 쌍을 학습용 데이터셋으로 변환
         
-        # 프롬프트 형식으로 변환
-        texts = []
-        for qa in qa_pairs:
-            text = f"Question: {qa['question']}\nContext: {qa['context']}\nAnswer: {qa['answer']}"
-            texts.append({"text": text})
+        - JSONL(한 줄에 QA 하나) 또는 JSON 배열을 Arrow 로 읽어 파일 전체를 파이썬 객체로 올리지 않음
+        - 패딩 없이 토큰화하고 length 컬럼을 추가 (배치 단위 동적 패딩 + group_by_length)
+        - packing 이면 예시를 이어 붙여 max_length 블록으로 나눔 (패딩 없음)
+        - 토큰화 결과는 내용 해시별로 디스크에 캐시하여 같은 데이터로 다시 학습하면 재사용
+        """
+        cache_path = self._dataset_cache_path(qa_pairs_file, max_length, packing, cache_dir)
+        if os.path.exists(cache_path):
+            print(f"Loading tokenized dataset from cache: {cache_path}")
+            return load_from_disk(cache_path)
         
-        dataset = Dataset.from_pandas(pd.DataFrame(texts))
+        dataset = load_dataset('json', data_files=qa_pairs_file, split='train')
         
         def tokenize(examples):
-            return self.tokenizer(
-                examples["text"],
-                truncation=True,
-                padding="max_length",
-                max_length=512,
-                return_tensors="pt"
+            # 프롬프트 형식으로 변환 (추론과 같은 형식, prompts.py)
+            texts = [
+                build_training_text(question, context, answer)
+                for question, context, answer in zip(examples['question'], examples['context'], examples['answer'])
+            ]
+            return self.tokenizer(texts, truncation=not packing, max_length=None if packing else max_length)
+        
+        dataset = dataset.map(tokenize, batched=True, remove_columns=dataset.column_names)
+        
+        if packing:
+            eos_token_id = self.tokenizer.eos_token_id
+            dataset = dataset.map(
+                lambda examples: pack_token_ids(examples['input_ids'], max_length, eos_token_id),
+                batched=True,
+                remove_columns=dataset.column_names
             )
         
-        return dataset.map(tokenize, batched=True)
+        dataset = dataset.map(lambda example: {'length': len(example['input_ids'])})
+        dataset.save_to_disk(cache_path)
+        print(f"Tokenized {len(dataset)} examples, cached at {cache_path}")
+        return dataset
 
-    def train(self, qa_pairs_file: str, output_dir: str, num_epochs: int = 3, batch_size: int = 1):
-        """모델 학습"""
-        dataset = self.prepare_dataset(qa_pairs_file)
+    def train(
+        self,
+        qa_pairs_file: str,
+        output_dir: str,
+        num_epochs: int = 3,
+        batch_size: int = 4,
+        gradient_accumulation_steps: int = 1,
+        max_length: int = 512,
+        packing: bool = False,
+        resume_from_checkpoint: Union[bool, str, None] = None
+    ):
+        """모델 학습 (배치마다 가장 긴 예시에 맞춰 패딩, 길이가 비슷한 예시끼리 배치 구성)
+        
+        resume_from_checkpoint - 체크포인트 경로, 또는 True 면 output_dir 의 마지막 체크포인트부터 이어서 학습
+        """
+        dataset = self.prepare_dataset(qa_pairs_file, max_length=max_length, packing=packing)
         
         # 학습/검증 분할
-        split = dataset.train_test_split(test_size=0.1)
+        split = dataset.train_test_split(test_size=0.1, seed=42)
         train_dataset = split["train"]
         eval_dataset = split["test"]
         
@@ -93,31 +251,49 @@ class ModelTrainer:
             output_dir=output_dir,
             num_train_epochs=num_epochs,
             per_device_train_batch_size=batch_size,
-            gradient_accumulation_steps=4,
+            per_device_eval_batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps,
+            # 길이가 비슷한 예시끼리 묶어 배치 내 패딩 최소화 (packing 이면 모두 같은 길이)
+            group_by_length=not packing,
+            length_column_name="length",
             learning_rate=2e-4,
             logging_steps=10,
             save_steps=100,
             eval_steps=100,
             warmup_steps=50,
             save_strategy="steps",
-            eval_strategy="steps",
+            evaluation_strategy="steps",
+            save_total_limit=3,
             load_best_model_at_end=True,
+            bf16=self.bf16,
+            use_cpu=self.device == "cpu",
+            dataloader_pin_memory=self.device == "cuda",
             report_to="none"
         )
         
+        # 배치 단위 동적 패딩, 패딩 제외 토큰 수를 세어 초당 토큰 수 측정
+        collator = TokenCountingCollator(DataCollatorForLanguageModeling(
+            tokenizer=self.tokenizer,
+            mlm=False,
+            pad_to_multiple_of=8
+        ))
+        
         trainer = Trainer(
             model=self.model,
             args=training_args,
             train_dataset=train_dataset,
             eval_dataset=eval_dataset,
-            data_collator=DataCollatorForLanguageModeling(
-                tokenizer=self.tokenizer,
-                mlm=False
-            )
+            data_collator=collator,
+            callbacks=[ThroughputCallback(collator)]
         )
         
-        print("Starting training...")
-        trainer.train()
+        if resume_from_checkpoint is True:
+            resume_from_checkpoint = get_last_checkpoint(output_dir) if os.path.isdir(output_dir) else None
+            if resume_from_checkpoint is None:
+                print(f"No checkpoint found in {output_dir}, starting from scratch")
+        
+        print("Starting training..." if not resume_from_checkpoint else f"Resuming training from {resume_from_checkpoint}...")
+        trainer.train(resume_from_checkpoint=resume_from_checkpoint)
         
         trainer.save_model(output_dir)
         self.tokenizer.save_pretrained(output_dir)
@@ -0,0 +1,44 @@
+"""학습 데이터 전처리 중 torch/transformers 없이 동작하는 부분 (토큰화 캐시 키, 패킹)
+
+ModelTrainer.prepare_dataset 에서 사용하며, 학습 환경이 없어도 테스트할 수 있도록 분리했다.
+"""
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional
+
+try:
+    # Django 에서 패키지로 import 하는 경우
+    from ai_services.fine_tuning.prompts import PROMPT_TEMPLATE
+except ImportError:
+    from prompts import PROMPT_TEMPLATE
+
+
+def dataset_cache_key(
+    qa_pairs_file: str,
+    model_name: str,
+    vocab_size: int,
+    max_length: int,
+    packing: bool,
+    prompt_template: str = PROMPT_TEMPLATE
+) -> str:
+    """QA 파일 내용 + 토크나이저 + 전처리 설정 해시 (하나라도 바뀌면 다른 키)"""
+    digest = hashlib.sha256()
+    with open(qa_pairs_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(f"{model_name}|{vocab_size}|{max_length}|{packing}|{prompt_template}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def dataset_cache_path(qa_pairs_file: str, key: str, cache_dir: Optional[str] = None) -> str:
+    """토큰화 캐시 경로 (기본값은 QA 파일 옆의 .dataset_cache/)"""
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(qa_pairs_file)), '.dataset_cache')
+    return os.path.join(cache_dir, key)
+
+
+def pack_token_ids(sequences: Iterable[List[int]], max_length: int, eos_token_id: int) -> Dict[str, List[List[int]]]:
+    """예시 사이에 EOS 를 넣어 이어 붙인 뒤 max_length 블록으로 나눔 (남는 끝부분은 버림)"""
+    ids = [token for tokens in sequences for token in list(tokens) + [eos_token_id]]
+    total = len(ids) // max_length * max_length
+    blocks = [ids[i:i + max_length] for i in range(0, total, max_length)]
+    return {'input_ids': blocks, 'attention_mask': [[1] * max_length for _ in blocks]}
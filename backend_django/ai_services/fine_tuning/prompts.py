@@ -0,0 +1,29 @@
+"""파인튜닝 학습 데이터와 추론에서 함께 쓰는 프롬프트 형식
+
+학습(ModelTrainer.prepare_dataset)과 추론(ai_services.local_llm, GPU 서버)이 같은 형식을 써야
+파인튜닝한 모델이 답변 위치를 올바르게 인식한다.
+"""
+
+PROMPT_TEMPLATE = "Question: {question}\nContext: {context}\nAnswer:"
+
+# 모델이 답변 뒤에 다음 예시를 이어서 생성하면 여기서 자름
+STOP_SEQUENCES = ("\nQuestion:", "\nContext:")
+
+
+def build_prompt(question: str, context: str) -> str:
+    """추론용 프롬프트 (답변 직전까지)"""
+    return PROMPT_TEMPLATE.format(question=question, context=context or "")
+
+
+def build_training_text(question: str, context: str, answer: str) -> str:
+    """학습용 텍스트 (프롬프트 + 답변)"""
+    return f"{build_prompt(question, context)} {answer}"
+
+
+def extract_answer(generated: str) -> str:
+    """생성된 텍스트에서 답변 부분만 추출"""
+    for stop in STOP_SEQUENCES:
+        index = generated.find(stop)
+        if index != -1:
+            generated = generated[:index]
+    return generated.strip()
@@ -2,18 +2,22 @@ import json
 import random
 import time
 import asyncio
-from typing import List, Dict, Tuple
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 from tqdm import tqdm
 from collections import defaultdict
 import sys
 import os
-from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import aiofiles
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from rag import RAG
-from llm import LLM
+try:
+    # Django 작업(core.tasks)에서 패키지로 import 하는 경우
+    from ai_services.rag import RAG
+    from ai_services.llm import LLM
+except ImportError:
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from rag import RAG
+    from llm import LLM
 
 @dataclass
 class QAResult:
@@ -37,8 +41,14 @@ class QAPairGenerator:
         # 결과 캐시 (같은 질문 반복 방지)
         self.cache = {}
         
-    async def generate_qa_pairs(self, questions_file: str, output_file: str, max_pairs: int = None):
-        """병렬 처리로 QA 쌍 생성"""
+    async def generate_qa_pairs(
+        self,
+        questions_file: str,
+        output_file: str,
+        max_pairs: int = None,
+        progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ):
+        """병렬 처리로 QA 쌍 생성 (progress_callback 은 배치마다 (처리 수, 전체 수)로 await)"""
         self.start_time = time.time()
         
         # 질문 로드 (비동기)
@@ -89,6 +99,9 @@ class QAPairGenerator:
                 
                 total_pbar.update(1)
             
+            if progress_callback:
+                await progress_callback(len(qa_pairs) + self.stats['failed'], len(questions))
+            
                 # 배치별 중간 저장
             if (batch_idx + 1) % 5 == 0:  # 5배치마다
                 await self._save_intermediate_async(qa_pairs, output_file, batch_idx + 1)
@@ -183,16 +196,13 @@ class QAPairGenerator:
     
     async def _search_context_async(self, question: str, country: str, topic: str) -> Tuple[str, List]:
         """RAG 검색 (비동기 래퍼)"""
-        # RAG.search_with_translation이 동기라면 ThreadPoolExecutor 사용
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            future = executor.submit(
-                self.rag.search_with_translation,
-                query=question,
-                country=country,
-                doc_type=topic
-            )
-            return await loop.run_in_executor(None, lambda: future.result())
+        # 스레드에서 실행 (to_thread 는 컨텍스트를 복사하므로 사용량이 작업의 기록에 모임)
+        return await asyncio.to_thread(
+            self.rag.search_with_translation,
+            query=question,
+            country=country,
+            doc_type=topic
+        )
     
     async def _save_intermediate_async(self, qa_pairs: List[Dict], output_file: str, batch_num: int):
         """비동기 중간 저장"""
@@ -0,0 +1,135 @@
+"""파인튜닝 모델 추론 서버 (GPU 서버의 /api/ask, /api/health 와 호환)
+
+동시에 들어온 질문을 잠시 모아(마이크로 배치) 프롬프트 길이별로 나눠 한 번에 생성한다.
+Django 없이 실행할 수 있으며, 백엔드는 GPU_AI_SERVER_URL 을 이 서버 주소로 설정하면 된다.
+
+    python -m ai_services.inference_server --model-path outputs/finetuned_model --port 8001 \\
+        --max-batch-size 8 --batch-wait-ms 10 --bucket-width 64
+"""
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from .local_llm import LocalModel
+
+logger = logging.getLogger(__name__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'InferenceServer'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/api/health':
+            model = self.server.model
+            return self.send_json(200, {'status': 'healthy' if model.model is not None else 'loading', **model.health()})
+        self.send_json(404, {'success': False, 'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/api/ask':
+            return self.send_json(404, {'success': False, 'error': f'unknown path {self.path}'})
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            question = body['question']
+        except (ValueError, KeyError, TypeError):
+            return self.send_json(400, {'success': False, 'error': 'question is required'})
+
+        # 생성 길이는 양의 정수만 허용하고 모델 설정값을 넘지 않도록 제한
+        max_new_tokens = body.get('max_new_tokens')
+        if max_new_tokens is not None:
+            if isinstance(max_new_tokens, bool) or not isinstance(max_new_tokens, int) or max_new_tokens <= 0:
+                return self.send_json(400, {'success': False, 'error': 'max_new_tokens must be a positive integer'})
+            max_new_tokens = min(max_new_tokens, self.server.model.max_new_tokens)
+
+        started = time.perf_counter()
+        try:
+            future = self.server.model.submit(question, body.get('context', ''), max_new_tokens)
+            result = future.result(timeout=self.server.request_timeout)
+        except TimeoutError:
+            return self.send_json(504, {'success': False, 'error': 'inference timed out'})
+        except Exception as e:
+            logger.error(f"Inference failed: {e}")
+            return self.send_json(500, {'success': False, 'error': str(e)})
+
+        self.send_json(200, {
+            'success': True,
+            **result,
+            'inference_time': time.perf_counter() - started,
+        })
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """요청마다 스레드에서 LocalModel.submit 후 결과를 기다림
+
+    요청 스레드는 토크나이저를 쓰지 않고, 토큰화와 생성은 배처 스레드 하나에서만 수행한다.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, model: LocalModel, host: str = '0.0.0.0', port: int = 8001, request_timeout: float = 120.0):
+        super().__init__((host, port), _Handler)
+        self.model = model
+        self.request_timeout = request_timeout
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fine-tuned model inference server (/api/ask, /api/health)')
+    parser.add_argument('--model-path', required=True, help='ModelTrainer output (LoRA adapter or merged model)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--dtype', default='float32', help='float32, bfloat16, float16 (GPU)')
+    parser.add_argument('--quantize', action='store_true', help='int8 dynamic quantization on CPU')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0: default)')
+    # 처리량/지연 시간 조절: 배치가 클수록 처리량이 늘고, 대기 시간이 길수록 배치가 잘 차지만 지연이 늘어남
+    parser.add_argument('--max-batch-size', type=int, default=8, help='1 = one request per generate call')
+    parser.add_argument('--batch-wait-ms', type=float, default=10, help='how long to collect requests')
+    parser.add_argument('--bucket-width', type=int, default=64, help='max prompt length spread per batch (0: off)')
+    parser.add_argument('--max-input-tokens', type=int, default=1024)
+    parser.add_argument('--max-new-tokens', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=120.0, help='per request timeout in seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(message)s')
+
+    model = LocalModel(
+        args.model_path,
+        dtype=args.dtype,
+        quantize=args.quantize,
+        threads=args.threads,
+        max_batch_size=args.max_batch_size,
+        batch_wait_ms=args.batch_wait_ms,
+        bucket_width=args.bucket_width,
+        max_input_tokens=args.max_input_tokens,
+        max_new_tokens=args.max_new_tokens
+    )
+    model.load()
+
+    server = InferenceServer(model, args.host, args.port, args.timeout)
+    logger.info(f"Inference server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
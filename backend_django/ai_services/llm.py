@@ -1,12 +1,16 @@
+import asyncio
 import logging
+import weakref
 from typing import Dict, Any, Optional, List
 import openai
 from openai import AsyncOpenAI
 import google.generativeai as genai
-from langchain_openai import ChatOpenAI
-from deep_translator import GoogleTranslator
 import httpx
 from django.conf import settings
+from core import usage
+from .endpoints import configure_gemini, google_translator
+from .local_llm import get_local_model
+from core.metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -16,23 +20,15 @@ class LLM:
     def __init__(self, model_name: Optional[str] = None):
         self.model_name = model_name or getattr(settings, 'DEFAULT_LLM_MODEL', 'gpt-3.5-turbo')
         
-        # 클라이언트 초기화
-        self.openai_client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            timeout=60.0,
-            max_retries=3
-        ) if getattr(settings, 'OPENAI_API_KEY', None) else None
+        # 클라이언트 초기화 (OpenAI 비동기 클라이언트는 이벤트 루프별로 생성, openai_client 참고)
+        self._openai_clients = weakref.WeakKeyDictionary()
         
-        if getattr(settings, 'GOOGLE_API_KEY', None):
-            genai.configure(api_key=settings.GOOGLE_API_KEY)
+        configure_gemini()
         
-        self.ko_to_en = GoogleTranslator(source='ko', target='en')
+        self.ko_to_en = google_translator(source='ko', target='en')
         
-        self.translator = ChatOpenAI(
-            model="gpt-3.5-turbo", 
-            temperature=0, 
-            openai_api_key=settings.OPENAI_API_KEY
-        ) if getattr(settings, 'OPENAI_API_KEY', None) else None
+        # 답변 번역 모델 (openai_client 로 호출하여 응답의 토큰 사용량을 기록)
+        self.translation_model = "gpt-3.5-turbo"
         
         # GPU AI 서버 설정
         self.AI_SERVER_URL = getattr(settings, 'GPU_AI_SERVER_URL', "https://9c6b-34-168-217-150.ngrok-free.app")
@@ -40,6 +36,26 @@ class LLM:
         
         logger.info(f"LLM initialized with model: {self.model_name}")
     
+    @property
+    def openai_client(self) -> Optional[AsyncOpenAI]:
+        """현재 이벤트 루프의 OpenAI 클라이언트
+        
+        뷰는 요청마다 asyncio.run 으로 새 루프를 만들기 때문에 클라이언트 하나를 계속 쓰면
+        닫힌 루프에 묶인 연결을 재사용하다 실패하고 재시도하게 된다.
+        """
+        if not getattr(settings, 'OPENAI_API_KEY', None):
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._openai_clients.get(loop)
+        if client is None:
+            client = self._openai_clients[loop] = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                timeout=60.0,
+                max_retries=3
+            )
+        return client
+    
     async def _generate_gemini_response(self, query: str, context: str, system_prompt: str, history: Optional[List[Dict[str, str]]]) -> str:
         """Gemini 모델을 사용한 응답 생성"""
         if not getattr(settings, 'GOOGLE_API_KEY', None):
@@ -66,11 +82,9 @@ class LLM:
         else :
             enhanced_query = query
             
-        # 히스토리가 있는 경우 채팅 세션으로 시작
+        # 히스토리가 있는 경우 Gemini의 chat history 형식으로 변환
+        gemini_history = []
         if history and len(history) > 0:
-            # Gemini의 chat history 형식으로 변환
-            gemini_history = []
-            
             for message in history:
                 role = message.get("role", "")
                 content = message.get("content", "")
@@ -85,18 +99,40 @@ class LLM:
                         "role": "model",
                         "parts": [content]
                     })
-            
-            # 히스토리와 함께 채팅 시작
-            chat = model.start_chat(history=gemini_history)
-            response = chat.send_message(enhanced_query)
-        else:
-            # 히스토리가 없는 경우 새 채팅 시작
-            chat = model.start_chat()
+        
+        # 히스토리와 함께 채팅 시작 (히스토리가 없으면 새 채팅)
+        chat = model.start_chat(history=gemini_history)
+        with usage.track('llm', 'gemini', model_name) as entry:
             response = chat.send_message(enhanced_query)
+            usage_metadata = getattr(response, 'usage_metadata', None)
+            if usage_metadata:
+                entry.prompt_tokens = usage_metadata.prompt_token_count
+                entry.completion_tokens = usage_metadata.candidates_token_count
         
         return response.text
             
 
+    async def _generate_local_response(self, query: str, context: str) -> str:
+        """파인튜닝 모델을 프로세스 안에서 실행 (LOCAL_LLM_MODEL_PATH, 동시 요청은 배치로 묶어 생성)"""
+        local_model = get_local_model()
+        if local_model is None:
+            raise Exception("Local model not configured")
+        
+        future = local_model.submit(query, context)
+        with usage.track('llm', 'local', self.model_name) as entry:
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.ai_timeout.read)
+            except asyncio.TimeoutError:
+                # 아직 배치에 들어가지 않은 요청이면 배처가 건너뜀
+                future.cancel()
+                raise
+            entry.prompt_tokens = result["prompt_tokens"]
+            entry.completion_tokens = result["completion_tokens"]
+        
+        if not result["answer"]:
+            raise Exception("Local model returned no answer")
+        return result["answer"]
+
     async def _generate_phi_response(self, query: str, context: str) -> str:
         """Phi 모델(GPU 서버)을 사용한 응답 생성"""
         # 서버 상태 확인
@@ -105,13 +141,16 @@ class LLM:
             if health_response.json().get("status") != "healthy":
                 raise Exception("GPU server not healthy")
         
-        # API 호출
+        # API 호출 (자체 GPU 서버라 비용은 0, 서버가 토큰 수를 주면 기록)
         async with httpx.AsyncClient(timeout=self.ai_timeout) as client:
             payload = {"question": query, "context": context}
-            response = await client.post(f"{self.AI_SERVER_URL}/api/ask", json=payload)
-            response.raise_for_status()
+            with usage.track('llm', 'phi', self.model_name) as entry:
+                response = await client.post(f"{self.AI_SERVER_URL}/api/ask", json=payload)
+                response.raise_for_status()
+                result = response.json()
+                entry.prompt_tokens = result.get("prompt_tokens", 0)
+                entry.completion_tokens = result.get("completion_tokens", 0)
             
-            result = response.json()
             logger.info(f"GPU server response time: {result.get('inference_time', 0):.2f}s")
             
             if result.get("success") and result.get("answer"):
@@ -120,7 +159,8 @@ class LLM:
 
     async def _generate_openai_response(self, query: str, context: str, system_prompt: str, history: Optional[List[Dict[str, str]]]) -> str:
         """OpenAI 모델을 사용한 응답 생성"""
-        if not self.openai_client:
+        client = self.openai_client
+        if not client:
             raise Exception("OpenAI client not available")
         
         messages = [{"role": "system", "content": system_prompt}]
@@ -136,38 +176,42 @@ class LLM:
         
         messages.append({"role": "user", "content": user_content})
         
-        response = await self.openai_client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=0,
-            max_tokens=1000
-        )
+        with usage.track('llm', 'openai', self.model_name) as entry:
+            response = await client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=0,
+                max_tokens=1000
+            )
+            if response.usage:
+                entry.prompt_tokens = response.usage.prompt_tokens
+                entry.completion_tokens = response.usage.completion_tokens
         return response.choices[0].message.content
 
     async def _generate_response(self, query: str, context: str, history: Optional[List[Dict[str, str]]], system_prompt: str) -> str:
-        """모델별 응답 생성"""
-        try:
-            if self.model_name.startswith("gemini-"):
-                try:
-                    return await self._generate_gemini_response(query, context, system_prompt, history)
-                except Exception as e:
-                    logger.warning(f"Gemini failed, falling back to OpenAI: {e}")
-                    return await self._generate_openai_response(query, context, system_prompt, history)
-            elif "phi" in self.model_name.lower():
-                try:
-                    return await self._generate_phi_response(query, context)
-                except Exception as e:
-                    logger.warning(f"Phi failed, falling back to Gemini: {e}")
-                    return await self._generate_gemini_response(query, context, system_prompt, history)
-            else:
-                try:
-                    return await self._generate_openai_response(query, context, system_prompt, history)
-                except Exception as e:
-                    logger.warning(f"OpenAI failed, falling back to Gemini: {e}")
-                    return await self._generate_gemini_response(query, context, system_prompt, history)
-        except Exception as e:
-            logger.error(f"All models failed: {e}")
-            raise Exception(f"Failed to generate response: {e}")
+        """모델별 응답 생성 (실패 시 다음 제공자로 폴백, 시도마다 소요 시간 측정)"""
+        gemini = ("Gemini", lambda: self._generate_gemini_response(query, context, system_prompt, history))
+        openai_ = ("OpenAI", lambda: self._generate_openai_response(query, context, system_prompt, history))
+        
+        if self.model_name.startswith("gemini-"):
+            chain = [gemini, openai_]
+        elif "phi" in self.model_name.lower():
+            chain = [("Phi", lambda: self._generate_phi_response(query, context)), gemini]
+            # 로컬 모델이 설정되어 있으면 GPU 서버보다 먼저 사용 (네트워크 왕복 없음)
+            if settings.LOCAL_LLM_MODEL_PATH:
+                chain.insert(0, ("Local", lambda: self._generate_local_response(query, context)))
+        else:
+            chain = [openai_, gemini]
+        
+        for attempt, (provider, generate) in enumerate(chain, start=1):
+            try:
+                with span('llm.generate', provider=provider.lower(), attempt=attempt):
+                    return await generate()
+            except Exception as e:
+                if attempt == len(chain):
+                    logger.error(f"All models failed: {e}")
+                    raise Exception(f"Failed to generate response: {e}")
+                logger.warning(f"{provider} failed, falling back to {chain[attempt][0]}: {e}")
 
     def translate_with_gemini(self, text: str) -> Optional[str]:
             """Gemini로 번역 (1차)"""
@@ -256,12 +300,21 @@ class LLM:
             if any(0xAC00 <= ord(char) <= 0xD7A3 for char in text[:50]):
                 return text
             
-            if not self.translator:
+            client = self.openai_client
+            if not client:
                 return text
             
             translate_prompt = f"Translate to Korean naturally: {text}"
-            translated = self.translator.invoke(translate_prompt)
-            return translated.content
+            with usage.track('translation', 'openai', self.translation_model) as entry:
+                response = await client.chat.completions.create(
+                    model=self.translation_model,
+                    messages=[{"role": "user", "content": translate_prompt}],
+                    temperature=0
+                )
+                if response.usage:
+                    entry.prompt_tokens = response.usage.prompt_tokens
+                    entry.completion_tokens = response.usage.completion_tokens
+            return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"Translation failed: {e}")
@@ -293,7 +346,9 @@ IMPORTANT GUIDELINES:
 Remember: You are having a natural conversation with a traveler who needs help."""
         
         try:
-            translated_query = self.ko_to_en.translate(query)
+            with span('llm.translate_query'), usage.track('translation', 'google_translate', 'google-translate') as entry:
+                entry.characters = len(query)
+                translated_query = self.ko_to_en.translate(query)
             # 응답 생성
             answer = await self._generate_response(translated_query, context, history, system_prompt)
             
@@ -303,7 +358,8 @@ Remember: You are having a natural conversation with a traveler who needs help."
             
             # 한국어 번역
             if translate_to_korean:
-                answer = await self._translate_to_korean(answer)
+                with span('llm.translate_answer'):
+                    answer = await self._translate_to_korean(answer)
             
             return answer
             
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .fine_tuning.prompts import build_prompt, extract_answer
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRequest:
+    """배치에 들어갈 생성 요청 한 건 (length 는 프롬프트 토큰 수)
+
+    context 가 있으면 prompt 는 질문이며, 배처 스레드의 prepare 가 프롬프트와 길이를 채운다.
+    """
+
+    __slots__ = ('prompt', 'max_new_tokens', 'length', 'context', 'future', 'enqueued_at')
+
+    def __init__(self, prompt: str, max_new_tokens: int, length: int = 0, context: Optional[str] = None):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.length = length
+        self.context = context
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def bucket_by_length(requests: List[GenerationRequest], width: int) -> List[List[GenerationRequest]]:
+    """프롬프트 길이가 비슷한 요청끼리 묶음 (한 묶음 안의 길이 차이가 width 토큰 이하)
+
+    왼쪽 패딩 배치는 가장 긴 프롬프트에 맞춰 계산하므로 길이가 크게 다른 요청을
+    함께 처리하면 패딩 토큰 연산이 늘어난다. width 가 0 이면 나누지 않는다.
+    """
+    if width <= 0 or len(requests) < 2:
+        return [requests]
+    buckets: List[List[GenerationRequest]] = []
+    for request in sorted(requests, key=lambda r: r.length):
+        if buckets and request.length - buckets[-1][0].length <= width:
+            buckets[-1].append(request)
+        else:
+            buckets.append([request])
+    return buckets
+
+
+class DynamicBatcher:
+    """동시에 들어온 생성 요청을 모아 한 번에 처리하는 단일 스레드 배처
+
+    첫 요청이 들어오면 max_wait 동안(또는 max_batch_size 가 찰 때까지) 요청을 더 모은 뒤
+    길이별로 나눠(bucket_width) run_batch(requests) 를 호출하고, 반환된 결과를 요청 순서대로
+    각 future 에 전달한다. prepare 가 있으면 길이별로 나누기 전에 요청마다 호출한다.
+    모델과 토크나이저 호출은 이 스레드에서만 일어나므로 스레드 간에 공유하지 않는다.
+    max_batch_size=1 이면 요청마다 따로 처리한다.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[GenerationRequest]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        bucket_width: int = 0,
+        name: str = 'local-llm-batcher',
+        prepare: Optional[Callable[[GenerationRequest], None]] = None
+    ):
+        self.run_batch = run_batch
+        self.prepare = prepare
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.bucket_width = bucket_width
+        self.queue: 'queue.Queue[Optional[GenerationRequest]]' = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, max_new_tokens: int, length: int = 0, context: Optional[str] = None) -> Future:
+        request = GenerationRequest(prompt, max_new_tokens, length, context)
+        self.queue.put(request)
+        return request.future
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first: GenerationRequest) -> List[GenerationRequest]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = [r for r in self._collect(first) if r.future.set_running_or_notify_cancel()]
+            if self.prepare:
+                batch = [r for r in batch if self._prepare(r)]
+            for bucket in bucket_by_length(batch, self.bucket_width) if batch else []:
+                self._run_bucket(bucket)
+
+    def _prepare(self, request: GenerationRequest) -> bool:
+        try:
+            self.prepare(request)
+        except Exception as e:
+            logger.error(f"Local LLM request preparation failed: {e}")
+            request.future.set_exception(e)
+            return False
+        return True
+
+    def _run_bucket(self, batch: List[GenerationRequest]):
+        try:
+            results = self.run_batch(batch)
+        except Exception as e:
+            logger.error(f"Local LLM batch of {len(batch)} failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.requests += len(batch)
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+
+class LocalModel:
+    """파인튜닝한 모델을 프로세스 안에서 CPU(또는 GPU)로 실행
+
+    - LoRA 어댑터 디렉토리(adapter_config.json)면 기반 모델에 병합하여 로드
+    - quantize 면 Linear 레이어를 int8 동적 양자화 (CPU)
+    - 동시 요청은 DynamicBatcher 로 묶어 왼쪽 패딩 배치로 generate (KV 캐시 사용)
+    - 모델 로드와 토큰화도 배처 스레드에서 수행 (fast 토크나이저는 스레드 간 공유 시
+      "Already borrowed" 오류가 나고, 요청 스레드나 이벤트 루프를 로드로 막지 않기 위함)
+
+    Django 설정을 읽지 않으므로 추론 서버(ai_services.inference_server)에서도 그대로 사용한다.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        dtype: str = 'float32',
+        quantize: bool = False,
+        threads: int = 0,
+        max_batch_size: int = 8,
+        batch_wait_ms: float = 10,
+        bucket_width: int = 64,
+        max_input_tokens: int = 1024,
+        max_new_tokens: int = 256
+    ):
+        self.model_path = model_path
+        self.dtype = dtype
+        self.quantize = quantize
+        self.threads = threads
+        self.max_input_tokens = max_input_tokens
+        self.max_new_tokens = max_new_tokens
+        self.model = None
+        self.tokenizer = None
+        self.device = 'cpu'
+        self.load_seconds = 0.0
+        self._load_lock = threading.Lock()
+        # 배치 설정을 바꾸는 동안 이전/새 배처 스레드가 모델과 토크나이저를 동시에 쓰지 않도록
+        self._use_lock = threading.Lock()
+        self.batcher = None
+        self.configure_batching(max_batch_size, batch_wait_ms, bucket_width)
+
+    def configure_batching(self, max_batch_size: int, batch_wait_ms: float, bucket_width: int):
+        """배치 설정 변경 (모델은 다시 로드하지 않음, 처리 중인 요청은 이전 배처가 마저 처리)"""
+        previous = self.batcher
+        self.batcher = DynamicBatcher(
+            self.generate_batch,
+            max_batch_size=max_batch_size,
+            max_wait=batch_wait_ms / 1000,
+            bucket_width=bucket_width,
+            prepare=self.prepare_request
+        )
+        if previous is not None:
+            previous.stop()
+
+    def load(self):
+        """모델과 토크나이저 로드 (워커 프로세스마다 한 번)"""
+        with self._load_lock:
+            if self.model is not None:
+                return
+
+            # torch/transformers 는 로컬 모델을 쓸 때만 필요
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+
+            started = time.perf_counter()
+            if self.threads:
+                torch.set_num_threads(self.threads)
+
+            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            dtype = getattr(torch, self.dtype)
+
+            adapter_config = os.path.join(self.model_path, 'adapter_config.json')
+            if os.path.exists(adapter_config):
+                # LoRA 어댑터는 기반 모델에 병합하여 추론 시 추가 연산 없음
+                from peft import PeftModel
+                with open(adapter_config, 'r', encoding='utf-8') as f:
+                    base_model = json.load(f)['base_model_name_or_path']
+                model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=dtype)
+                model = PeftModel.from_pretrained(model, self.model_path).merge_and_unload()
+            else:
+                model = AutoModelForCausalLM.from_pretrained(self.model_path, torch_dtype=dtype)
+
+            if self.quantize and self.device == 'cpu':
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+            tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            # 배치 생성 시 프롬프트 끝을 맞추기 위해 왼쪽 패딩
+            tokenizer.padding_side = 'left'
+
+            self.model = model.to(self.device).eval()
+            self.tokenizer = tokenizer
+            self.load_seconds = time.perf_counter() - started
+            logger.info(f"Local LLM loaded from {self.model_path} on {self.device} in {self.load_seconds:.1f}s")
+
+    def fit_prompt(self, question: str, context: str) -> Tuple[str, int]:
+        """max_input_tokens 에 맞게 컨텍스트 뒷부분을 잘라 (프롬프트, 토큰 수) 반환"""
+        overhead = len(self.tokenizer.encode(build_prompt(question, "")))
+        budget = max(self.max_input_tokens - overhead, 0)
+        context_ids = self.tokenizer.encode(context or "", add_special_tokens=False)
+        if len(context_ids) > budget:
+            context_ids = context_ids[:budget]
+            context = self.tokenizer.decode(context_ids)
+        return build_prompt(question, context), overhead + len(context_ids)
+
+    def prepare_request(self, request: GenerationRequest):
+        """모델 로드 후 질문과 컨텍스트로 프롬프트와 토큰 수를 채움 (DynamicBatcher 스레드에서 호출)"""
+        self.load()
+        if request.context is not None:
+            with self._use_lock:
+                request.prompt, request.length = self.fit_prompt(request.prompt, request.context)
+
+    def generate_batch(self, requests: List[GenerationRequest]) -> List[Dict[str, Any]]:
+        """배치 생성 (DynamicBatcher 스레드에서 호출)"""
+        with self._use_lock:
+            return self._generate_batch(requests)
+
+    def _generate_batch(self, requests: List[GenerationRequest]) -> List[Dict[str, Any]]:
+        import torch
+
+        self.load()
+        inputs = self.tokenizer(
+            [r.prompt for r in requests],
+            return_tensors='pt',
+            padding=True
+        ).to(self.device)
+        prompt_length = inputs['input_ids'].shape[1]
+
+        with torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max(r.max_new_tokens for r in requests),
+                do_sample=False,
+                use_cache=True,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+
+        results = []
+        for row, request in enumerate(requests):
+            new_tokens = output[row, prompt_length:prompt_length + request.max_new_tokens]
+            # 종료 토큰 이후(다른 행을 기다리며 채워진 패딩)는 제외
+            eos_positions = (new_tokens == self.tokenizer.eos_token_id).nonzero()
+            if len(eos_positions):
+                new_tokens = new_tokens[:eos_positions[0].item()]
+            results.append({
+                'answer': extract_answer(self.tokenizer.decode(new_tokens, skip_special_tokens=True)),
+                'prompt_tokens': int(inputs['attention_mask'][row].sum()),
+                'completion_tokens': len(new_tokens),
+                'batch_size': len(requests),
+            })
+        return results
+
+    def submit(self, question: str, context: str, max_new_tokens: Optional[int] = None) -> Future:
+        """생성 요청 (결과는 future 로 전달, 모델 로드와 토큰화는 배처 스레드에서 수행하므로 바로 반환)"""
+        return self.batcher.submit(question, max_new_tokens or self.max_new_tokens, context=context or "")
+
+    def health(self) -> Dict[str, Any]:
+        batcher = self.batcher
+        return {
+            'model_path': self.model_path,
+            'loaded': self.model is not None,
+            'device': self.device,
+            'load_seconds': round(self.load_seconds, 2),
+            'max_batch_size': batcher.max_batch_size,
+            'batch_wait_ms': batcher.max_wait * 1000,
+            'bucket_width': batcher.bucket_width,
+            'batches': batcher.batches,
+            'requests': batcher.requests,
+        }
+
+
+# 프로세스별 로컬 모델 (gunicorn fork 이후 워커마다 새로 생성)
+_local_model: Optional[LocalModel] = None
+_local_model_pid: Optional[int] = None
+_local_model_lock = threading.Lock()
+
+
+def get_local_model() -> Optional[LocalModel]:
+    """LOCAL_LLM_MODEL_PATH 가 설정된 경우 이 프로세스의 로컬 모델"""
+    global _local_model, _local_model_pid
+    if not settings.LOCAL_LLM_MODEL_PATH:
+        return None
+    previous = None
+    with _local_model_lock:
+        if _local_model is None or _local_model_pid != os.getpid() or _local_model.model_path != settings.LOCAL_LLM_MODEL_PATH:
+            # 경로가 바뀐 경우 이전 모델의 배처 스레드 종료 (fork 로 복사된 모델의 스레드는 이 프로세스에 없음)
+            if _local_model is not None and _local_model_pid == os.getpid():
+                previous = _local_model
+            _local_model = LocalModel(
+                settings.LOCAL_LLM_MODEL_PATH,
+                dtype=settings.LOCAL_LLM_DTYPE,
+                quantize=settings.LOCAL_LLM_QUANTIZE,
+                threads=settings.LOCAL_LLM_THREADS,
+                max_batch_size=settings.LOCAL_LLM_MAX_BATCH_SIZE,
+                batch_wait_ms=settings.LOCAL_LLM_BATCH_WAIT_MS,
+                bucket_width=settings.LOCAL_LLM_BUCKET_WIDTH,
+                max_input_tokens=settings.LOCAL_LLM_MAX_INPUT_TOKENS,
+                max_new_tokens=settings.LOCAL_LLM_MAX_NEW_TOKENS
+            )
+            _local_model_pid = os.getpid()
+        model = _local_model
+    if previous is not None:
+        # 이미 큐에 들어온 요청은 처리한 뒤 종료 (잠금 밖에서 기다림)
+        previous.batcher.stop()
+    return model
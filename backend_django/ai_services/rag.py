@@ -1,18 +1,26 @@
 import re
+import sys
+import uuid
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from datetime import datetime
 import chromadb
-from chromadb import PersistentClient
 from chromadb.utils import embedding_functions
 from langchain_chroma import Chroma
+from langchain_chroma.vectorstores import maximal_marginal_relevance
+from langchain_core.documents import Document as LangchainDocument
+import numpy as np
 import tiktoken
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_openai import OpenAIEmbeddings
-from deep_translator import GoogleTranslator
 from django.conf import settings
 import os
+from .chunker import StructuredPDFChunker
+from .dedup import ChunkDeduplicator
+from .vector_index import get_client, resolve_collection, LINKED_TAG_PREFIX, LINKED_DOCUMENT_PREFIX
+from .endpoints import google_translator
+from core import usage
+from core.metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +36,8 @@ class RAG:
         self.embedding_function = OpenAIEmbeddings(
             model=settings.EMBEDDING_MODEL,
             openai_api_key=settings.OPENAI_API_KEY,
-            dimensions=384
+            openai_api_base=settings.OPENAI_BASE_URL,
+            dimensions=settings.EMBEDDING_DIMENSIONS
         )
         
         # 텍스트 분할기
@@ -37,29 +46,84 @@ class RAG:
             chunk_overlap=settings.CHUNK_OVERLAP
         )
         
-        # Chroma 벡터스토어 초기화 (langchain-chroma 사용)
-        self.vectorstore = Chroma(
-            collection_name="global-documents",
-            embedding_function=self.embedding_function,
-            persist_directory=self.persist_directory
-        )
-        logger.info("Chroma vectorstore initialized")
+        # Chroma 클라이언트 (컬렉션은 검색마다 별칭을 확인하여 결정)
+        self.client = get_client(self.persist_directory)
+        self.collection_alias = getattr(settings, 'VECTOR_COLLECTION_NAME', 'global-documents')
+        self._vectorstore = None
+        self._collection_name = None
+        logger.info("Chroma client initialized")
         
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
         
+        # PDF 구조 인식 청커 (토큰 기준)
+        self.chunker = StructuredPDFChunker(
+            tokenizer=self.tokenizer,
+            max_tokens=settings.CHUNK_MAX_TOKENS,
+            min_tokens=settings.CHUNK_MIN_TOKENS,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
+        )
+        
         # 번역기 초기화
-        self.ko_to_en = GoogleTranslator(source='ko', target='en')
-        self.en_to_ko = GoogleTranslator(source='en', target='ko')
+        self.ko_to_en = google_translator(source='ko', target='en')
+        self.en_to_ko = google_translator(source='en', target='ko')
         
         # 문서 타입 패턴
         self.doc_type_pattern = r"(.*?)_(visa_info|insurance_info|immigration_regulations_info|immigration_safety_info)\.pdf"
     
-    def process_pdf_directory(self, pdf_dir: str):
-        """PDF 디렉토리 처리"""
-        pdf_files = [f for f in os.listdir(pdf_dir) if f.endswith(".pdf")]
+    @property
+    def vectorstore(self) -> Chroma:
+        """별칭이 가리키는 현재 컬렉션의 벡터스토어 (별칭이 바뀌면 재연결)"""
+        collection_name = resolve_collection(self.persist_directory, self.collection_alias)
+        if self._vectorstore is None or collection_name != self._collection_name:
+            self._vectorstore = self.get_vectorstore(collection_name)
+            self._collection_name = collection_name
+            logger.info(f"Chroma vectorstore bound to collection: {collection_name}")
+        return self._vectorstore
+    
+    def get_vectorstore(self, collection_name: str) -> Chroma:
+        """지정한 컬렉션의 벡터스토어 (langchain-chroma 사용)"""
+        return Chroma(
+            client=self.client,
+            collection_name=collection_name,
+            embedding_function=self.embedding_function
+        )
+    
+    def process_pdf_directory(
+        self,
+        pdf_dir: str,
+        batch_size: int = 500,
+        dedup: Optional[bool] = None,
+        vectorstore: Optional[Chroma] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        document_ids: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
+        """PDF 디렉토리 처리 (페이지 단위 스트리밍)
+        
+        vectorstore 를 지정하면 라이브 컬렉션 대신 해당 컬렉션에 기록한다.
+        progress 는 파일마다 (처리한 파일 수, 전체 파일 수)로 호출된다.
+        document_ids (파일명 -> Document.id) 가 있으면 청크에 document_id 를 기록한다.
+        """
+        pdf_files = sorted(f for f in os.listdir(pdf_dir) if f.endswith(".pdf"))
         processed_count = 0
         
-        for filename in pdf_files:
+        # 인덱싱 도중 별칭이 바뀌어도 같은 컬렉션에 기록
+        if vectorstore is None:
+            vectorstore = self.vectorstore
+        
+        # 인덱싱 실행 단위로 한 번만 생성
+        updated_at = sys.intern(datetime.now().isoformat())
+        
+        # 파일 간 근사 중복 청크 제거
+        if dedup is None:
+            dedup = getattr(settings, 'CHUNK_DEDUP_ENABLED', True)
+        deduplicator = ChunkDeduplicator(
+            max_distance=getattr(settings, 'CHUNK_DEDUP_MAX_DISTANCE', 3)
+        ) if dedup else None
+        
+        for file_index, filename in enumerate(pdf_files, start=1):
+            if progress:
+                progress(file_index - 1, len(pdf_files))
+            
             match = re.match(self.doc_type_pattern, filename)
             if not match:
                 logger.warning(f"Skipping file with invalid pattern: {filename}")
@@ -70,79 +134,226 @@ class RAG:
             
             logger.info(f"Processing {country.upper()} - {doc_type}")
             
+            # 파일 단위 공통 메타데이터 (문자열은 intern 하여 청크 간 공유)
+            base_metadata = {
+                "country": sys.intern(country),
+                "document_type": sys.intern(doc_type),
+                "tag": sys.intern(f"{country}_{doc_type}"),
+                "updated_at": updated_at,
+                "source": sys.intern(filename)
+            }
+            if document_ids and filename in document_ids:
+                base_metadata["document_id"] = document_ids[filename]
+            
             try:
-                # PDF 로드 및 처리
-                docs = PyMuPDFLoader(pdf_path).load()
-                splits = self.text_splitter.split_documents(docs)
-                texts = [doc.page_content for doc in splits]
-                
-                # 메타데이터
-                metadatas = [
-                    {
-                        "country": country,
-                        "document_type": doc_type,
-                        "tag": f"{country}_{doc_type}",
-                        "updated_at": datetime.now().isoformat(),
-                        "source": filename
-                    }
-                    for _ in splits
-                ]
-                
-                # 배치 크기 제한
-                MAX_BATCH_SIZE = 500
-                
-                # 배치 처리
-                total_texts = len(texts)
-                logger.info(f"Total chunks to process: {total_texts}")
-                
-                for i in range(0, total_texts, MAX_BATCH_SIZE):
-                    end_idx = min(i + MAX_BATCH_SIZE, total_texts)
-                    batch_texts = texts[i:end_idx]
-                    batch_metadatas = metadatas[i:end_idx]
-                    
-                    logger.info(f"Processing batch {i//MAX_BATCH_SIZE + 1}: chunks {i} to {end_idx-1}")
+                total_chunks = 0
+                for batch_index, (batch_ids, batch_texts, batch_metadatas) in enumerate(
+                    self.iter_pdf_batches(pdf_path, base_metadata, batch_size, deduplicator)
+                ):
+                    logger.info(
+                        f"Processing batch {batch_index + 1}: chunks {total_chunks} to {total_chunks + len(batch_texts) - 1}"
+                    )
                     
-                    # 벡터 스토어에 배치 추가
-                    self.vectorstore.add_texts(texts=batch_texts, metadatas=batch_metadatas)
+                    # 벡터 스토어에 배치 추가 (임베딩)
+                    self.add_texts(vectorstore, batch_texts, batch_metadatas, batch_ids)
+                    total_chunks += len(batch_texts)
+                    # 저장된 배치의 청크만 중복 판정 대상으로 확정
+                    if deduplicator:
+                        deduplicator.commit()
                     
-                logger.info(f"Successfully indexed {country}_{doc_type}")
+                logger.info(f"Successfully indexed {country}_{doc_type}: {total_chunks} chunks")
                 processed_count += 1
                 
             except Exception as e:
                 logger.error(f"Error processing {filename}: {e}")
+                if deduplicator:
+                    deduplicator.discard()
                 continue
         
+        if progress:
+            progress(len(pdf_files), len(pdf_files))
+        
+        report = {"processed_files": processed_count}
+        if deduplicator:
+            self._link_duplicate_tags(vectorstore, deduplicator.linked_tags, batch_size, deduplicator.linked_documents)
+            report["dedup"] = deduplicator.report()
+            logger.info(f"Dedup report: {report['dedup']}")
+        
         # 모든 문서 처리 완료
         logger.info(f"Processed {processed_count} PDF files")
         logger.info("Vector database automatically persisted to disk")
+        return report
+    
+    def add_texts(
+        self,
+        vectorstore: Chroma,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """청크 임베딩 후 벡터 스토어에 추가 (임베딩 토큰 수는 tiktoken 으로 계산해 사용량 기록)"""
+        with usage.track('embedding', 'openai', settings.EMBEDDING_MODEL) as entry:
+            entry.prompt_tokens = sum(len(tokens) for tokens in self.tokenizer.encode_ordinary_batch(texts))
+            return vectorstore.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+    
+    def iter_pdf_batches(
+        self,
+        pdf_path: str,
+        base_metadata: Dict[str, Any],
+        batch_size: int = 500,
+        deduplicator: Optional[ChunkDeduplicator] = None
+    ) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        """PDF 청크를 (ids, texts, metadatas) 배치 단위로 생성"""
+        batch_ids: List[str] = []
+        batch_texts: List[str] = []
+        batch_metadatas: List[Dict[str, Any]] = []
+        
+        for chunk in self.chunker.iter_pdf_chunks(pdf_path):
+            chunk_id = uuid.uuid4().hex
+            
+            # 이미 색인된(또는 같은 배치의) 청크와 근사 중복이면 대표 청크에 태그만 연결
+            if deduplicator and deduplicator.check(
+                chunk_id, chunk.text, base_metadata["tag"], base_metadata.get("document_id")
+            ):
+                continue
+            
+            batch_ids.append(chunk_id)
+            batch_texts.append(chunk.text)
+            batch_metadatas.append({
+                **base_metadata,
+                "page": chunk.page,
+                "page_end": chunk.page_end,
+                "section": sys.intern(chunk.section),
+                "chunk_type": sys.intern(chunk.chunk_type)
+            })
+            
+            if len(batch_texts) >= batch_size:
+                yield batch_ids, batch_texts, batch_metadatas
+                batch_ids, batch_texts, batch_metadatas = [], [], []
+        
+        if batch_texts:
+            yield batch_ids, batch_texts, batch_metadatas
+    
+    def _link_duplicate_tags(
+        self,
+        vectorstore: Chroma,
+        linked_tags: Dict[str, set],
+        batch_size: int = 500,
+        linked_documents: Optional[Dict[str, set]] = None
+    ):
+        """대표 청크 메타데이터에 중복으로 제거된 청크의 태그와 문서 id를 연결
+        
+        문서 id 는 대표 청크의 문서가 삭제/수정될 때 소유권 이전과 연결 태그 재계산에 사용한다.
+        """
+        collection = vectorstore._collection
+        linked_documents = linked_documents or {}
+        chunk_ids = list(linked_tags.keys())
+        
+        for i in range(0, len(chunk_ids), batch_size):
+            batch_ids = chunk_ids[i:i + batch_size]
+            existing = collection.get(ids=batch_ids, include=["metadatas"])
+            
+            metadatas = []
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+                metadata = dict(metadata)
+                for tag in linked_tags[chunk_id]:
+                    metadata[f"{LINKED_TAG_PREFIX}{tag}"] = True
+                for document_id in linked_documents.get(chunk_id, ()):
+                    if document_id != metadata.get("document_id"):
+                        metadata[f"{LINKED_DOCUMENT_PREFIX}{document_id}"] = True
+                metadatas.append(metadata)
+            
+            if metadatas:
+                collection.update(ids=existing["ids"], metadatas=metadatas)
+        
+        logger.info(f"Linked duplicate tags to {len(chunk_ids)} canonical chunks")
+    
+    @staticmethod
+    def normalize_filters(country: Optional[str], topic: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """화면의 국가/주제 값을 벡터 DB 메타데이터 형식(country, document_type)으로 변환"""
+        if country:
+            country = country.replace(" ", "").lower()
+        if topic:
+            if topic == "immigration":
+                topic = "immigration_regulations_info"
+            elif topic == "safety":
+                topic = "immigration_safety_info"
+            elif not topic.endswith("_info"):
+                topic = topic + "_info"
+        return country, topic
+    
+    @staticmethod
+    def document_topic(doc_type: str) -> str:
+        """document_type(visa_info 등)을 화면의 주제 값으로 변환 (normalize_filters 의 역변환)"""
+        if doc_type == "immigration_regulations_info":
+            return "immigration"
+        if doc_type == "immigration_safety_info":
+            return "safety"
+        return doc_type[:-len("_info")] if doc_type.endswith("_info") else doc_type
+    
+    @staticmethod
+    def tag_filter(tag: str) -> Dict[str, Any]:
+        """자체 태그 또는 중복 제거로 연결된 태그로 검색하는 필터"""
+        return {"$or": [{"tag": tag}, {f"{LINKED_TAG_PREFIX}{tag}": True}]}
     
     def search_with_translation(
         self,
         query: str,
         country: Optional[str] = None,
-        doc_type: Optional[str] = None
+        doc_type: Optional[str] = None,
+        top_k: Optional[int] = None,
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        context_docs: Optional[int] = None,
+        vectorstore: Optional[Chroma] = None
     ) -> Tuple[str, List[Dict[str, Any]]]:
-        """한국어 질문을 영어로 번역하여 검색"""
+        """한국어 질문을 영어로 번역하여 검색
+        
+        top_k, fetch_k, lambda_mult, context_docs, vectorstore 를 지정하면 설정값 대신 사용한다.
+        (`python manage.py evaluate_retrieval` 에서 설정별 비교에 사용)
+        """
+        top_k = top_k or settings.TOP_K_RESULTS
+        fetch_k = max(fetch_k or settings.RAG_MMR_FETCH_K, top_k)
+        lambda_mult = settings.RAG_MMR_LAMBDA if lambda_mult is None else lambda_mult
+        context_docs = context_docs or settings.RAG_CONTEXT_DOCS
         
         # 태그 구성
         tag = f"{country}_{doc_type}" if country and doc_type else country
         
         # 한국어 질문을 영어로 번역
-        translated_query = self.ko_to_en.translate(query)
+        with span('rag.translate_query'), usage.track('translation', 'google_translate', 'google-translate') as entry:
+            entry.characters = len(query)
+            translated_query = self.ko_to_en.translate(query)
         logger.info(f"Translated query: {translated_query}")
         
-        # 검색 실행 (MMR 사용)
-        search_kwargs = {"k": settings.TOP_K_RESULTS}
-        if tag:
-            search_kwargs["filter"] = {"tag": tag}
-            
-        retriever = self.vectorstore.as_retriever(
-            search_type="mmr",
-            search_kwargs=search_kwargs
-        )
+        # 검색 실행 (MMR 사용, 단계별 소요 시간 측정을 위해 임베딩 -> 후보 검색 -> MMR 을 나눠 실행)
+        if vectorstore is None:
+            vectorstore = self.vectorstore
+        with span('rag.embed'), usage.track('embedding', 'openai', settings.EMBEDDING_MODEL) as entry:
+            entry.prompt_tokens = len(self.tokenizer.encode_ordinary(translated_query))
+            embedding = self.embedding_function.embed_query(translated_query)
+        
+        with span('rag.search'):
+            results = vectorstore._collection.query(
+                query_embeddings=[embedding],
+                n_results=fetch_k,
+                where=self.tag_filter(tag) if tag else None,
+                include=["documents", "metadatas", "embeddings"]
+            )
+        
+        with span('rag.mmr'):
+            selected = maximal_marginal_relevance(
+                np.array(embedding, dtype=np.float32),
+                results["embeddings"][0],
+                k=top_k,
+                lambda_mult=lambda_mult
+            )
         
-        # 문서 검색
-        docs = retriever.invoke(translated_query)
+        # 후보 순서(유사도 순) 유지 (as_retriever(search_type="mmr") 와 같은 결과)
+        docs = [
+            LangchainDocument(page_content=results["documents"][0][i], metadata=results["metadatas"][0][i] or {})
+            for i in sorted(selected)
+        ]
         
         if not docs:
             return "관련 문서를 찾지 못했습니다.", []
@@ -151,21 +362,26 @@ class RAG:
         context_parts = []
         references = []
         
-        for i, doc in enumerate(docs[:3]):  # 최대 3개 문서
+        for i, doc in enumerate(docs[:context_docs]):  # LLM 에 전달하는 문서 수 (기본 3개)
             context_parts.append(doc.page_content)
             metadata = doc.metadata
             references.append({
                 "title": metadata.get("document_type", "Unknown"),
                 "country": metadata.get("country", "Unknown"),
                 "tag": metadata.get("tag", ""),
-                "updated_at": metadata.get("updated_at", "")
+                "updated_at": metadata.get("updated_at", ""),
+                "source": metadata.get("source", ""),
+                "page": metadata.get("page"),
+                "section": metadata.get("section", "")
             })
         
         context = "\n\n---\n\n".join(context_parts)
         return context, references
     
-    def add_document(self, text: str, metadata: Dict[str, Any]) -> bool:
-        """단일 문서 추가"""
+    def add_document(self, text: str, metadata: Dict[str, Any], vectorstore: Optional[Chroma] = None) -> int:
+        """단일 문서 추가 (추가된 청크 수 반환, 실패 시 0)"""
+        if vectorstore is None:
+            vectorstore = self.vectorstore
         try:
             # 텍스트 분할
             splits = self.text_splitter.split_text(text)
@@ -191,13 +407,13 @@ class RAG:
                 batch_metadatas = metadatas[i:end_idx]
                 
                 # 벡터 스토어에 배치 추가
-                self.vectorstore.add_texts(texts=batch_texts, metadatas=batch_metadatas)
+                self.add_texts(vectorstore, batch_texts, batch_metadatas)
                 
-            return True
+            return total_texts
             
         except Exception as e:
             logger.error(f"Error adding document: {e}")
-            return False
+            return 0
         
 if __name__ == "__main__":
     rag = RAG()
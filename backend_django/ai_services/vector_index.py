@@ -0,0 +1,495 @@
+import os
+import io
+import json
+import gzip
+import base64
+import hashlib
+import logging
+import tarfile
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ALIAS_FILE = "index_aliases.json"
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+RECORDS_NAME = "records.jsonl.gz"
+
+# 별칭 파일 캐시: persist_directory -> (mtime_ns, aliases)
+_alias_cache: Dict[str, tuple] = {}
+# Chroma 클라이언트 캐시: persist_directory -> (pid, client)
+_clients: Dict[str, tuple] = {}
+
+
+def get_client(persist_directory: str):
+    """프로세스에서 공유하는 Chroma 클라이언트 (RAG 검색과 문서 변경 동기화가 같은 클라이언트 사용)"""
+    from chromadb import PersistentClient
+
+    persist_directory = os.path.abspath(persist_directory)
+    cached = _clients.get(persist_directory)
+    if cached and cached[0] == os.getpid():
+        return cached[1]
+
+    client = PersistentClient(path=persist_directory)
+    _clients[persist_directory] = (os.getpid(), client)
+    return client
+
+
+def new_version() -> str:
+    """컬렉션/스냅샷 버전 문자열"""
+    return datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+def unique_collection_name(client, name: str) -> str:
+    """기존 컬렉션과 겹치지 않는 이름 (같은 버전 이름이 이미 있으면 -2, -3 ... 을 붙임)"""
+    existing = {c.name if hasattr(c, "name") else c for c in client.list_collections()}
+    candidate, suffix = name, 1
+    while candidate in existing:
+        suffix += 1
+        candidate = f"{name}-{suffix}"
+    return candidate
+
+
+def read_aliases(persist_directory: str) -> Dict[str, Any]:
+    """별칭 파일 읽기 (mtime이 바뀐 경우에만 다시 읽음)"""
+    path = os.path.join(persist_directory, ALIAS_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    cached = _alias_cache.get(persist_directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        aliases = json.load(f)
+    _alias_cache[persist_directory] = (mtime, aliases)
+    return aliases
+
+
+def resolve_collection(persist_directory: str, alias: str) -> str:
+    """별칭이 가리키는 실제 컬렉션 이름 (별칭이 없으면 그대로 사용)"""
+    entry = read_aliases(persist_directory).get(alias)
+    return entry["collection"] if entry else alias
+
+
+def _write_aliases(persist_directory: str, aliases: Dict[str, Any]):
+    """임시 파일에 기록한 뒤 os.replace 로 교체 (읽는 쪽은 항상 완전한 파일을 봄)"""
+    path = os.path.join(persist_directory, ALIAS_FILE)
+    fd, tmp_path = tempfile.mkstemp(dir=persist_directory, prefix=".aliases-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _load_aliases(persist_directory: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(persist_directory, ALIAS_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def set_alias(persist_directory: str, alias: str, collection_name: str) -> Optional[str]:
+    """별칭을 새 컬렉션으로 원자적으로 전환하고 이전 컬렉션 이름을 반환
+
+    이전 컬렉션은 retired 목록에 기록되어 유예 기간 후 garbage_collect 로 삭제된다.
+    """
+    aliases = _load_aliases(persist_directory)
+    entry = aliases.get(alias, {})
+
+    # 별칭 파일이 없던 경우 별칭 이름 자체가 기존 라이브 컬렉션
+    previous = entry.get("collection", alias)
+    retired = [r for r in entry.get("retired", []) if r["collection"] != collection_name]
+    if previous != collection_name:
+        retired.append({"collection": previous, "retired_at": datetime.now().isoformat()})
+
+    aliases[alias] = {
+        "collection": collection_name,
+        "switched_at": datetime.now().isoformat(),
+        "retired": retired,
+    }
+    _write_aliases(persist_directory, aliases)
+
+    logger.info(f"Alias {alias}: {previous} -> {collection_name}")
+    return previous
+
+
+def garbage_collect(client, persist_directory: str, alias: str, grace_seconds: float) -> List[str]:
+    """유예 기간이 지난 이전 버전 컬렉션 삭제"""
+    aliases = _load_aliases(persist_directory)
+    entry = aliases.get(alias)
+    if not entry:
+        return []
+
+    existing = {c.name if hasattr(c, "name") else c for c in client.list_collections()}
+    now = datetime.now()
+    deleted, kept = [], []
+    for retired in entry.get("retired", []):
+        name = retired["collection"]
+        age = (now - datetime.fromisoformat(retired["retired_at"])).total_seconds()
+        if name == entry["collection"]:
+            continue
+        if age < grace_seconds and name in existing:
+            kept.append(retired)
+            continue
+        if name in existing:
+            client.delete_collection(name)
+            logger.info(f"Deleted retired collection: {name}")
+        deleted.append(name)
+
+    if deleted:
+        entry["retired"] = kept
+        _write_aliases(persist_directory, aliases)
+    return deleted
+
+
+def validate_collection(collection, min_count: int = 1, expected_dimension: Optional[int] = None) -> List[str]:
+    """새 컬렉션 검증: 레코드 수, 임베딩 차원, 자기 자신 검색"""
+    errors = []
+    count = collection.count()
+    if count < min_count:
+        errors.append(f"record count {count} < {min_count}")
+        return errors
+
+    sample = collection.peek(1)
+    embedding = list(sample["embeddings"][0])
+    if expected_dimension and len(embedding) != expected_dimension:
+        errors.append(f"embedding dimension {len(embedding)} != {expected_dimension}")
+        return errors
+
+    result = collection.query(query_embeddings=[embedding], n_results=1, include=["distances"])
+    if not result["ids"][0] or result["distances"][0][0] > 1e-3:
+        errors.append("self query did not return the sampled record")
+    return errors
+
+
+def _iter_records(collection, batch_size: int) -> Iterator[Dict[str, Any]]:
+    offset = 0
+    while True:
+        batch = collection.get(
+            limit=batch_size,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        ids = batch["ids"]
+        if not ids:
+            break
+        for i, chunk_id in enumerate(ids):
+            embedding = np.asarray(batch["embeddings"][i], dtype=np.float32)
+            yield {
+                "id": chunk_id,
+                "document": batch["documents"][i],
+                "metadata": batch["metadatas"][i],
+                "embedding": base64.b64encode(embedding.tobytes()).decode("ascii"),
+            }
+        offset += len(ids)
+
+
+def write_snapshot(
+    collection,
+    output_path: str,
+    version: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+    batch_size: int = 1000
+) -> Dict[str, Any]:
+    """컬렉션을 단일 파일 스냅샷(tar: manifest + gzip JSONL)으로 저장"""
+    count = 0
+    dimension = None
+    digest = hashlib.sha256()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        records_path = os.path.join(tmp_dir, RECORDS_NAME)
+        with gzip.open(records_path, "wt", encoding="utf-8") as f:
+            for record in _iter_records(collection, batch_size):
+                if dimension is None:
+                    dimension = len(base64.b64decode(record["embedding"])) // 4
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+
+        with open(records_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "version": version or new_version(),
+            "collection": collection.name,
+            "collection_metadata": collection.metadata,
+            "count": count,
+            "embedding_dimension": dimension,
+            "records_sha256": digest.hexdigest(),
+            "created_at": datetime.now().isoformat(),
+            **(extra or {}),
+        }
+
+        # 임시 파일에 기록 후 교체하여 불완전한 스냅샷이 남지 않도록 함
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        fd, tmp_output = tempfile.mkstemp(dir=output_dir, prefix=".snapshot-")
+        os.close(fd)
+        with tarfile.open(tmp_output, "w") as tar:
+            manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(manifest_bytes)
+            tar.addfile(info, io.BytesIO(manifest_bytes))
+            tar.add(records_path, arcname=RECORDS_NAME)
+        os.replace(tmp_output, output_path)
+
+    logger.info(f"Snapshot written: {output_path} ({count} records)")
+    return manifest
+
+
+def read_manifest(snapshot_path: str) -> Dict[str, Any]:
+    with tarfile.open(snapshot_path, "r") as tar:
+        return json.load(tar.extractfile(MANIFEST_NAME))
+
+
+def restore_snapshot(client, snapshot_path: str, collection_name: str, batch_size: int = 1000) -> Dict[str, Any]:
+    """스냅샷을 검증한 뒤 새 컬렉션으로 복원 (별칭 전환은 호출자가 수행)
+
+    기존 컬렉션(별칭이 가리키는 라이브 컬렉션일 수 있음)은 덮어쓰지 않으며, 이름이 이미
+    있으면 ValueError 를 발생시킨다. 이름은 unique_collection_name 으로 정한다.
+    복원 중 실패하면 새로 만든 컬렉션만 삭제한다.
+    """
+    with tarfile.open(snapshot_path, "r") as tar:
+        manifest = json.load(tar.extractfile(MANIFEST_NAME))
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format: {manifest.get('format_version')}")
+
+        # 체크섬 검증
+        digest = hashlib.sha256()
+        records_file = tar.extractfile(RECORDS_NAME)
+        for block in iter(lambda: records_file.read(1 << 20), b""):
+            digest.update(block)
+        if digest.hexdigest() != manifest["records_sha256"]:
+            raise ValueError("Snapshot checksum mismatch")
+
+        if unique_collection_name(client, collection_name) != collection_name:
+            raise ValueError(f"Collection already exists: {collection_name}")
+        collection = client.create_collection(
+            name=collection_name,
+            metadata=manifest.get("collection_metadata") or None
+        )
+
+        try:
+            restored = 0
+            with gzip.open(tar.extractfile(RECORDS_NAME), "rt", encoding="utf-8") as f:
+                batch: List[Dict[str, Any]] = []
+                for line in f:
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_size:
+                        restored += _add_records(collection, batch)
+                        batch = []
+                if batch:
+                    restored += _add_records(collection, batch)
+
+            stored = collection.count()
+            if stored != manifest["count"]:
+                raise ValueError(f"Restored {stored} records, expected {manifest['count']}")
+        except Exception:
+            client.delete_collection(collection_name)
+            raise
+
+    logger.info(f"Snapshot restored into {collection_name} ({restored} records)")
+    return manifest
+
+
+def _add_records(collection, records: List[Dict[str, Any]]) -> int:
+    collection.add(
+        ids=[r["id"] for r in records],
+        documents=[r["document"] for r in records],
+        metadatas=[r["metadata"] for r in records],
+        embeddings=[
+            np.frombuffer(base64.b64decode(r["embedding"]), dtype=np.float32).tolist()
+            for r in records
+        ],
+    )
+    return len(records)
+
+
+# 청크 메타데이터에 기록되는 소유 문서 id 키
+DOCUMENT_ID_KEY = "document_id"
+
+# 중복 제거된 청크가 대표 청크에 연결될 때 사용하는 메타데이터 키 접두사
+# (Chroma 는 update 로 키를 지울 수 없으므로 연결 해제는 False 로 기록)
+LINKED_TAG_PREFIX = "linked_tag:"
+LINKED_DOCUMENT_PREFIX = "linked_document:"
+
+# 문서 id 목록 -> {문서 id: 청크 메타데이터} (존재하는 문서만)
+MetadataLookup = Callable[[List[int]], Dict[int, Dict[str, Any]]]
+
+
+def linked_document_ids(metadata: Dict[str, Any]) -> List[int]:
+    """대표 청크에 연결된 (중복으로 제거된 청크의) 문서 id 목록"""
+    return sorted(
+        int(key[len(LINKED_DOCUMENT_PREFIX):])
+        for key, value in metadata.items()
+        if key.startswith(LINKED_DOCUMENT_PREFIX) and value is True
+    )
+
+
+def relink_metadata(metadata: Dict[str, Any], linked: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """연결된 문서의 현재 태그로 linked_tag 플래그를 다시 계산 (없어진 문서와 소유 문서의 연결은 해제)"""
+    metadata = dict(metadata)
+    for key in metadata:
+        if key.startswith(LINKED_TAG_PREFIX):
+            metadata[key] = False
+    for document_id in linked_document_ids(metadata):
+        fields = linked.get(document_id)
+        if fields is None or document_id == metadata.get(DOCUMENT_ID_KEY):
+            metadata[f"{LINKED_DOCUMENT_PREFIX}{document_id}"] = False
+        elif fields["tag"] != metadata.get("tag"):
+            metadata[f"{LINKED_TAG_PREFIX}{fields['tag']}"] = True
+    return metadata
+
+
+def _relink_linked_chunks(
+    collection,
+    document_id: int,
+    metadata_for: MetadataLookup,
+    batch_size: int,
+    exclude: Iterable[int] = ()
+) -> int:
+    """문서가 연결된 대표 청크들의 연결 태그 재계산 (exclude 의 문서는 없어진 것으로 처리)"""
+    exclude = set(exclude)
+    updated = 0
+    offset = 0
+    while True:
+        batch = collection.get(
+            where={f"{LINKED_DOCUMENT_PREFIX}{document_id}": True},
+            limit=batch_size,
+            offset=offset,
+            include=["metadatas"]
+        )
+        if not batch["ids"]:
+            break
+
+        lookup_ids = {d for metadata in batch["metadatas"] for d in linked_document_ids(metadata)} - exclude
+        linked = metadata_for(sorted(lookup_ids))
+        metadatas = [relink_metadata(metadata, linked) for metadata in batch["metadatas"]]
+        collection.update(ids=batch["ids"], metadatas=metadatas)
+        updated += len(batch["ids"])
+
+        # 연결이 해제된 청크는 다음 조회에서 빠지므로 오프셋을 그만큼 덜 이동
+        offset += sum(1 for metadata in metadatas if metadata[f"{LINKED_DOCUMENT_PREFIX}{document_id}"] is True)
+    return updated
+
+
+def delete_document_chunks(
+    collection,
+    document_ids: Iterable[int],
+    metadata_for: MetadataLookup,
+    batch_size: int = 500
+) -> int:
+    """문서 id 목록에 속한 청크를 배치 단위로 삭제하고 삭제 수 반환
+
+    다른 문서의 중복 청크가 연결된 대표 청크는 삭제하지 않고 남은 연결 문서로 소유권을 옮긴다.
+    삭제된 문서가 연결되어 있던 다른 문서의 대표 청크는 연결 태그를 다시 계산한다.
+    """
+    deleted_ids = set(document_ids)
+    document_ids = sorted(deleted_ids)
+    deleted = 0
+    for i in range(0, len(document_ids), batch_size):
+        batch = document_ids[i:i + batch_size]
+        owned = collection.get(where={DOCUMENT_ID_KEY: {"$in": batch}}, include=["metadatas"])
+
+        survivors = {
+            chunk_id: [d for d in linked_document_ids(metadata) if d not in deleted_ids]
+            for chunk_id, metadata in zip(owned["ids"], owned["metadatas"])
+        }
+        lookup_ids = {d for metadata in owned["metadatas"] for d in linked_document_ids(metadata)} - deleted_ids
+        linked = metadata_for(sorted(lookup_ids)) if lookup_ids else {}
+
+        delete_ids, rehome_ids, rehome_metadatas = [], [], []
+        for chunk_id, metadata in zip(owned["ids"], owned["metadatas"]):
+            owner = next((d for d in survivors[chunk_id] if d in linked), None)
+            if owner is None:
+                delete_ids.append(chunk_id)
+                continue
+            rehome_ids.append(chunk_id)
+            rehome_metadatas.append(relink_metadata({**metadata, **linked[owner], DOCUMENT_ID_KEY: owner}, linked))
+
+        for j in range(0, len(rehome_ids), batch_size):
+            collection.update(ids=rehome_ids[j:j + batch_size], metadatas=rehome_metadatas[j:j + batch_size])
+        for j in range(0, len(delete_ids), batch_size):
+            collection.delete(ids=delete_ids[j:j + batch_size])
+        deleted += len(delete_ids)
+
+    for document_id in document_ids:
+        _relink_linked_chunks(collection, document_id, metadata_for, batch_size, exclude=deleted_ids)
+    return deleted
+
+
+def update_document_chunks(
+    collection,
+    document_id: int,
+    fields: Dict[str, Any],
+    metadata_for: MetadataLookup,
+    batch_size: int = 500
+) -> int:
+    """문서에 속한 청크 메타데이터 갱신 (값이 바뀐 청크만 기록)
+
+    태그가 바뀌면 이 문서가 연결된 다른 문서의 대표 청크와, 이 문서 청크에 연결된 태그도 다시 계산한다.
+    """
+    updated = 0
+    offset = 0
+    while True:
+        batch = collection.get(
+            where={DOCUMENT_ID_KEY: document_id},
+            limit=batch_size,
+            offset=offset,
+            include=["metadatas"]
+        )
+        if not batch["ids"]:
+            break
+
+        changed = [
+            (chunk_id, metadata) for chunk_id, metadata in zip(batch["ids"], batch["metadatas"])
+            if any(metadata.get(key) != value for key, value in fields.items())
+        ]
+        lookup_ids = {d for _, metadata in changed for d in linked_document_ids(metadata)}
+        linked = metadata_for(sorted(lookup_ids)) if lookup_ids else {}
+
+        ids, metadatas = [], []
+        for chunk_id, metadata in changed:
+            metadata = {**metadata, **fields}
+            if linked_document_ids(metadata):
+                metadata = relink_metadata(metadata, linked)
+            ids.append(chunk_id)
+            metadatas.append(metadata)
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += len(batch["ids"])
+
+    if "tag" in fields:
+        _relink_linked_chunks(collection, document_id, metadata_for, batch_size)
+    return updated
+
+
+def scan_document_ids(collection, batch_size: int = 1000) -> Tuple[Dict[int, List[str]], List[str]]:
+    """컬렉션 전체를 훑어 문서 id별 청크 id와 문서 id가 없는 청크 id를 반환"""
+    by_document: Dict[int, List[str]] = {}
+    unlinked: List[str] = []
+    offset = 0
+    while True:
+        batch = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        if not batch["ids"]:
+            break
+        for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+            document_id = (metadata or {}).get(DOCUMENT_ID_KEY)
+            if document_id is None:
+                unlinked.append(chunk_id)
+            else:
+                by_document.setdefault(document_id, []).append(chunk_id)
+        offset += len(batch["ids"])
+    return by_document, unlinked
@@ -0,0 +1,249 @@
+import json
+import time
+import base64
+import random
+import struct
+import hashlib
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+from html import escape
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ('openai', 'embeddings', 'gemini', 'translate', 'phi')
+
+
+class ServiceProfile:
+    """가짜 서비스의 응답 지연(정규 분포, ms)과 오류율"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def delay(self, rng: random.Random) -> float:
+        return max(0.0, rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+    def to_dict(self) -> Dict[str, float]:
+        return {'latency_ms': self.latency_ms, 'jitter_ms': self.jitter_ms, 'error_rate': self.error_rate}
+
+
+def fake_embedding(value, dimensions: int):
+    """입력(문자열 또는 토큰 배열)마다 항상 같은 단위 벡터"""
+    seed = hashlib.sha256(json.dumps(value, ensure_ascii=False).encode('utf-8')).digest()
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def count_tokens(text: str) -> int:
+    """대략적인 토큰 수 (공백 기준 단어 수)"""
+    return max(1, len(text.split()))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'FakeAIServer'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/health':
+            return self.respond('phi', lambda: {'status': 'healthy'}, fail=False)
+        if url.path == '/m':
+            return self.respond('translate', lambda: self.translate(parse_qs(url.query)), html=True)
+        self.send_json(404, {'error': f'unknown path {url.path}'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+
+        if path.endswith('/chat/completions'):
+            return self.respond('openai', lambda: self.chat_completion(body))
+        if path.endswith('/embeddings'):
+            return self.respond('embeddings', lambda: self.embeddings(body))
+        if ':generateContent' in path:
+            return self.respond('gemini', lambda: self.generate_content(path, body))
+        if path == '/api/ask':
+            return self.respond('phi', lambda: self.ask(body))
+        self.send_json(404, {'error': f'unknown path {path}'})
+
+    def respond(self, service: str, build, html: bool = False, fail: bool = True):
+        """프로필의 지연 시간만큼 기다린 뒤 응답 (오류율만큼 500)"""
+        profile = self.server.profiles[service]
+        with self.server.lock:
+            delay = profile.delay(self.server.rng)
+            failed = fail and self.server.rng.random() < profile.error_rate
+            self.server.counts[service] = self.server.counts.get(service, 0) + 1
+        time.sleep(delay)
+
+        if failed:
+            return self.send_json(500, {'error': {'message': f'fake {service} error', 'type': 'server_error'}})
+        if html:
+            return self.send_body(200, build().encode('utf-8'), 'text/html; charset=utf-8')
+        self.send_json(200, build())
+
+    def send_json(self, status: int, payload):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # OpenAI 호환 API
+    def chat_completion(self, body):
+        prompt = ' '.join(str(m.get('content', '')) for m in body.get('messages', []))
+        answer = f"Benchmark answer for: {prompt[-200:]}"
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(answer)
+        return {
+            'id': 'chatcmpl-benchmark',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-3.5-turbo'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': answer},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+    def embeddings(self, body):
+        inputs = body.get('input', [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = body.get('dimensions') or self.server.embedding_dimensions
+
+        data = []
+        for index, value in enumerate(inputs):
+            vector = fake_embedding(value, dimensions)
+            if body.get('encoding_format') == 'base64':
+                vector = base64.b64encode(struct.pack(f'<{dimensions}f', *vector)).decode('ascii')
+            data.append({'object': 'embedding', 'index': index, 'embedding': vector})
+
+        tokens = sum(len(v) if isinstance(v, list) else count_tokens(v) for v in inputs)
+        return {
+            'object': 'list',
+            'data': data,
+            'model': body.get('model', 'text-embedding-3-small'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens},
+        }
+
+    # Gemini REST API
+    def generate_content(self, path, body):
+        prompt = ' '.join(
+            part.get('text', '')
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        answer = f"Benchmark Gemini answer for: {prompt[-200:]}"
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(answer)
+        return {
+            'candidates': [{
+                'content': {'parts': [{'text': answer}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+            'usageMetadata': {
+                'promptTokenCount': prompt_tokens,
+                'candidatesTokenCount': completion_tokens,
+                'totalTokenCount': prompt_tokens + completion_tokens,
+            },
+        }
+
+    # Google 번역 모바일 페이지 (deep_translator 가 파싱하는 형식)
+    def translate(self, params):
+        text = params.get('q', [''])[0]
+        target = params.get('tl', ['en'])[0]
+        return f'<html><body><div class="result-container">[{escape(target)}] {escape(text)}</div></body></html>'
+
+    # Phi GPU 서버
+    def ask(self, body):
+        question = body.get('question', '')
+        answer = f"Benchmark Phi answer for: {question[-200:]}"
+        return {
+            'success': True,
+            'answer': answer,
+            'inference_time': 0.0,
+            'prompt_tokens': count_tokens(question + ' ' + body.get('context', '')),
+            'completion_tokens': count_tokens(answer),
+        }
+
+
+class FakeAIServer(ThreadingHTTPServer):
+    """OpenAI(채팅/임베딩), Gemini, Google 번역, Phi GPU 서버를 흉내 내는 로컬 HTTP 서버
+
+    서비스마다 응답 지연과 오류율을 설정할 수 있어 유료 API 없이 부하 테스트에 사용한다.
+
+        with FakeAIServer(profiles={'openai': ServiceProfile(300, 50)}) as server:
+            with override_settings(**server.settings()):
+                ...
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        profiles: Optional[Dict[str, ServiceProfile]] = None,
+        embedding_dimensions: int = 384,
+        seed: Optional[int] = None
+    ):
+        super().__init__((host, port), _Handler)
+        self.profiles = {service: ServiceProfile() for service in SERVICES}
+        self.profiles.update(profiles or {})
+        self.embedding_dimensions = embedding_dimensions
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def settings(self) -> Dict[str, str]:
+        """이 서버를 사용하도록 하는 Django 설정 값 (환경 변수 이름과 같음)"""
+        return {
+            'OPENAI_BASE_URL': f'{self.url}/v1',
+            'GEMINI_API_ENDPOINT': self.url,
+            'GOOGLE_TRANSLATE_URL': f'{self.url}/m',
+            'GPU_AI_SERVER_URL': self.url,
+        }
+
+    def handle_error(self, request, client_address):
+        # 클라이언트 타임아웃 등으로 끊긴 연결은 조용히 무시
+        logger.debug(f"Fake AI server request from {client_address} failed", exc_info=True)
+
+    def start(self) -> 'FakeAIServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-ai-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'FakeAIServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
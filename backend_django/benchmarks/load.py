@@ -0,0 +1,116 @@
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import connection
+
+from core import metrics
+
+
+def percentile(values: List[float], q: float) -> float:
+    """nearest-rank 백분위수"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def stage_means() -> Dict[str, float]:
+    """채팅 단계별 평균 소요 시간(ms), 레이블(제공자 등)이 다르면 따로 집계"""
+    means = {}
+    for labels, (count, total) in metrics.stage_duration.totals().items():
+        label_map = dict(labels)
+        name = label_map.pop('stage')
+        if label_map:
+            name += '{' + ','.join(f'{k}={v}' for k, v in sorted(label_map.items())) + '}'
+        means[name] = round(total / count * 1000, 2) if count else 0.0
+    return dict(sorted(means.items()))
+
+
+def run_load(
+    call: Callable[[int], Any],
+    requests: int,
+    concurrency: int,
+    warmup: int = 0
+) -> Dict[str, Any]:
+    """call(i) 를 고정 동시성으로 requests 번 실행하고 처리량과 지연 시간 분포 반환
+
+    call 이 예외를 던지면 오류로 집계한다. 단계별 평균은 이번 실행분만 포함한다.
+    """
+    for i in range(warmup):
+        try:
+            call(-1 - i)
+        except Exception:
+            pass
+    metrics.stage_duration.clear()
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def worker(i: int):
+        started = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            call(i)
+        except Exception as e:
+            error = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append(elapsed)
+
+    # 작업 스레드의 DB 연결은 요청 사이클이 닫지 않으므로 스레드마다 한 번씩 닫음
+    barrier = threading.Barrier(concurrency)
+
+    def close_connection(_):
+        barrier.wait()
+        connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark') as executor:
+        list(executor.map(worker, range(requests)))
+        duration = time.perf_counter() - started
+        list(executor.map(close_connection, range(concurrency)))
+
+    to_ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'succeeded': len(latencies),
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration else 0.0,
+        'latency_ms': {
+            'mean': to_ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+            'p50': to_ms(percentile(latencies, 50)),
+            'p95': to_ms(percentile(latencies, 95)),
+            'p99': to_ms(percentile(latencies, 99)),
+            'max': to_ms(max(latencies, default=0.0)),
+        },
+        'stages_ms': stage_means(),
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """두 벤치마크 결과의 시나리오별 처리량/지연 시간 변화"""
+    lines = []
+    for name, result in current.get('scenarios', {}).items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        parts = []
+        for key in ('p50', 'p95', 'p99'):
+            old, new = before['latency_ms'][key], result['latency_ms'][key]
+            change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+            parts.append(f'{key} {old:.1f} -> {new:.1f}ms ({change})')
+        old, new = before['throughput_rps'], result['throughput_rps']
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+        parts.append(f'throughput {old:.1f} -> {new:.1f} rps ({change})')
+        lines.append(f'{name}: ' + ', '.join(parts))
+    return lines
@@ -0,0 +1,213 @@
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from ai_services.rag import RAG
+from ai_services.vector_index import resolve_collection
+from core import metrics, usage
+
+from .load import percentile, stage_means
+
+# 변형 설정에서 지정할 수 있는 값 (search_with_translation 인자 + 컬렉션)
+VARIANT_KEYS = {
+    'top_k': int,
+    'fetch_k': int,
+    'lambda_mult': float,
+    'context_docs': int,
+    'collection': str,
+}
+
+
+def parse_variant(spec: str) -> Dict[str, Any]:
+    """'이름:top_k=3,fetch_k=10' 형식의 검색 설정 (값을 생략하면 현재 설정 사용)"""
+    name, _, params = spec.partition(':')
+    variant: Dict[str, Any] = {'name': name}
+    for param in filter(None, params.split(',')):
+        key, sep, value = param.partition('=')
+        if not sep or key not in VARIANT_KEYS:
+            raise ValueError(f"잘못된 설정 '{param}' (사용 가능: {', '.join(VARIANT_KEYS)})")
+        variant[key] = VARIANT_KEYS[key](value)
+    return variant
+
+
+def check_ks(variant: Dict[str, Any], ks: List[int]):
+    """recall@k 의 k 가 LLM 에 전달되는 문서 수(context_docs)를 넘지 않는지 확인
+
+    recall 은 references(context_docs 개)로 계산하므로 더 큰 k 는 recall@context_docs 와 같아져 오해를 부른다.
+    """
+    context_docs = variant.get('context_docs') or settings.RAG_CONTEXT_DOCS
+    too_large = [k for k in ks if k > context_docs]
+    if too_large:
+        raise ValueError(
+            f"{variant['name']}: k={','.join(map(str, too_large))} 이(가) context_docs={context_docs} 보다 큽니다."
+        )
+
+
+def items_from_questions(questions: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """파인튜닝 질문 파일(question_generator 출력)의 질문을 평가 항목으로 변환
+
+    질문의 국가/주제에 해당하는 PDF(<국가>_<문서 종류>.pdf)를 정답 출처로 둔다.
+    """
+    items = []
+    for q in questions:
+        country, doc_type = RAG.normalize_filters(q['country'], q['topic'])
+        items.append({
+            'id': q.get('id') or q.get('question_id', ''),
+            'question': q['question'],
+            'country': q['country'],
+            'topic': q['topic'],
+            'expected': [{'source': f'{country}_{doc_type}.pdf'}],
+        })
+    return items
+
+
+def _normalize_item(item: Dict[str, Any], index: int) -> Dict[str, Any]:
+    expected = item.get('expected')
+    if expected is None:
+        sources = item.get('expected_source') or []
+        expected = [{'source': s} for s in ([sources] if isinstance(sources, str) else sources)]
+    if not expected:
+        raise ValueError(f"{index}번째 항목에 정답(expected 또는 expected_source)이 없습니다.")
+    return {
+        'id': item.get('id') or str(index),
+        'question': item['question'],
+        'country': item.get('country'),
+        'topic': item.get('topic'),
+        'expected': expected,
+    }
+
+
+def load_items(path: str) -> List[Dict[str, Any]]:
+    """평가 항목 읽기
+
+    - JSONL 또는 JSON 배열: {question, country, topic, expected: [{source, page?, section?}]}
+      (expected 대신 expected_source 에 파일명 또는 파일명 목록을 써도 됨)
+    - 파인튜닝 질문 파일 ({"questions": [...]}): items_from_questions 로 변환
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            data = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict) and 'questions' in data:
+        return items_from_questions(data['questions'])
+    return [_normalize_item(item, i) for i, item in enumerate(data, start=1)]
+
+
+def is_match(reference: Dict[str, Any], expected: Dict[str, Any]) -> bool:
+    """검색 결과가 정답 청크/출처에 해당하는지 (page, section 은 지정된 경우에만 비교)"""
+    if reference.get('source') != expected.get('source'):
+        return False
+    for key in ('page', 'section'):
+        if expected.get(key) is not None and reference.get(key) != expected[key]:
+            return False
+    return True
+
+
+def score_item(references: List[Dict[str, Any]], expected: List[Dict[str, Any]], ks: List[int]) -> Dict[str, Any]:
+    """한 질문의 recall@k 와 역순위(첫 정답 순위의 역수)"""
+    ranks = []
+    for target in expected:
+        rank = next((i for i, ref in enumerate(references, start=1) if is_match(ref, target)), None)
+        ranks.append(rank)
+
+    found = [rank for rank in ranks if rank is not None]
+    return {
+        'recall': {k: sum(1 for rank in found if rank <= k) / len(expected) for k in ks},
+        'reciprocal_rank': 1 / min(found) if found else 0.0,
+    }
+
+
+def evaluate(
+    rag: RAG,
+    items: List[Dict[str, Any]],
+    variant: Dict[str, Any],
+    ks: List[int]
+) -> Dict[str, Any]:
+    """한 검색 설정으로 모든 항목을 검색하고 품질(recall@k, MRR)과 비용(컨텍스트 토큰, 지연 시간) 집계
+
+    recall 은 LLM 에 전달되는 문서(references, context_docs 개)를 기준으로 계산한다. (check_ks 참고)
+    """
+    check_ks(variant, ks)
+    vectorstore = None
+    if variant.get('collection'):
+        vectorstore = rag.get_vectorstore(resolve_collection(rag.persist_directory, variant['collection']))
+    options = {key: variant.get(key) for key in ('top_k', 'fetch_k', 'lambda_mult', 'context_docs')}
+
+    metrics.stage_duration.clear()
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks: List[float] = []
+    context_tokens: List[int] = []
+    latencies: List[float] = []
+    errors = 0
+
+    for item in items:
+        country, doc_type = RAG.normalize_filters(item['country'], item['topic'])
+        started = time.perf_counter()
+        try:
+            # 평가용 검색의 사용량은 DB 에 저장하지 않음
+            with usage.collect():
+                context, references = rag.search_with_translation(
+                    item['question'], country=country, doc_type=doc_type, vectorstore=vectorstore, **options
+                )
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+        score = score_item(references, item['expected'], ks)
+        for k in ks:
+            recalls[k].append(score['recall'][k])
+        reciprocal_ranks.append(score['reciprocal_rank'])
+        context_tokens.append(len(rag.tokenizer.encode_ordinary(context)) if references else 0)
+
+    mean = lambda values: sum(values) / len(values) if values else 0.0
+    to_ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        'variant': variant,
+        'items': len(items),
+        'errors': errors,
+        'recall': {str(k): round(mean(recalls[k]), 4) for k in ks},
+        'mrr': round(mean(reciprocal_ranks), 4),
+        'context_tokens': round(mean(context_tokens), 1),
+        'latency_ms': {
+            'mean': to_ms(mean(latencies)),
+            'p50': to_ms(percentile(latencies, 50)),
+            'p95': to_ms(percentile(latencies, 95)),
+        },
+        'stages_ms': stage_means(),
+    }
+
+
+def format_table(results: List[Dict[str, Any]], ks: List[int], previous: Optional[Dict[str, Any]] = None) -> List[str]:
+    """설정별 결과를 한 표로 (previous 가 있으면 같은 이름 설정과의 차이를 괄호로 표시)"""
+    before = {r['variant']['name']: r for r in (previous or {}).get('results', [])}
+    columns = [f'recall@{k}' for k in ks] + ['MRR', 'ctx tokens', 'p50 ms', 'p95 ms', 'search ms', 'errors']
+
+    def row(result):
+        stages = result['stages_ms']
+        return [
+            *(result['recall'].get(str(k), 0.0) for k in ks),
+            result['mrr'],
+            result['context_tokens'],
+            result['latency_ms']['p50'],
+            result['latency_ms']['p95'],
+            round(stages.get('rag.search', 0.0) + stages.get('rag.mmr', 0.0), 2),
+            result['errors'],
+        ]
+
+    lines = [' | '.join(['variant'.ljust(16)] + [c.rjust(12) for c in columns])]
+    for result in results:
+        name = result['variant']['name']
+        cells = []
+        old = before.get(name)
+        for i, value in enumerate(row(result)):
+            cell = f'{value:.3f}' if isinstance(value, float) and i <= len(ks) else f'{value:g}'
+            if old is not None:
+                cell += f' ({round(value - row(old)[i], 4):+g})'
+            cells.append(cell.rjust(12))
+        lines.append(' | '.join([name.ljust(16)] + cells))
+    return lines
@@ -1,15 +1,24 @@
 import logging
 import json
 import asyncio
-from django.db.models import F
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q, Max, Count
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from core.models import Conversation, Message, FAQ, Document
+from core.models import Conversation, Message, FAQ, Document, UsageRecord
+from core.pagination import encode_cursor, decode_cursor, CURSOR_ERRORS
+from core.cache import history_cache_key, history_version_key, get_history_version, bump_history_version
+from core import usage
+from core.metrics import span
+from core.profiling import trace_memory
 from ai_services.llm import LLM
 from ai_services.rag import RAG
 
@@ -83,65 +92,43 @@ def process_message(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 대화 가져오기 또는 생성
+        # 대화와 최근 히스토리 가져오기 (새 대화는 응답 저장 시 함께 생성)
         conversation_id = data.get('conversation_id')
         if conversation_id:
-            try:
-                conversation = Conversation.objects.get(id=conversation_id)
-            except Conversation.DoesNotExist:
+            with span('db.read'):
+                conversation, history, history_version = _load_conversation_tail(conversation_id)
+            if conversation is None:
                 return Response(
                     {'error': f'Conversation {conversation_id} not found'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
         else:
-            conversation = Conversation.objects.create(
+            conversation = Conversation(
                 session_id=data.get('session_id', f'session_{conversation_id}'),
                 country=data.get('country'),
                 topic=data.get('topic')
             )
-        
-        # 사용자 메시지 저장
-        user_message = Message.objects.create(
-            conversation=conversation,
-            role="user",
-            content=message_content
-        )
-        
-        # 이전 메시지들 가져오기 (현재 메시지 제외)
-        previous_messages = conversation.messages.exclude(
-            id=user_message.id
-        ).order_by('created_at')
-        
-        history = [
-            {"role": m.role, "content": m.content}
-            for m in previous_messages
-        ]
+            history = []
+            history_version = None
         
         # 디버그: 히스토리 확인
-        logger.info(f"Conversation {conversation.id} history: {len(history)} messages")
-        
-        country = data.get('country') or conversation.country
-        if country:
-            country = country.replace(" ", "").lower()
+        logger.info(f"Conversation {conversation.id or 'new'} history: {len(history)} messages")
         
-        topic = data.get('topic') or conversation.topic
-        if topic:
-            if topic == "immigration":
-                topic = "immigration_regulations_info"
-            elif topic == "safety":
-                topic = "immigration_safety_info"
-            else:
-                topic = topic + "_info"
+        country, topic = RAG.normalize_filters(
+            data.get('country') or conversation.country,
+            data.get('topic') or conversation.topic
+        )
         
         # RAG 인스턴스 가져오기
         rag = get_rag()
         
         # RAG 검색 (번역 포함)
-        context, references = rag.search_with_translation(
-            query=message_content,
-            country=country,
-            doc_type=topic
-        )
+        with span('rag'), trace_memory('rag'):
+            context, references = rag.search_with_translation(
+                query=message_content,
+                country=country,
+                doc_type=topic
+            )
         
         # RAG 검색 결과 로그
         logger.info(f"RAG search country: {country}, topic: {topic}")
@@ -152,34 +139,39 @@ def process_message(request):
         model_id = data.get('model_id')
         llm = get_llm()
         
-        if model_id:
-            llm_with_model = LLM(model_name=model_id)
-            response_text = asyncio.run(llm_with_model.generate_with_translation(
-                query=message_content,
-                context=context,
-                references=references,
-                history=history,
-                translate_to_korean=True
-            ))
-        else:
-            response_text = asyncio.run(llm.generate_with_translation(
-                query=message_content,
-                context=context,
-                references=references,
-                history=history,
-                translate_to_korean=True
-            ))
+        with span('llm'), trace_memory('llm'):
+            if model_id:
+                llm_with_model = LLM(model_name=model_id)
+                response_text = asyncio.run(llm_with_model.generate_with_translation(
+                    query=message_content,
+                    context=context,
+                    references=references,
+                    history=history,
+                    translate_to_korean=True
+                ))
+            else:
+                response_text = asyncio.run(llm.generate_with_translation(
+                    query=message_content,
+                    context=context,
+                    references=references,
+                    history=history,
+                    translate_to_korean=True
+                ))
         
         # 응답 길이 로그
         logger.info(f"Generated response length: {len(response_text) if response_text else 0}")
         
-        # 응답 저장
-        assistant_message = Message.objects.create(
+        # 대화(새 대화인 경우)와 두 메시지를 한 번에 저장
+        user_message = Message(conversation=conversation, role="user", content=message_content)
+        assistant_message = Message(
             conversation=conversation,
             role="assistant",
             content=response_text,
-            references=json.dumps(references) if references else None
+            references=references or None
         )
+        with span('db.write'):
+            _save_turn(conversation, [user_message, assistant_message], country, topic)
+            _append_history_tail(conversation, history, [user_message, assistant_message], history_version)
         
         return Response({
             'message': {
@@ -200,34 +192,180 @@ def process_message(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _history_tail_entry(conversation, history, version):
+    return {
+        'version': version,
+        'session_id': conversation.session_id,
+        'country': conversation.country,
+        'topic': conversation.topic,
+        'history': history[-settings.CHAT_HISTORY_TAIL:],
+    }
+
+def _load_conversation_tail(conversation_id):
+    """대화와 최근 히스토리(CHAT_HISTORY_TAIL 개), 히스토리 버전 조회
+    
+    캐시된 히스토리는 버전이 현재 버전과 같을 때만 사용하고 DB를 읽지 않는다.
+    """
+    key = history_cache_key(conversation_id)
+    version = None
+    if settings.CHAT_HISTORY_CACHE_TIMEOUT:
+        cached = cache.get_many([key, history_version_key(conversation_id)])
+        entry = cached.get(key)
+        version = cached.get(history_version_key(conversation_id))
+        if entry is not None and version is not None and entry.get('version') == version:
+            conversation = Conversation(
+                id=conversation_id,
+                session_id=entry['session_id'],
+                country=entry['country'],
+                topic=entry['topic']
+            )
+            conversation._state.adding = False
+            return conversation, entry['history'], version
+        
+        # DB 조회 전에 버전을 읽어 두어, 조회 중에 다른 턴이 기록하면 이 항목이 무효가 되게 함
+        if version is None:
+            version = get_history_version(conversation_id)
+    
+    # 최근 메시지와 대화를 한 번에 조회 (필요한 컬럼만)
+    tail = list(
+        Message.objects.filter(conversation_id=conversation_id)
+        .select_related('conversation')
+        .only('role', 'content', 'conversation__session_id', 'conversation__country', 'conversation__topic')
+        .order_by('-created_at', '-id')[:settings.CHAT_HISTORY_TAIL]
+    )
+    if tail:
+        conversation = tail[0].conversation
+    else:
+        conversation = Conversation.objects.only('session_id', 'country', 'topic').filter(id=conversation_id).first()
+        if conversation is None:
+            return None, [], None
+    
+    history = [{"role": m.role, "content": m.content} for m in reversed(tail)]
+    if settings.CHAT_HISTORY_CACHE_TIMEOUT:
+        cache.set(key, _history_tail_entry(conversation, history, version), settings.CHAT_HISTORY_CACHE_TIMEOUT)
+    return conversation, history, version
+
+def _save_turn(conversation, messages, country=None, topic=None):
+    """대화(새 대화인 경우)와 메시지들, 이번 턴의 AI 호출 사용량을 한 트랜잭션으로 저장"""
+    entries = usage.pending()
+    with transaction.atomic():
+        if conversation.pk is None:
+            conversation.save()
+        Message.objects.bulk_create(messages)
+        if messages and messages[0].pk is None:
+            _fetch_message_ids(conversation, messages)
+        if entries and settings.USAGE_LEDGER_ENABLED:
+            UsageRecord.objects.bulk_create(usage.build_records(entries, conversation, country, topic))
+    entries.clear()
+
+def _fetch_message_ids(conversation, messages):
+    """bulk_create 가 id 를 돌려주지 않는 DB(MySQL)에서 방금 저장한 메시지의 id 조회
+    
+    같은 대화에 동시에 저장된 다른 턴과 섞이지 않도록 (role, created_at) 으로 맞춘다.
+    """
+    rows = conversation.messages.filter(
+        created_at__in=[m.created_at for m in messages]
+    ).values_list('id', 'role', 'created_at')
+    ids = {(role, created_at): message_id for message_id, role, created_at in rows}
+    for message in messages:
+        message.pk = ids.get((message.role, message.created_at))
+
+def _append_history_tail(conversation, history, messages, version=None):
+    """저장한 메시지를 캐시된 히스토리 끝에 추가
+    
+    버전을 올린 결과가 읽은 버전 + 1 이 아니면 그 사이 다른 턴이 기록한 것이므로
+    오래된 히스토리로 덮어쓰지 않고 캐시를 지운다. (새 대화는 version=None)
+    """
+    if not settings.CHAT_HISTORY_CACHE_TIMEOUT:
+        return
+    key = history_cache_key(conversation.id)
+    if version is None:
+        new_version = get_history_version(conversation.id)
+    else:
+        new_version = bump_history_version(conversation.id)
+        if new_version != version + 1:
+            cache.delete(key)
+            return
+    history = history + [{"role": m.role, "content": m.content} for m in messages]
+    cache.set(key, _history_tail_entry(conversation, history, new_version), settings.CHAT_HISTORY_CACHE_TIMEOUT)
+
+def _serialize_message(message):
+    return {
+        'id': message.id,
+        'role': message.role,
+        'content': message.content,
+        'references': message.references,
+        'created_at': message.created_at
+    }
+
 @api_view(['GET'])
 def get_conversation_history(request, conversation_id):
-    """대화 기록 조회"""
+    """대화 기록 조회
+
+    - cursor/limit: (created_at, id) 기준 keyset 페이지네이션
+    - stream=true: 커서 이후 전체 메시지를 NDJSON 으로 스트리밍
+    - ETag/If-None-Match: 변경이 없으면 304 반환
+    """
     try:
-        conversation = Conversation.objects.get(id=conversation_id)
-        messages = conversation.messages.all().order_by('created_at')
-        
-        message_data = []
-        for message in messages:
-            references = None
-            if message.references:
-                try:
-                    references = json.loads(message.references)
-                except json.JSONDecodeError:
-                    references = None
-            
-            message_data.append({
-                'id': message.id,
-                'role': message.role,
-                'content': message.content,
-                'references': references,
-                'created_at': message.created_at
-            })
+        # 존재 여부와 ETag 계산용 요약을 한 번에 조회 (메시지는 추가만 되므로 마지막 id + 개수로 충분)
+        summary = Conversation.objects.filter(id=conversation_id).annotate(
+            last_message_id=Max('messages__id'),
+            message_count=Count('messages')
+        ).values('id', 'last_message_id', 'message_count').first()
+        if summary is None:
+            raise Conversation.DoesNotExist
+        
+        cursor = request.GET.get('cursor')
+        stream = request.GET.get('stream', '').lower() in ('1', 'true')
+        try:
+            limit = int(request.GET.get('limit', settings.CHAT_HISTORY_PAGE_SIZE))
+            limit = max(1, min(limit, settings.CHAT_HISTORY_MAX_PAGE_SIZE))
+            cursor_key = decode_cursor(cursor) if cursor else None
+        except CURSOR_ERRORS:
+            return Response(
+                {'error': 'Invalid cursor or limit'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response({
-            'conversation_id': conversation.id,
-            'messages': message_data
+        etag = '"{}-{}-{}-{}-{}-{}"'.format(
+            conversation_id, summary['last_message_id'] or 0, summary['message_count'],
+            cursor or '', limit, int(stream)
+        )
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        
+        messages = Message.objects.filter(conversation_id=conversation_id).order_by('created_at', 'id')
+        if cursor_key:
+            created_at, message_id = cursor_key
+            messages = messages.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+            )
+        
+        if stream:
+            def ndjson():
+                for message in messages.iterator(chunk_size=200):
+                    yield json.dumps(_serialize_message(message), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+            
+            response = StreamingHttpResponse(ndjson(), content_type='application/x-ndjson')
+            response['ETag'] = etag
+            return response
+        
+        # limit + 1 개를 읽어 다음 페이지 존재 여부 확인
+        page = list(messages[:limit + 1])
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+        
+        response = Response({
+            'conversation_id': summary['id'],
+            'messages': [_serialize_message(message) for message in page],
+            'next_cursor': next_cursor
         }, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        return response
         
     except Conversation.DoesNotExist:
         logger.error(f"Conversation {conversation_id} not found")
@@ -344,11 +482,11 @@ def get_document_sources(request):
         # DB에서 문서 가져오기
         queryset = Document.objects.exclude(url__isnull=True).exclude(url='')
         
-        # 필터 적용
+        # 필터 적용 (인덱스가 있는 정규화 컬럼 사용)
         if country:
-            queryset = queryset.filter(country__iexact=country)
+            queryset = queryset.filter(country_key=Document.normalize_key(country))
         if topic:
-            queryset = queryset.filter(topic__iexact=topic)
+            queryset = queryset.filter(topic_key=Document.normalize_key(topic))
             
         # URL 리스트 반환 (중복 제거)
         urls = list(set(queryset.values_list('url', flat=True)))
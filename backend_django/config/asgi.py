@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# 영구 연결 기본값을 ASGI 에 맞게 선택 (settings.DB_CONN_MAX_AGE)
+os.environ.setdefault('DJANGO_SERVER_TYPE', 'asgi')
 
 application = get_asgi_application()
@@ -48,6 +48,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.UsageLedgerMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -72,19 +75,64 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
-DATABASES = {
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.mysql')
+
+# 영구 연결: 요청마다 연결을 새로 맺지 않고 스레드별 연결을 CONN_MAX_AGE 초 동안 재사용
+# (재사용 전 헬스 체크). ASGI 에서는 요청마다 다른 스레드가 연결을 열 수 있어
+# 연결이 누적되므로 기본값 0 (ProxySQL 등 외부 풀러 사용)
+SERVER_TYPE = os.getenv('DJANGO_SERVER_TYPE', 'wsgi')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '0' if SERVER_TYPE == 'asgi' else '60'))
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    # 로컬 개발/테스트용 SQLite
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', 'RTG_V2'),
+            'USER': os.getenv('DB_USER', 'root'),
+            'PASSWORD': os.getenv('DB_PASSWORD', 'mysql'),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '3306'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+            },
+        }
+    }
+
+# Cache (여러 워커 간 무효화를 공유하려면 Redis 등 공용 백엔드 사용)
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': os.getenv('DB_NAME', 'RTG_V2'),
-        'USER': os.getenv('DB_USER', 'root'),
-        'PASSWORD': os.getenv('DB_PASSWORD', 'mysql'),
-        'HOST': os.getenv('DB_HOST', 'localhost'),
-        'PORT': os.getenv('DB_PORT', '3306'),
-        'OPTIONS': {
-            'charset': 'utf8mb4',
-        },
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'ready-to-go'),
     }
 }
+# 문서 목록의 필터별 전체 개수 캐시 (LocMem 이면 다른 워커의 무효화가 보이지 않으므로 캐시하지 않고
+# 인덱스가 있는 정규화 컬럼으로 매번 계산)
+DOCUMENT_COUNT_CACHE_TIMEOUT = int(os.getenv(
+    'DOCUMENT_COUNT_CACHE_TIMEOUT',
+    '0' if 'locmem' in CACHES['default']['BACKEND'].lower() else '300'
+))
+
+# 국가/토픽/출처 카탈로그 (문서 변경 시 버전 키로 무효화)
+# (LocMem 캐시는 워커마다 따로라 다른 워커의 무효화가 보이지 않으므로 짧게 유지)
+CATALOG_CACHE_TIMEOUT = int(os.getenv(
+    'CATALOG_CACHE_TIMEOUT',
+    '60' if 'locmem' in CACHES['default']['BACKEND'].lower() else str(24 * 60 * 60)
+))
+CATALOG_MAX_AGE = 300
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -146,26 +194,134 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only in development
 # Custom settings for AI services
 # OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# 외부 서비스 주소 재정의 (비우면 기본 주소, `python manage.py run_benchmark` 의 가짜 서버 등)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
 EMBEDDING_MODEL = 'text-embedding-3-small'
+EMBEDDING_DIMENSIONS = 384
 DEFAULT_LLM_MODEL = 'gpt-4'
 
 # Google
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', '')
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT', '')
+GOOGLE_TRANSLATE_URL = os.getenv('GOOGLE_TRANSLATE_URL', '')
 
 # Vector DB
 VECTOR_DB_PATH = os.getenv('VECTOR_DB_PATH', str(BASE_DIR / 'Ready_To_Go' / 'backend_django' / 'data' / 'vectors'))
+# 검색에 사용하는 컬렉션 별칭 (index_aliases.json 에서 실제 컬렉션으로 해석)
+VECTOR_COLLECTION_NAME = os.getenv('VECTOR_COLLECTION_NAME', 'global-documents')
+VECTOR_SNAPSHOT_DIR = os.getenv('VECTOR_SNAPSHOT_DIR', str(BASE_DIR / 'data' / 'snapshots'))
+# 재색인 시 이전 버전 컬렉션 보존 기간 및 새 컬렉션 최소 레코드 비율 (이전 버전 대비)
+VECTOR_GC_GRACE_HOURS = float(os.getenv('VECTOR_GC_GRACE_HOURS', '24'))
+VECTOR_REBUILD_MIN_RATIO = 0.5
+
+# 문서 수정/삭제를 벡터 DB 청크(document_id 메타데이터)에 반영
+VECTOR_SYNC_ENABLED = os.getenv('VECTOR_SYNC_ENABLED', 'True').lower() == 'true'
+VECTOR_SYNC_BATCH_SIZE = 500
 
 # LLM Settings
 MAX_CONTEXT_TOKENS = 3000
-TOP_K_RESULTS = 5
+TOP_K_RESULTS = int(os.getenv('TOP_K_RESULTS', '5'))
+# MMR 후보 수/다양성 가중치와 LLM 에 전달하는 문서 수 (`python manage.py evaluate_retrieval` 로 비교)
+RAG_MMR_FETCH_K = int(os.getenv('RAG_MMR_FETCH_K', '20'))
+RAG_MMR_LAMBDA = float(os.getenv('RAG_MMR_LAMBDA', '0.5'))
+RAG_CONTEXT_DOCS = int(os.getenv('RAG_CONTEXT_DOCS', '3'))
+
+# 대화 기록 페이지 크기
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
+# LLM에 전달하는 최근 대화 메시지 수와 캐시 유지 시간
+# (프로세스별 LocMem 캐시는 워커 간 공유되지 않으므로 공용 캐시일 때만 기본 사용)
+CHAT_HISTORY_TAIL = 20
+CHAT_HISTORY_CACHE_TIMEOUT = int(os.getenv(
+    'CHAT_HISTORY_CACHE_TIMEOUT',
+    '0' if 'locmem' in CACHES['default']['BACKEND'].lower() else '3600'
+))
 
 # GPU AI 서버 설정
-GPU_AI_SERVER_URL = "https://9c6b-34-168-217-150.ngrok-free.app"  # 실제 GPU 서버 IP로 변경
+GPU_AI_SERVER_URL = os.getenv('GPU_AI_SERVER_URL', "https://9c6b-34-168-217-150.ngrok-free.app")  # 실제 GPU 서버 IP로 변경
+
+# 파인튜닝 모델 로컬 실행 (ai_services/local_llm.py, torch/transformers/peft 필요)
+# 학습 결과 디렉토리(LoRA 어댑터 또는 병합된 모델), 설정하면 phi 모델 요청을 GPU 서버보다 먼저 처리
+LOCAL_LLM_MODEL_PATH = os.getenv('LOCAL_LLM_MODEL_PATH', '')
+LOCAL_LLM_DTYPE = os.getenv('LOCAL_LLM_DTYPE', 'float32')  # float32, bfloat16, float16(GPU)
+LOCAL_LLM_QUANTIZE = os.getenv('LOCAL_LLM_QUANTIZE', 'False').lower() == 'true'  # CPU int8 동적 양자화
+LOCAL_LLM_THREADS = int(os.getenv('LOCAL_LLM_THREADS', '0'))  # 0 이면 torch 기본값
+# 동시 요청을 최대 LOCAL_LLM_BATCH_WAIT_MS 동안 모아 한 번에 생성
+LOCAL_LLM_MAX_BATCH_SIZE = int(os.getenv('LOCAL_LLM_MAX_BATCH_SIZE', '8'))
+LOCAL_LLM_BATCH_WAIT_MS = float(os.getenv('LOCAL_LLM_BATCH_WAIT_MS', '10'))
+# 모은 요청을 프롬프트 길이 차이가 이 값(토큰) 이하인 것끼리 나눠 생성 (패딩 연산 감소, 0 이면 사용 안 함)
+LOCAL_LLM_BUCKET_WIDTH = int(os.getenv('LOCAL_LLM_BUCKET_WIDTH', '64'))
+LOCAL_LLM_MAX_INPUT_TOKENS = 1024
+LOCAL_LLM_MAX_NEW_TOKENS = 256
 
 # Document Processing
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# PDF 구조 인식 청킹 (tiktoken 토큰 기준)
+# 다른 값으로 `index_pdfs --no-switch` 후 evaluate_retrieval 의 collection 으로 비교 가능
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '512'))
+CHUNK_MIN_TOKENS = int(os.getenv('CHUNK_MIN_TOKENS', '64'))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '50'))
+
+# 문서 대량 등록 (원문은 파일로 보관, 색인 후에는 전체 재색인용으로 sources/<문서 id> 에 보관)
+BULK_INGEST_MAX_DOCUMENTS = 1000
+INGEST_UPLOAD_DIR = os.getenv('INGEST_UPLOAD_DIR', str(BASE_DIR / 'data' / 'uploads'))
+INGEST_EMBED_BATCH_SIZE = 500
+
+# 백그라운드 작업 큐 (jobs 테이블, `python manage.py run_worker` 프로세스가 처리)
+# JOB_WORKERS 를 1 이상으로 두면 웹 프로세스 스레드에서도 처리 (개발용)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '0'))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF_SECONDS = 30
+JOB_RETRY_MAX_BACKOFF_SECONDS = 3600
+JOB_POLL_INTERVAL = 2.0
+# heartbeat 가 이 시간 이상 없으면 워커가 죽은 것으로 보고 다시 대기열로 (max_attempts 에 도달했으면 실패 처리)
+JOB_STALE_SECONDS = 900
+# 실행 중인 작업은 진행 보고와 별개로 이 간격마다 heartbeat 갱신 (JOB_STALE_SECONDS 보다 충분히 짧게)
+JOB_HEARTBEAT_SECONDS = 60
+
+# 근사 중복 청크 제거 (SimHash 해밍 거리)
+CHUNK_DEDUP_ENABLED = os.getenv('CHUNK_DEDUP_ENABLED', 'True').lower() == 'true'
+CHUNK_DEDUP_MAX_DISTANCE = 3
+
+# 요청 단계별 소요 시간 (Server-Timing 헤더, /metrics 히스토그램)
+# 임계값 이상 걸린 요청은 전체 단계 트리를 로그로 남김
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'True').lower() == 'true'
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '5000'))
+# 설정하면 /metrics 요청에 `Authorization: Bearer <토큰>` 필요
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# 요청 단위 샘플링 프로파일러 (기본 비활성화, /api/profiles/ 에서 목록 조회)
+# - X-Profile 헤더 값이 PROFILING_TOKEN 과 같거나 스태프 로그인 사용자면 해당 요청 프로파일
+# - PROFILING_SAMPLE_RATE 비율로 무작위 프로파일 (관리자 토글이 있으면 토글 값 사용)
+# - PROFILING_TRACEMALLOC 또는 X-Profile-Memory: 1 이면 RAG/LLM 단계 메모리 할당도 기록 (느려짐)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+PROFILING_TRACEMALLOC = os.getenv('PROFILING_TRACEMALLOC', 'False').lower() == 'true'
+PROFILING_TRACEMALLOC_FRAMES = 1
+PROFILING_TRACEMALLOC_TOP = 20
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'data' / 'profiles'))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', '200'))
+
+# 외부 AI 호출 사용량 기록 (usage_records 테이블, /metrics 의 ai_* 지표)
+USAGE_LEDGER_ENABLED = os.getenv('USAGE_LEDGER_ENABLED', 'True').lower() == 'true'
+# 모델별 100만 토큰(번역은 100만 문자)당 USD, 목록에 없는 모델은 비용 0 으로 기록
+# (질문 번역은 deep_translator 의 무료 Google 웹 번역이라 문자 수만 기록)
+LLM_PRICING = {
+    'gpt-4': {'input': 30.0, 'output': 60.0},
+    'gpt-4o': {'input': 2.5, 'output': 10.0},
+    'gpt-4o-mini': {'input': 0.15, 'output': 0.6},
+    'gpt-3.5-turbo': {'input': 0.5, 'output': 1.5},
+    'gemini-1.5-flash': {'input': 0.075, 'output': 0.3},
+    'gemini-1.5-pro': {'input': 1.25, 'output': 5.0},
+    'text-embedding-3-small': {'input': 0.02},
+    'text-embedding-3-large': {'input': 0.13},
+}
+
 # Logging
 LOGGING = {
     'version': 1,
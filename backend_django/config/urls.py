@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from core.views import prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', prometheus_metrics, name='metrics'),
     path('api/', include('chat.urls')),
     path('api/', include('documents.urls')),
     path('api/', include('core.urls')),
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Document, Conversation, Message, FAQ
+from django.db.models import Sum
+from .models import Document, Conversation, Message, FAQ, Job, UsageRecord
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
@@ -10,10 +11,27 @@ class DocumentAdmin(admin.ModelAdmin):
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['session_id', 'country', 'topic', 'created_at']
+    list_display = ['session_id', 'country', 'topic', 'total_tokens', 'total_cost', 'created_at']
     list_filter = ['country', 'topic', 'created_at']
     search_fields = ['session_id', 'country', 'topic']
     ordering = ['-created_at']
+    
+    def get_queryset(self, request):
+        # 대화별 사용량 합계를 목록 쿼리 하나로 계산
+        return super().get_queryset(request).annotate(
+            _prompt_tokens=Sum('usage_records__prompt_tokens'),
+            _completion_tokens=Sum('usage_records__completion_tokens'),
+            _cost=Sum('usage_records__cost')
+        )
+    
+    def total_tokens(self, obj):
+        return (obj._prompt_tokens or 0) + (obj._completion_tokens or 0)
+    total_tokens.short_description = 'Tokens'
+    
+    def total_cost(self, obj):
+        return obj._cost or 0
+    total_cost.short_description = 'Cost (USD)'
+    total_cost.admin_order_field = '_cost'
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
@@ -36,3 +54,18 @@ class FAQAdmin(admin.ModelAdmin):
     def question_preview(self, obj):
         return obj.question[:50] + "..." if len(obj.question) > 50 else obj.question
     question_preview.short_description = 'Question Preview'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'status', 'progress', 'total', 'attempts', 'worker', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status', 'created_at']
+    ordering = ['-created_at']
+
+@admin.register(UsageRecord)
+class UsageRecordAdmin(admin.ModelAdmin):
+    list_display = ['stage', 'provider', 'model', 'prompt_tokens', 'completion_tokens', 'characters', 'latency_ms', 'cost', 'success', 'country', 'topic', 'conversation', 'created_at']
+    list_filter = ['stage', 'provider', 'model', 'success', 'country', 'topic']
+    date_hierarchy = 'created_at'
+    raw_id_fields = ['conversation']
+    list_select_related = ['conversation']
+    ordering = ['-created_at']
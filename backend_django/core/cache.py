@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+
+DOCUMENTS_VERSION_KEY = 'documents:version'
+
+
+def get_documents_version() -> int:
+    """문서 데이터 버전 (문서가 바뀔 때마다 증가, 캐시 키에 포함하여 무효화)"""
+    return cache.get_or_set(DOCUMENTS_VERSION_KEY, 1, None)
+
+
+def bump_documents_version():
+    """문서 관련 캐시 전체 무효화"""
+    try:
+        cache.incr(DOCUMENTS_VERSION_KEY)
+    except ValueError:
+        cache.set(DOCUMENTS_VERSION_KEY, 2, None)
+
+
+def documents_cache_key(name: str, *parts) -> str:
+    """현재 문서 버전이 포함된 캐시 키"""
+    suffix = ':'.join(str(part) for part in parts)
+    return f"documents:v{get_documents_version()}:{name}:{suffix}"
+
+
+def history_cache_key(conversation_id) -> str:
+    """대화별 최근 히스토리 캐시 키"""
+    return f"chat:history:{conversation_id}"
+
+
+def history_version_key(conversation_id) -> str:
+    """대화별 히스토리 버전 키 (캐시된 히스토리는 버전이 같을 때만 유효)"""
+    return f"chat:history:{conversation_id}:version"
+
+
+def get_history_version(conversation_id) -> int:
+    """현재 히스토리 버전 (키가 없으면 시각으로 초기화하여 이전에 캐시된 항목과 겹치지 않게 함)"""
+    return cache.get_or_set(history_version_key(conversation_id), time.time_ns(), None)
+
+
+def bump_history_version(conversation_id):
+    """히스토리 버전 증가 후 새 버전 반환 (버전 키가 없으면 None)"""
+    try:
+        return cache.incr(history_version_key(conversation_id))
+    except ValueError:
+        return None
@@ -0,0 +1,98 @@
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import get_documents_version
+from .models import COUNTRIES, Document
+
+logger = logging.getLogger(__name__)
+
+# 기본 목록 (DB에 데이터가 없는 경우)
+DEFAULT_COUNTRIES = [
+    "America", "Australia", "Austria", "Canada", "China",
+    "France", "Germany", "Italy", "Japan", "New Zealand",
+    "Philippines", "Singapore", "UK"
+]
+DEFAULT_TOPICS = ["visa", "insurance", "safety", "immigration"]
+DEFAULT_SOURCES = ["Government", "Embassy", "Immigration Department"]
+
+# 문서 토픽 -> 화면 토픽
+TOPIC_ALIASES = {
+    "immigration_regulations": "immigration",
+    "immigration_safety": "safety",
+}
+
+# 프로세스 내 캐시: 문서 버전이 같고 CATALOG_CACHE_TIMEOUT 이 지나지 않았으면 Django 캐시 조회도 생략
+# (LocMem 캐시는 다른 워커의 버전 증가를 볼 수 없으므로 짧은 유지 시간으로 갱신)
+_local_catalog: Dict[str, Any] = {}
+
+
+def _countries() -> list:
+    db_countries = set(Document.objects.values_list('country', flat=True).distinct())
+    if not db_countries:
+        return DEFAULT_COUNTRIES
+
+    # COUNTRIES 상수 순서를 유지하며 DB에 있는 국가만
+    available = [country['name_en'] for country in COUNTRIES if country['name_en'] in db_countries]
+    return available or sorted(db_countries)
+
+
+def _topics() -> list:
+    db_topics = Document.objects.values_list('topic', flat=True).distinct()
+    normalized = set()
+    for topic in db_topics:
+        if topic.endswith('_info'):
+            topic = topic[:-len('_info')]
+            topic = TOPIC_ALIASES.get(topic, topic)
+        normalized.add(topic)
+    return sorted(normalized) if normalized else DEFAULT_TOPICS
+
+
+def _sources() -> list:
+    db_sources = Document.objects.exclude(
+        source__isnull=True
+    ).exclude(
+        source=''
+    ).values_list('source', flat=True).distinct()
+    return sorted(db_sources) or DEFAULT_SOURCES
+
+
+def _etag(value) -> str:
+    digest = hashlib.sha1(json.dumps(value, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f'"{digest[:16]}"'
+
+
+def build_catalog(version: int) -> Dict[str, Any]:
+    """국가/토픽/출처 목록과 각 ETag 계산"""
+    catalog = {
+        'version': version,
+        'countries': _countries(),
+        'topics': _topics(),
+        'sources': _sources(),
+    }
+    catalog['etags'] = {name: _etag(catalog[name]) for name in ('countries', 'topics', 'sources')}
+    return catalog
+
+
+def get_catalog() -> Dict[str, Any]:
+    """카탈로그 조회 (프로세스 내 캐시 -> Django 캐시 -> DB 순)"""
+    version = get_documents_version()
+    catalog = _local_catalog.get('catalog')
+    if catalog and catalog['version'] == version and time.monotonic() < _local_catalog['expires_at']:
+        return catalog
+
+    key = f"documents:v{version}:catalog"
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = build_catalog(version)
+        cache.set(key, catalog, settings.CATALOG_CACHE_TIMEOUT)
+        logger.info(f"Catalog rebuilt for documents version {version}")
+
+    _local_catalog['catalog'] = catalog
+    _local_catalog['expires_at'] = time.monotonic() + settings.CATALOG_CACHE_TIMEOUT
+    return catalog
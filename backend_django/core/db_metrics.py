@@ -0,0 +1,58 @@
+import threading
+import time
+import weakref
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# 프로세스 단위 DB 연결 통계 (스레드마다 영구 연결 하나 = 워커별 연결 풀)
+_lock = threading.Lock()
+_stats = {
+    'connections_created': 0,
+    'requests': 0,
+    'requests_reused_connection': 0,
+}
+# 연결 래퍼 -> 연결 생성 시각 (스레드가 끝나 래퍼가 사라지면 함께 제거, 닫힌 연결은 조회 시 제외)
+_open: 'weakref.WeakKeyDictionary[Any, float]' = weakref.WeakKeyDictionary()
+
+
+@receiver(connection_created)
+def track_connection_created(sender, connection, **kwargs):
+    with _lock:
+        _stats['connections_created'] += 1
+        _open[connection] = time.time()
+
+
+@receiver(request_started)
+def track_request_started(sender, **kwargs):
+    """close_old_connections 이후 실행: 연결이 남아 있으면 이번 요청에서 재사용"""
+    connection = connections['default']
+    with _lock:
+        _stats['requests'] += 1
+        if connection.connection is not None:
+            _stats['requests_reused_connection'] += 1
+
+
+def snapshot() -> Dict[str, Any]:
+    """연결 통계와 설정"""
+    db = settings.DATABASES['default']
+    now = time.time()
+    with _lock:
+        stats = dict(_stats)
+        # 요청 스레드가 아닌 곳(작업 워커, 관리 명령)에서 닫힌 연결도 제외
+        ages = [now - created for connection, created in list(_open.items()) if connection.connection is not None]
+
+    requests = stats['requests']
+    return {
+        **stats,
+        'reuse_ratio': round(stats['requests_reused_connection'] / requests, 4) if requests else 0.0,
+        'open_connections': len(ages),
+        'oldest_connection_age': round(max(ages), 1) if ages else 0.0,
+        'conn_max_age': db.get('CONN_MAX_AGE', 0),
+        'conn_health_checks': db.get('CONN_HEALTH_CHECKS', False),
+        'server_type': settings.SERVER_TYPE,
+    }
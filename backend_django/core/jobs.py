@@ -0,0 +1,344 @@
+import os
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import usage
+from .models import Job, JobLock
+
+logger = logging.getLogger(__name__)
+
+# 작업 종류 -> 처리 함수
+_handlers: Dict[str, Callable[[Job], Any]] = {}
+# 작업 종류 -> (잠금 이름, 단독 실행 여부)
+# 단독 작업은 같은 잠금의 다른 작업이 하나도 실행 중이 아닐 때만, 공유 작업은 단독 작업이 없을 때만 시작
+# (예: 별칭을 전환하는 전체 재색인은 단독, 문서 대량 등록 색인은 공유)
+_locks: Dict[str, Tuple[str, bool]] = {}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """취소 요청된 작업을 중단할 때 사용"""
+
+
+def register(kind: str, exclusive: bool = False, lock: Optional[str] = None):
+    """작업 처리 함수 등록 데코레이터
+
+    exclusive 면 같은 잠금(기본: 작업 종류 이름)을 쓰는 작업과 동시에 실행하지 않는다.
+    lock 만 지정하면 같은 잠금의 단독 작업이 실행 중일 때 대기한다.
+    """
+    def decorator(func: Callable[[Job], Any]):
+        _handlers[kind] = func
+        if exclusive or lock:
+            _locks[kind] = (lock or kind, exclusive)
+        return func
+    return decorator
+
+
+def registered_kinds():
+    return sorted(_handlers)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """웹 프로세스 내부 작업 스레드 풀 (JOB_WORKERS=0 이면 사용하지 않음)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.JOB_WORKERS,
+                thread_name_prefix='job-worker'
+            )
+    return _executor
+
+
+def enqueue(
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    total: int = 0,
+    max_attempts: Optional[int] = None,
+    dispatch: bool = True
+) -> Job:
+    """작업을 큐(jobs 테이블)에 등록
+
+    run_worker 프로세스가 가져가 실행한다. JOB_WORKERS 가 1 이상이고 dispatch 가
+    참이면 트랜잭션 커밋 후 현재 프로세스의 스레드 풀도 큐를 처리한다.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        total=total,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS
+    )
+    if dispatch and settings.JOB_WORKERS:
+        # 요청 트랜잭션이 커밋된 뒤 실행해야 워커가 방금 만든 행을 볼 수 있음
+        transaction.on_commit(lambda: get_executor().submit(_work_in_thread))
+    return job
+
+
+def cancel(job: Job) -> Job:
+    """대기 중인 작업은 즉시 취소, 실행 중인 작업은 다음 진행 보고 시점에 중단"""
+    now = timezone.now()
+    if Job.objects.filter(id=job.id, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_CANCELLED, cancel_requested=True, finished_at=now
+    ):
+        logger.info(f"Job {job.id} cancelled before start")
+    else:
+        Job.objects.filter(id=job.id, status=Job.STATUS_RUNNING).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def update_progress(job: Job, progress: int, total: Optional[int] = None):
+    """진행 상황 및 heartbeat 갱신, 취소 요청이 있으면 JobCancelled 발생"""
+    fields = {'progress': progress, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        fields['total'] = total
+        job.total = total
+    job.progress = progress
+    Job.objects.filter(id=job.id).update(**fields)
+
+    if Job.objects.filter(id=job.id, cancel_requested=True).exists():
+        raise JobCancelled(f"Job {job.id} cancelled")
+
+
+def requeue_stale(stale_seconds: Optional[float] = None) -> int:
+    """heartbeat 가 끊긴 실행 중 작업(워커 비정상 종료)을 다시 대기열로
+
+    시도 횟수는 작업을 가져갈 때 이미 늘었으므로, max_attempts 에 도달한 작업은 실패로 끝낸다.
+    """
+    stale_seconds = stale_seconds or settings.JOB_STALE_SECONDS
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=stale_seconds)
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED,
+        error='Worker stopped responding (heartbeat timed out)',
+        worker=None,
+        finished_at=now
+    )
+    count = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.STATUS_QUEUED, worker=None, run_after=now
+    )
+    if failed:
+        logger.warning(f"Failed {failed} stale jobs that reached max attempts")
+    if count:
+        logger.warning(f"Requeued {count} stale jobs")
+    return count
+
+
+def _blocked_kinds(kinds: Iterable[str]) -> Set[str]:
+    """잠금 때문에 지금 시작할 수 없는 작업 종류
+
+    잠금 행을 트랜잭션이 끝날 때까지 SELECT ... FOR UPDATE 로 잡으므로, 같은 잠금의 작업을
+    가져가려는 다른 워커는 이 워커가 running 으로 표시를 마칠 때까지 기다린다.
+    """
+    names = sorted({_locks[kind][0] for kind in kinds if kind in _locks})
+    if not names:
+        return set()
+    for name in names:
+        JobLock.objects.get_or_create(name=name)
+    # 항상 이름 순서로 잠가 교착 상태 방지
+    list(JobLock.objects.select_for_update().filter(name__in=names).order_by('name'))
+
+    # 잠금 이름 -> 실행 중인 작업 중 단독 작업이 있는지
+    held: Dict[str, bool] = {}
+    running = Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        kind__in=[kind for kind, (name, _) in _locks.items() if name in names]
+    ).values_list('kind', flat=True).distinct()
+    for kind in running:
+        name, exclusive = _locks[kind]
+        held[name] = held.get(name, False) or exclusive
+
+    blocked = set()
+    for kind in kinds:
+        if kind not in _locks:
+            continue
+        name, exclusive = _locks[kind]
+        if name in held and (exclusive or held[name]):
+            blocked.add(kind)
+    return blocked
+
+
+def claim_next(worker_id: str, kinds: Optional[Iterable[str]] = None) -> Optional[Job]:
+    """실행할 다음 작업을 가져와 running 으로 표시
+
+    MySQL 에서는 SELECT ... FOR UPDATE SKIP LOCKED 로 여러 워커가 서로 다른
+    작업을 가져가고, 조건부 UPDATE 로 다른 백엔드에서도 중복 실행을 막는다.
+    """
+    kinds = list(kinds) if kinds else registered_kinds()
+    now = timezone.now()
+
+    with transaction.atomic():
+        busy = _blocked_kinds(kinds)
+
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.STATUS_QUEUED, run_after__lte=now, kind__in=[k for k in kinds if k not in busy])
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        claimed = Job.objects.filter(id=job.id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            worker=worker_id,
+            attempts=job.attempts + 1,
+            started_at=now,
+            heartbeat_at=now
+        )
+        if not claimed:
+            return None
+
+    job.refresh_from_db()
+    return job
+
+
+def start_now(kind: str, payload: Optional[Dict[str, Any]] = None, worker_id: Optional[str] = None) -> Optional[Job]:
+    """큐를 거치지 않고 현재 프로세스에서 바로 실행할 작업을 running 상태로 등록
+
+    잠금은 큐 워커와 똑같이 확인하므로(관리 명령의 직접 실행 등) 같은 잠금의 작업과 겹치지 않는다.
+    지금 시작할 수 없으면 None 을 반환한다. 등록한 작업은 run_job 으로 실행한다.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    with transaction.atomic():
+        if _blocked_kinds([kind]):
+            return None
+        now = timezone.now()
+        return Job.objects.create(
+            kind=kind,
+            payload=payload or {},
+            status=Job.STATUS_RUNNING,
+            worker=worker_id or default_worker_id(),
+            attempts=1,
+            max_attempts=1,
+            started_at=now,
+            heartbeat_at=now
+        )
+
+
+def retry_delay(attempts: int) -> float:
+    """지수 백오프 (초)"""
+    return min(settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_BACKOFF_SECONDS)
+
+
+class Heartbeat:
+    """실행 중인 작업의 heartbeat_at 을 별도 스레드에서 주기적으로 갱신
+
+    진행 보고(update_progress) 간격이 JOB_STALE_SECONDS 보다 긴 작업(큰 PDF 임베딩 등)이
+    실행 도중 다시 대기열로 돌아가 다른 워커가 중복 실행하지 않도록 한다.
+    """
+
+    def __init__(self, job: Job, interval: Optional[float] = None):
+        self.job = job
+        self.interval = settings.JOB_HEARTBEAT_SECONDS if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{job.id}', daemon=True)
+
+    def __enter__(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                # 다시 대기열로 돌아가 다른 워커가 가져간 작업은 갱신하지 않음
+                Job.objects.filter(
+                    id=self.job.id, status=Job.STATUS_RUNNING, worker=self.job.worker
+                ).update(heartbeat_at=timezone.now())
+        except Exception:
+            logger.exception(f"Heartbeat for job {self.job.id} failed")
+        finally:
+            connection.close()
+
+
+def run_job(job: Job):
+    """가져온 작업 실행 및 결과/재시도 기록"""
+    handler = _handlers[job.kind]
+    try:
+        # 작업 중 AI 호출 사용량은 모았다가 배치로 저장 (asyncio.run 안의 호출 포함)
+        with Heartbeat(job), usage.collect() as entries:
+            try:
+                result = handler(job)
+            finally:
+                usage.flush(entries)
+
+    except JobCancelled:
+        job.status = Job.STATUS_CANCELLED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+        logger.info(f"Job {job.id} ({job.kind}) cancelled")
+        return
+
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.kind}) failed (attempt {job.attempts}/{job.max_attempts})")
+        job.error = str(e)
+        if job.attempts < job.max_attempts:
+            job.status = Job.STATUS_QUEUED
+            job.worker = None
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            job.save(update_fields=['status', 'error', 'worker', 'run_after'])
+        else:
+            job.status = Job.STATUS_FAILED
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+        return
+
+    job.status = Job.STATUS_SUCCEEDED
+    job.result = result
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'finished_at'])
+    logger.info(f"Job {job.id} ({job.kind}) finished: {result}")
+
+
+def work(worker_id: Optional[str] = None, kinds: Optional[Iterable[str]] = None, max_jobs: Optional[int] = None) -> int:
+    """대기 중인 작업이 없을 때까지 (또는 max_jobs 개) 처리하고 처리 수 반환"""
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next(worker_id, kinds)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def _work_in_thread():
+    """웹 프로세스 스레드 풀에서 큐 처리"""
+    close_old_connections()
+    try:
+        work()
+    except Exception:
+        logger.exception("Job worker thread failed")
+    finally:
+        # 워커 스레드의 DB 연결은 요청 사이클이 정리하지 않으므로 직접 닫음
+        connection.close()
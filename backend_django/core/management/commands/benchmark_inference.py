@@ -0,0 +1,189 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from benchmarks.load import run_load
+from ai_services.local_llm import LocalModel
+from ai_services.inference_server import InferenceServer
+import os
+import json
+import random
+import threading
+import httpx
+from datetime import datetime
+
+QUESTIONS = [
+    'Is health insurance mandatory in Italy?',
+    'How do I apply for a visa to Japan?',
+    'What documents do I need to enter Canada?',
+    'How long can I stay in France without a visa?',
+    'What is the emergency number in Australia?',
+]
+CONTEXT_SENTENCE = 'Travellers must carry valid documents and comply with local entry requirements. '
+
+class Command(BaseCommand):
+    help = '파인튜닝 모델 추론 서버의 마이크로 배치 설정별(요청당 1회 생성 포함) 처리량과 지연 시간을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model-path',
+            type=str,
+            help='로컬 추론 서버로 띄울 모델 (기본: LOCAL_LLM_MODEL_PATH)',
+        )
+        parser.add_argument(
+            '--url',
+            type=str,
+            help='함께 측정할 기존 추론 서버 주소 (예: 현재 GPU_AI_SERVER_URL)',
+        )
+        parser.add_argument(
+            '--batch-sizes',
+            type=str,
+            help='비교할 최대 배치 크기 (쉼표로 구분, 1 = 요청마다 따로 생성)',
+            default='1,4,8'
+        )
+        parser.add_argument(
+            '--batch-wait-ms',
+            type=float,
+            help='요청을 모으는 시간',
+            default=settings.LOCAL_LLM_BATCH_WAIT_MS
+        )
+        parser.add_argument(
+            '--bucket-width',
+            type=int,
+            help='한 배치 안의 프롬프트 길이 차이 상한 (0 이면 사용 안 함)',
+            default=settings.LOCAL_LLM_BUCKET_WIDTH
+        )
+        parser.add_argument(
+            '--max-new-tokens',
+            type=int,
+            help='요청별 최대 생성 토큰 수',
+            default=64
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='설정별 요청 수',
+            default=64
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='동시 요청 수',
+            default=8
+        )
+        parser.add_argument(
+            '--qa-file',
+            type=str,
+            help='질문/컨텍스트로 사용할 QA 쌍 JSON (기본: 길이가 다른 합성 컨텍스트)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='결과 JSON 저장 디렉토리',
+            default='data/benchmarks'
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model_path'] or settings.LOCAL_LLM_MODEL_PATH
+        if not model_path and not options['url']:
+            raise CommandError('--model-path(또는 LOCAL_LLM_MODEL_PATH) 나 --url 중 하나는 필요합니다.')
+        try:
+            batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--batch-sizes 는 쉼표로 구분한 정수입니다.')
+
+        payloads = self.payloads(options)
+        result = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'config': {
+                'model_path': model_path,
+                'url': options['url'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'batch_wait_ms': options['batch_wait_ms'],
+                'bucket_width': options['bucket_width'],
+                'max_new_tokens': options['max_new_tokens'],
+            },
+            'runs': {},
+        }
+
+        if options['url']:
+            self.stdout.write(f"기존 서버 측정 중: {options['url']}")
+            result['runs']['remote'] = self.measure(options['url'], payloads, options)
+            self.report('remote', result['runs']['remote'])
+
+        if model_path:
+            self.stdout.write(f'모델 로드 중: {model_path}')
+            model = LocalModel(
+                model_path,
+                dtype=settings.LOCAL_LLM_DTYPE,
+                quantize=settings.LOCAL_LLM_QUANTIZE,
+                threads=settings.LOCAL_LLM_THREADS,
+                max_input_tokens=settings.LOCAL_LLM_MAX_INPUT_TOKENS,
+                max_new_tokens=options['max_new_tokens']
+            )
+            model.load()
+            server = InferenceServer(model, host='127.0.0.1', port=0)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            url = f'http://127.0.0.1:{server.server_address[1]}'
+            try:
+                for size in batch_sizes:
+                    model.configure_batching(size, options['batch_wait_ms'], options['bucket_width'])
+                    name = f'batch_{size}'
+                    self.stdout.write(f'{name} 측정 중...')
+                    run = self.measure(url, payloads, options)
+                    batcher = model.batcher
+                    run['mean_batch_size'] = round(batcher.requests / batcher.batches, 2) if batcher.batches else 0.0
+                    result['runs'][name] = run
+                    self.report(name, run)
+            finally:
+                server.shutdown()
+                server.server_close()
+                model.batcher.stop()
+
+        path = self.save(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'결과 저장: {path}'))
+
+    def payloads(self, options):
+        """요청 본문 목록 (프롬프트 길이가 섞이도록 합성 컨텍스트 길이를 다르게)"""
+        if options['qa_file']:
+            with open(options['qa_file'], 'r', encoding='utf-8') as f:
+                pairs = json.load(f)
+            items = [{'question': qa['question'], 'context': qa.get('context', '')} for qa in pairs]
+        else:
+            rng = random.Random(42)
+            items = [
+                {'question': QUESTIONS[i % len(QUESTIONS)], 'context': CONTEXT_SENTENCE * rng.choice([2, 8, 24, 48])}
+                for i in range(options['requests'])
+            ]
+        if not items:
+            raise CommandError('요청으로 사용할 QA 쌍이 없습니다.')
+        return [{**item, 'max_new_tokens': options['max_new_tokens']} for item in items]
+
+    def measure(self, url, payloads, options):
+        local = threading.local()
+
+        def call(i):
+            if not hasattr(local, 'client'):
+                local.client = httpx.Client(timeout=httpx.Timeout(300.0, connect=10.0))
+            response = local.client.post(f'{url}/api/ask', json=payloads[i % len(payloads)])
+            response.raise_for_status()
+            if not response.json().get('success'):
+                raise RuntimeError('no answer')
+
+        return run_load(call, options['requests'], options['concurrency'], warmup=1)
+
+    def report(self, name, run):
+        latency = run['latency_ms']
+        errors = sum(run['errors'].values())
+        batch = f", 평균 배치 {run['mean_batch_size']}" if 'mean_batch_size' in run else ''
+        self.stdout.write(
+            f"  {run['throughput_rps']:.2f} req/s, p50 {latency['p50']:.0f}ms, "
+            f"p95 {latency['p95']:.0f}ms, p99 {latency['p99']:.0f}ms, 오류 {errors}{batch}"
+        )
+
+    def save(self, result, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"inference-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        return path
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.jobs import enqueue, registered_kinds
+import json
+
+class Command(BaseCommand):
+    help = '작업 큐에 작업을 등록합니다. (예: enqueue_job generate_qa_pairs --payload \'{"questions_file": ...}\')'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', type=str, help='작업 종류')
+        parser.add_argument(
+            '--payload',
+            type=str,
+            help='작업 인자 (JSON 객체)',
+            default='{}'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            help='최대 시도 횟수 (기본: JOB_MAX_ATTEMPTS)',
+        )
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        if kind not in registered_kinds():
+            raise CommandError(f"알 수 없는 작업 종류: {kind} (가능: {', '.join(registered_kinds())})")
+
+        try:
+            payload = json.loads(options['payload'])
+        except json.JSONDecodeError as e:
+            raise CommandError(f'payload JSON 오류: {e}')
+
+        job = enqueue(kind, payload=payload, max_attempts=options['max_attempts'], dispatch=False)
+        self.stdout.write(self.style.SUCCESS(f'작업을 등록했습니다: {kind} #{job.id}'))
@@ -0,0 +1,131 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from benchmarks.retrieval import parse_variant, check_ks, load_items, evaluate, format_table
+from chat.views import get_rag
+import os
+import json
+import random
+import subprocess
+from datetime import datetime
+
+class Command(BaseCommand):
+    help = '정답이 있는 질문 세트로 검색 설정별 recall@k, MRR, 컨텍스트 토큰, 지연 시간을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'eval_set',
+            type=str,
+            help='평가 세트 (JSON/JSONL 또는 파인튜닝 질문 파일)'
+        )
+        parser.add_argument(
+            '--variant',
+            type=str,
+            action='append',
+            default=[],
+            help=(
+                "비교할 검색 설정 (예: k3:top_k=3,fetch_k=10 / "
+                "small:collection=global-documents-<버전>). 지정하지 않은 값은 현재 설정 사용"
+            )
+        )
+        parser.add_argument(
+            '--k',
+            type=str,
+            help='recall@k 의 k 목록 (쉼표로 구분, 설정의 context_docs 이하, 기본값은 1 과 가장 작은 context_docs)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='평가할 항목 수 (무작위 추출)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='--limit 추출 난수 시드',
+            default=42
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='결과 JSON 저장 디렉토리',
+            default='data/evaluations'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='비교할 이전 결과 JSON 파일 (같은 이름 설정끼리 차이 표시)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            variants = [parse_variant(spec) for spec in options['variant']] or [{'name': 'current'}]
+            if options['k']:
+                ks = sorted({int(k) for k in options['k'].split(',') if k})
+            else:
+                ks = sorted({1, min(v.get('context_docs') or settings.RAG_CONTEXT_DOCS for v in variants)})
+            for variant in variants:
+                check_ks(variant, ks)
+        except ValueError as e:
+            raise CommandError(f'잘못된 옵션: {e}')
+
+        names = [v['name'] for v in variants]
+        if len(set(names)) != len(names):
+            raise CommandError('설정 이름이 중복되었습니다.')
+
+        if not os.path.exists(options['eval_set']):
+            raise CommandError(f"평가 세트가 존재하지 않습니다: {options['eval_set']}")
+        items = load_items(options['eval_set'])
+        if options['limit'] and options['limit'] < len(items):
+            items = random.Random(options['seed']).sample(items, options['limit'])
+        if not items:
+            raise CommandError('평가할 항목이 없습니다.')
+
+        rag = get_rag()
+        result = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': self.git_commit(),
+            'eval_set': options['eval_set'],
+            'items': len(items),
+            'defaults': {
+                'top_k': settings.TOP_K_RESULTS,
+                'fetch_k': settings.RAG_MMR_FETCH_K,
+                'lambda_mult': settings.RAG_MMR_LAMBDA,
+                'context_docs': settings.RAG_CONTEXT_DOCS,
+                'collection': rag.collection_alias,
+                'chunk_max_tokens': settings.CHUNK_MAX_TOKENS,
+                'chunk_overlap_tokens': settings.CHUNK_OVERLAP_TOKENS,
+            },
+            'results': [],
+        }
+
+        for variant in variants:
+            self.stdout.write(f"{variant['name']} 평가 중... ({len(items)}개 질문)")
+            result['results'].append(evaluate(rag, items, variant, ks))
+
+        previous = None
+        if options['compare']:
+            with open(options['compare'], 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            self.stdout.write(f"비교 대상: {options['compare']} ({previous.get('commit')})")
+
+        for line in format_table(result['results'], ks, previous):
+            self.stdout.write(line)
+
+        path = self.save(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'결과 저장: {path}'))
+
+    def save(self, result, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"retrieval-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        return path
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
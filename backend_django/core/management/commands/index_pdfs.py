@@ -1,9 +1,12 @@
 from django.core.management.base import BaseCommand
-from ai_services.rag import RAG
+from django.conf import settings
+from core.jobs import enqueue, start_now, run_job
+from core.models import Job
 import os
+import time
 
 class Command(BaseCommand):
-    help = 'PDF 문서들을 벡터 데이터베이스에 인덱싱합니다.'
+    help = 'PDF 문서들을 새 버전 컬렉션에 인덱싱한 뒤 검증하고 별칭을 전환합니다.'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -12,39 +15,101 @@ class Command(BaseCommand):
             help='PDF 파일들이 있는 디렉토리 경로',
             default='data/pdfs'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='임베딩 배치 크기 (청크 수)',
+            default=500
+        )
+        parser.add_argument(
+            '--no-dedup',
+            action='store_true',
+            help='근사 중복 청크 제거를 사용하지 않음',
+        )
+        parser.add_argument(
+            '--no-switch',
+            action='store_true',
+            help='새 컬렉션을 만들고 검증만 하며 별칭은 전환하지 않음',
+        )
+        parser.add_argument(
+            '--gc-grace-hours',
+            type=float,
+            help='이전 버전 컬렉션을 삭제하기 전 유예 시간',
+            default=settings.VECTOR_GC_GRACE_HOURS
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='직접 실행하지 않고 작업 큐에 등록 (run_worker 가 실행)',
+        )
         parser.add_argument(
             '--force',
             action='store_true',
-            help='기존 벡터 DB를 삭제하고 새로 생성',
+            help='별칭 전환 후 이전 버전 컬렉션을 즉시 삭제',
         )
 
     def handle(self, *args, **options):
         self.stdout.write('PDF 인덱싱을 시작합니다...')
-        
+
         pdf_dir = options['pdf_dir']
         if not os.path.exists(pdf_dir):
             self.stdout.write(
                 self.style.ERROR(f'PDF 디렉토리가 존재하지 않습니다: {pdf_dir}')
             )
             return
-        
-        try:
-            # RAG 시스템 초기화
-            rag = RAG()
-            
-            # 기존 데이터 삭제 (force 옵션)
-            if options['force']:
-                self.stdout.write('기존 벡터 데이터를 삭제합니다...')
-                # 여기에 벡터 DB 초기화 로직 추가 가능
-            
-            # PDF 처리
-            rag.process_pdf_directory(pdf_dir)
-            
+
+        payload = {
+            'pdf_dir': os.path.abspath(pdf_dir),
+            'batch_size': options['batch_size'],
+            'dedup': not options['no_dedup'],
+            'switch': not options['no_switch'],
+            'gc_grace_hours': 0 if options['force'] else options['gc_grace_hours'],
+        }
+
+        if options['background']:
+            job = enqueue('index_pdfs', payload=payload, max_attempts=1, dispatch=False)
+            self.stdout.write(self.style.SUCCESS(f'인덱싱 작업을 등록했습니다: job {job.id}'))
+            return
+
+        # 직접 실행도 작업으로 기록하여 대량 등록 색인/다른 재색인과 겹치지 않게 함
+        job = start_now('index_pdfs', payload)
+        if job is None:
+            self.stdout.write('실행 중인 색인 작업이 끝나기를 기다립니다...')
+            while job is None:
+                time.sleep(settings.JOB_POLL_INTERVAL)
+                job = start_now('index_pdfs', payload)
+
+        run_job(job)
+        job.refresh_from_db()
+        if job.status != Job.STATUS_SUCCEEDED:
             self.stdout.write(
-                self.style.SUCCESS('PDF 인덱싱이 완료되었습니다!')
+                self.style.ERROR(f'인덱싱 실패, 별칭을 전환하지 않습니다: {job.error}')
             )
-            
-        except Exception as e:
+            return
+        result = job.result
+
+        self.stdout.write(f"새 컬렉션에 인덱싱했습니다: {result['collection']}")
+
+        # 중복 제거 결과
+        dedup = result.get('dedup')
+        if dedup:
             self.stdout.write(
-                self.style.ERROR(f'인덱싱 중 오류 발생: {str(e)}')
+                f"중복 청크 {dedup['duplicates']}/{dedup['chunks']}개 제거 "
+                f"(대표 청크 {dedup['linked_chunks']}개에 태그 연결, "
+                f"텍스트 {dedup['saved_ratio'] * 100:.1f}% 절약)"
             )
+        ingested = result.get('ingested')
+        if ingested:
+            self.stdout.write(f"대량 등록 문서 {ingested['indexed']}개 다시 색인 (청크 {ingested['chunks']}개)")
+
+        if not result['switched']:
+            self.stdout.write(self.style.SUCCESS(f"인덱싱 완료 (별칭 전환 안 함): {result['collection']}"))
+            return
+
+        self.stdout.write(f"별칭 전환: {result['alias']} -> {result['collection']} (이전: {result['previous']})")
+        if result['deleted']:
+            self.stdout.write(f"이전 버전 컬렉션 삭제: {', '.join(result['deleted'])}")
+
+        self.stdout.write(
+            self.style.SUCCESS('PDF 인덱싱이 완료되었습니다!')
+        )
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from chromadb import PersistentClient
+from ai_services.vector_index import read_manifest, restore_snapshot, set_alias, garbage_collect, unique_collection_name
+import os
+
+class Command(BaseCommand):
+    help = '스냅샷 파일을 새 컬렉션으로 복원하고 별칭을 원자적으로 전환합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'snapshot',
+            type=str,
+            help='스냅샷 파일 경로'
+        )
+        parser.add_argument(
+            '--alias',
+            type=str,
+            help='전환할 컬렉션 별칭 (기본: 스냅샷의 별칭)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='한 번에 기록할 레코드 수',
+            default=1000
+        )
+        parser.add_argument(
+            '--no-switch',
+            action='store_true',
+            help='복원만 하고 별칭은 전환하지 않음',
+        )
+
+    def handle(self, *args, **options):
+        persist_directory = os.path.abspath(settings.VECTOR_DB_PATH)
+        snapshot = options['snapshot']
+        
+        if not os.path.exists(snapshot):
+            self.stdout.write(
+                self.style.ERROR(f'스냅샷 파일이 존재하지 않습니다: {snapshot}')
+            )
+            return
+        
+        try:
+            manifest = read_manifest(snapshot)
+            alias = options['alias'] or manifest.get('alias') or settings.VECTOR_COLLECTION_NAME
+            
+            if manifest.get('embedding_model') not in (None, settings.EMBEDDING_MODEL):
+                self.stdout.write(self.style.WARNING(
+                    f"임베딩 모델이 다릅니다: 스냅샷 {manifest['embedding_model']}, 설정 {settings.EMBEDDING_MODEL}"
+                ))
+            
+            os.makedirs(persist_directory, exist_ok=True)
+            client = PersistentClient(path=persist_directory)
+            # 현재 라이브 컬렉션의 스냅샷이어도 새 이름으로 복원하여 검증 후에만 별칭 전환
+            collection_name = unique_collection_name(client, f"{alias}-{manifest['version']}")
+            
+            self.stdout.write(f'{snapshot} 을(를) {collection_name} 컬렉션으로 복원합니다...')
+            restore_snapshot(client, snapshot, collection_name, batch_size=options['batch_size'])
+            
+            if options['no_switch']:
+                self.stdout.write(self.style.SUCCESS(f'복원 완료 (별칭 전환 안 함): {collection_name}'))
+                return
+            
+            # 실행 중인 워커는 다음 검색에서 새 컬렉션을 사용
+            previous = set_alias(persist_directory, alias, collection_name)
+            
+            # 유예 기간이 지난 이전 버전 정리
+            deleted = garbage_collect(client, persist_directory, alias, settings.VECTOR_GC_GRACE_HOURS * 3600)
+            if deleted:
+                self.stdout.write(f"이전 버전 컬렉션 삭제: {', '.join(deleted)}")
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"복원 완료: {alias} -> {collection_name} "
+                    f"(레코드 {manifest['count']}개, 이전 컬렉션: {previous or '없음'})"
+                )
+            )
+            
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'스냅샷 복원 중 오류 발생: {str(e)}')
+            )
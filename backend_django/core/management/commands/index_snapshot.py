@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from chromadb import PersistentClient
+from ai_services.vector_index import resolve_collection, write_snapshot, new_version
+import os
+
+class Command(BaseCommand):
+    help = '벡터 컬렉션을 버전/체크섬이 포함된 단일 스냅샷 파일로 저장합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='스냅샷 파일 경로 (기본: VECTOR_SNAPSHOT_DIR/<별칭>-<버전>.tar)',
+        )
+        parser.add_argument(
+            '--alias',
+            type=str,
+            help='스냅샷할 컬렉션 별칭',
+            default=settings.VECTOR_COLLECTION_NAME
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='한 번에 읽을 레코드 수',
+            default=1000
+        )
+
+    def handle(self, *args, **options):
+        persist_directory = os.path.abspath(settings.VECTOR_DB_PATH)
+        alias = options['alias']
+        version = new_version()
+        output = options['output'] or os.path.join(
+            settings.VECTOR_SNAPSHOT_DIR, f"{alias}-{version}.tar"
+        )
+        
+        try:
+            client = PersistentClient(path=persist_directory)
+            collection_name = resolve_collection(persist_directory, alias)
+            collection = client.get_collection(collection_name)
+            
+            self.stdout.write(f'{collection_name} 컬렉션 스냅샷을 생성합니다...')
+            manifest = write_snapshot(
+                collection,
+                output,
+                version=version,
+                extra={
+                    'alias': alias,
+                    'embedding_model': settings.EMBEDDING_MODEL,
+                },
+                batch_size=options['batch_size']
+            )
+            
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"스냅샷 생성 완료: {output} "
+                    f"(버전 {manifest['version']}, 레코드 {manifest['count']}개, "
+                    f"sha256 {manifest['records_sha256'][:12]})"
+                )
+            )
+            
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'스냅샷 생성 중 오류 발생: {str(e)}')
+            )
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from chromadb import PersistentClient
+from core.models import Document
+from core.vector_sync import documents_chunk_metadata
+from ai_services.vector_index import resolve_collection, scan_document_ids, delete_document_chunks
+import os
+
+class Command(BaseCommand):
+    help = '벡터 DB에서 삭제된 문서의 청크(고아 청크)를 찾아 일괄 삭제합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alias',
+            type=str,
+            help='정리할 컬렉션 별칭',
+            default=settings.VECTOR_COLLECTION_NAME
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='한 번에 읽고 삭제할 청크 수',
+            default=settings.VECTOR_SYNC_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--include-unlinked',
+            action='store_true',
+            help='document_id 가 없는 청크(이전 버전 색인)도 삭제',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='삭제하지 않고 개수만 출력',
+        )
+
+    def handle(self, *args, **options):
+        persist_directory = os.path.abspath(settings.VECTOR_DB_PATH)
+        batch_size = options['batch_size']
+
+        try:
+            client = PersistentClient(path=persist_directory)
+            collection_name = resolve_collection(persist_directory, options['alias'])
+            collection = client.get_collection(collection_name)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'컬렉션을 열 수 없습니다: {str(e)}'))
+            return
+
+        self.stdout.write(f'컬렉션 검사 중: {collection_name} ({collection.count()}개 청크)')
+        by_document, unlinked = scan_document_ids(collection, batch_size)
+
+        # 청크가 참조하는 문서 중 테이블에 없는 문서
+        existing = set()
+        document_ids = list(by_document)
+        for i in range(0, len(document_ids), batch_size):
+            existing.update(
+                Document.objects.filter(id__in=document_ids[i:i + batch_size]).values_list('id', flat=True)
+            )
+        orphan_documents = [document_id for document_id in document_ids if document_id not in existing]
+        orphan_chunks = [chunk_id for document_id in orphan_documents for chunk_id in by_document[document_id]]
+
+        self.stdout.write(
+            f'삭제된 문서 {len(orphan_documents)}개의 고아 청크 {len(orphan_chunks)}개, '
+            f'document_id 없는 청크 {len(unlinked)}개'
+        )
+
+        targets = unlinked if options['include_unlinked'] else []
+        if options['dry_run'] or not (orphan_chunks or targets):
+            return
+
+        # 다른 문서가 연결된 대표 청크는 삭제하지 않고 남은 문서로 소유권 이전
+        deleted = delete_document_chunks(collection, orphan_documents, documents_chunk_metadata, batch_size)
+        for i in range(0, len(targets), batch_size):
+            collection.delete(ids=targets[i:i + batch_size])
+        deleted += len(targets)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'청크 {deleted}개를 삭제했습니다. (소유권 이전 {len(orphan_chunks) + len(targets) - deleted}개)'
+        ))
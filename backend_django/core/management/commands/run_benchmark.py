@@ -0,0 +1,306 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test import Client, override_settings
+from django.urls import reverse
+from benchmarks.fake_servers import FakeAIServer, ServiceProfile, SERVICES
+from benchmarks.load import run_load, compare
+from core import usage
+from core.models import Conversation, UsageRecord
+import chat.views
+import os
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import threading
+from datetime import datetime
+
+SCENARIOS = ['index', 'search', 'chat']
+
+COUNTRIES = ['japan', 'france', 'canada', 'australia']
+DOC_TYPES = ['visa_info', 'insurance_info', 'immigration_regulations_info', 'immigration_safety_info']
+QUESTIONS = [
+    '비자 신청 방법은?',
+    '여행자 보험은 필수인가요?',
+    '입국 시 필요한 서류는?',
+    '체류 기간을 연장하려면?',
+    '현지 치안은 어떤가요?',
+]
+
+class Command(BaseCommand):
+    help = '가짜 OpenAI/Gemini/번역/GPU 서버로 채팅, 검색, 인덱싱 부하 테스트를 실행합니다. (유료 API 미사용)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios',
+            type=str,
+            help=f"실행할 시나리오 (쉼표로 구분, 기본: {','.join(SCENARIOS)})",
+            default=','.join(SCENARIOS)
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='시나리오별 요청 수',
+            default=100
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='동시 요청 수 (스레드)',
+            default=8
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            help='측정 전에 실행할 요청 수',
+            default=2
+        )
+        parser.add_argument(
+            '--latency',
+            type=str,
+            action='append',
+            default=[],
+            help=f"가짜 서비스 응답 지연 ms (예: openai=300:50 -> 평균 300, 표준편차 50). 서비스: {', '.join(SERVICES)}"
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=str,
+            action='append',
+            default=[],
+            help='가짜 서비스 오류(500) 비율 (예: gemini=0.05)'
+        )
+        parser.add_argument(
+            '--model',
+            type=str,
+            help='채팅 시나리오에서 사용할 모델 (기본: DEFAULT_LLM_MODEL)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='지연/오류 난수 시드',
+            default=42
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='결과 JSON 저장 디렉토리',
+            default='data/benchmarks'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='비교할 이전 결과 JSON 파일',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='채팅 시나리오가 만든 대화/사용량 기록을 지우지 않음',
+        )
+        parser.add_argument(
+            '--serve',
+            action='store_true',
+            help='부하 테스트 없이 가짜 서버만 실행 (다른 프로세스에서 사용할 환경 변수 출력)',
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            help='가짜 서버 포트 (기본: 임의 포트)',
+            default=0
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"알 수 없는 시나리오: {', '.join(sorted(unknown))}")
+
+        profiles = self.parse_profiles(options['latency'], options['error_rate'])
+        server = FakeAIServer(
+            port=options['port'],
+            profiles=profiles,
+            embedding_dimensions=settings.EMBEDDING_DIMENSIONS,
+            seed=options['seed']
+        )
+
+        if options['serve']:
+            return self.serve(server)
+
+        vector_dir = tempfile.mkdtemp(prefix='benchmark-vectors-')
+        overrides = {
+            **server.settings(),
+            'OPENAI_API_KEY': settings.OPENAI_API_KEY or 'benchmark',
+            'GOOGLE_API_KEY': settings.GOOGLE_API_KEY or 'benchmark',
+            # 실제 벡터 DB 대신 임시 디렉토리에 색인
+            'VECTOR_DB_PATH': vector_dir,
+            # 채팅 시나리오는 테스트 클라이언트로 요청
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        }
+
+        result = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': self.git_commit(),
+            'config': {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'model': options['model'] or settings.DEFAULT_LLM_MODEL,
+                'database': settings.DATABASES['default']['ENGINE'],
+                'profiles': {name: profile.to_dict() for name, profile in server.profiles.items()},
+            },
+            'scenarios': {},
+        }
+
+        saved = (chat.views.llm_instance, chat.views.rag_instance)
+        self.conversation_ids = set()
+        self.lock = threading.Lock()
+        try:
+            with server, override_settings(**overrides):
+                # 가짜 서버 주소로 LLM/RAG 인스턴스를 새로 만듦
+                chat.views.llm_instance = chat.views.rag_instance = None
+                for name in scenarios:
+                    self.stdout.write(f'{name} 시나리오 실행 중... ({options["requests"]}회, 동시 {options["concurrency"]})')
+                    scenario = run_load(
+                        getattr(self, f'call_{name}')(options),
+                        options['requests'],
+                        options['concurrency'],
+                        warmup=options['warmup']
+                    )
+                    result['scenarios'][name] = scenario
+                    self.report(name, scenario)
+                result['fake_server_requests'] = dict(server.counts)
+        finally:
+            chat.views.llm_instance, chat.views.rag_instance = saved
+            shutil.rmtree(vector_dir, ignore_errors=True)
+            if not options['keep_data']:
+                self.cleanup()
+
+        path = self.save(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'결과 저장: {path}'))
+
+        if options['compare']:
+            with open(options['compare'], 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            self.stdout.write(f"비교 대상: {options['compare']} ({previous.get('commit')})")
+            for line in compare(result, previous):
+                self.stdout.write(f'  {line}')
+
+    def parse_profiles(self, latencies, error_rates):
+        """--latency service=mean[:jitter], --error-rate service=rate"""
+        profiles = {}
+        try:
+            for value in latencies:
+                service, spec = value.split('=', 1)
+                mean, _, jitter = spec.partition(':')
+                profile = profiles.setdefault(service, ServiceProfile())
+                profile.latency_ms, profile.jitter_ms = float(mean), float(jitter or 0)
+            for value in error_rates:
+                service, rate = value.split('=', 1)
+                profiles.setdefault(service, ServiceProfile()).error_rate = float(rate)
+        except ValueError:
+            raise CommandError('--latency 는 service=mean[:jitter], --error-rate 는 service=rate 형식입니다.')
+
+        unknown = set(profiles) - set(SERVICES)
+        if unknown:
+            raise CommandError(f"알 수 없는 서비스: {', '.join(sorted(unknown))} (사용 가능: {', '.join(SERVICES)})")
+        return profiles
+
+    def serve(self, server):
+        with server:
+            self.stdout.write(self.style.SUCCESS(f'가짜 AI 서버 실행 중: {server.url} (Ctrl+C 로 종료)'))
+            for key, value in server.settings().items():
+                self.stdout.write(f'export {key}={value}')
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+
+    def call_index(self, options):
+        """합성 문서 한 건을 청킹/임베딩하여 색인"""
+        rag = chat.views.get_rag()
+        paragraph = ' '.join(f'Sentence {n} about entry requirements, fees and documents.' for n in range(40))
+
+        def call(i):
+            country, doc_type = COUNTRIES[i % len(COUNTRIES)], DOC_TYPES[i % len(DOC_TYPES)]
+            metadata = {
+                'country': country,
+                'document_type': doc_type,
+                'tag': f'{country}_{doc_type}',
+                'source': f'benchmark_{i}.pdf',
+                'updated_at': datetime.now().isoformat(),
+            }
+            # 사용량은 지표로만 남기고 DB 에는 저장하지 않음
+            with usage.collect():
+                if not rag.add_document(f'{country} {doc_type} #{i}\n\n' + paragraph * 3, metadata):
+                    raise RuntimeError('indexing failed')
+        return call
+
+    def call_search(self, options):
+        """질문 번역 -> 임베딩 -> Chroma 검색 -> MMR"""
+        rag = chat.views.get_rag()
+
+        def call(i):
+            with usage.collect():
+                rag.search_with_translation(
+                    QUESTIONS[i % len(QUESTIONS)],
+                    country=COUNTRIES[i % len(COUNTRIES)],
+                    doc_type=DOC_TYPES[i % len(DOC_TYPES)]
+                )
+        return call
+
+    def call_chat(self, options):
+        """POST /api/chat/message/ (미들웨어, DB 저장, 직렬화 포함)"""
+        url = reverse('process_message')
+        local = threading.local()
+
+        def call(i):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            payload = {
+                'message': QUESTIONS[i % len(QUESTIONS)],
+                'session_id': f'benchmark_{i}',
+                'country': COUNTRIES[i % len(COUNTRIES)],
+                'topic': DOC_TYPES[i % len(DOC_TYPES)],
+            }
+            if options['model']:
+                payload['model_id'] = options['model']
+            response = local.client.post(url, data=json.dumps(payload), content_type='application/json')
+            if response.status_code != 200:
+                raise RuntimeError(f'HTTP {response.status_code}')
+            with self.lock:
+                self.conversation_ids.add(response.json()['conversation_id'])
+        return call
+
+    def report(self, name, scenario):
+        latency = scenario['latency_ms']
+        errors = sum(scenario['errors'].values())
+        self.stdout.write(
+            f"  {scenario['throughput_rps']:.1f} req/s, p50 {latency['p50']:.1f}ms, "
+            f"p95 {latency['p95']:.1f}ms, p99 {latency['p99']:.1f}ms, 오류 {errors}"
+        )
+        for stage, mean in scenario['stages_ms'].items():
+            self.stdout.write(f'    {stage}: {mean:.1f}ms')
+
+    def cleanup(self):
+        """채팅 시나리오가 만든 대화와 사용량 기록 삭제"""
+        if not self.conversation_ids:
+            return
+        UsageRecord.objects.filter(conversation_id__in=self.conversation_ids).delete()
+        Conversation.objects.filter(id__in=self.conversation_ids).delete()
+
+    def save(self, result, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        return path
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
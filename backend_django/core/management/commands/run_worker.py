@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import close_old_connections, connection
+from core.jobs import claim_next, run_job, requeue_stale, default_worker_id, registered_kinds
+import signal
+import threading
+import time
+
+class Command(BaseCommand):
+    help = '작업 큐(jobs 테이블)를 처리하는 워커를 실행합니다. 여러 프로세스를 동시에 실행할 수 있습니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kinds',
+            type=str,
+            help='처리할 작업 종류 (쉼표로 구분, 기본: 전체)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='이 프로세스에서 동시에 실행할 작업 수 (스레드)',
+            default=1
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            help='대기 중인 작업이 없을 때 다시 확인하는 간격 (초)',
+            default=settings.JOB_POLL_INTERVAL
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='대기 중인 작업을 모두 처리하면 종료',
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'].split(',') if options['kinds'] else registered_kinds()
+        self.stop = threading.Event()
+
+        # SIGTERM/SIGINT: 실행 중인 작업은 마치고 종료
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: self.stop.set())
+
+        self.stdout.write(f"워커 시작: {', '.join(kinds)} (동시 실행 {options['concurrency']})")
+
+        threads = [
+            threading.Thread(target=self.loop, args=(kinds, options), name=f'job-worker-{i}')
+            for i in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS('워커를 종료합니다.'))
+
+    def loop(self, kinds, options):
+        worker_id = default_worker_id()
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                requeue_stale()
+
+                job = claim_next(worker_id, kinds)
+                if job is None:
+                    if options['burst']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'작업 실행: {job.kind} #{job.id} (시도 {job.attempts}/{job.max_attempts})')
+                started = time.monotonic()
+                run_job(job)
+                self.stdout.write(f'작업 종료: {job.kind} #{job.id} {job.status} ({time.monotonic() - started:.1f}s)')
+        finally:
+            connection.close()
@@ -0,0 +1,208 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 단계별 소요 시간 히스토그램 버킷 (초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_METRIC = 'chat_stage_duration_seconds'
+REQUEST_METRIC = 'http_request_duration_seconds'
+
+
+class Span:
+    """요청 안의 단계 하나 (하위 단계를 children 으로 가지는 트리)"""
+
+    __slots__ = ('name', 'labels', 'start', 'duration', 'children', 'error')
+
+    def __init__(self, name: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.labels = labels or {}
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List['Span'] = []
+        self.error: Optional[str] = None
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.start if origin is None else origin
+        data = {
+            'name': self.name,
+            'offset_ms': round((self.start - origin) * 1000, 2),
+            'duration_ms': round((self.duration or 0) * 1000, 2),
+        }
+        if self.labels:
+            data['labels'] = self.labels
+        if self.error:
+            data['error'] = self.error
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+# 현재 실행 중인 span (요청마다 미들웨어가 루트를 만든다. asyncio.run 안의 작업에도 전파됨)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('metrics_span', default=None)
+
+
+class Histogram:
+    """Prometheus 형식 누적 히스토그램 (레이블 조합별)"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # 레이블 튜플 -> [버킷별 개수, 합계, 개수]
+        self._series: Dict[Tuple[Tuple[str, str], ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def totals(self) -> Dict[Tuple[Tuple[str, str], ...], Tuple[int, float]]:
+        """레이블 조합별 (개수, 합계)"""
+        with self._lock:
+            return {key: (count, total) for key, (_, total, count) in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, (counts, total, count) in series:
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{format_labels(key + (("le", repr(bound)),))} {bucket_count}')
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {count}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {total:.6f}')
+                lines.append(f'{self.name}_count{format_labels(key)} {count}')
+        return lines
+
+
+class Counter:
+    """Prometheus 형식 누적 카운터 (레이블 조합별)"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f'{self.name}{format_labels(key)} {value:g}')
+        return lines
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+stage_duration = Histogram(STAGE_METRIC, 'Duration of chat pipeline stages in seconds.')
+request_duration = Histogram(REQUEST_METRIC, 'Duration of HTTP requests in seconds.')
+
+# 외부 AI 호출 사용량 (core.usage 가 기록)
+ai_call_duration = Histogram('ai_call_duration_seconds', 'Duration of LLM, embedding and translation calls in seconds.')
+ai_calls = Counter('ai_calls_total', 'LLM, embedding and translation calls.')
+ai_tokens = Counter('ai_tokens_total', 'Tokens used by LLM, embedding and translation calls.')
+ai_characters = Counter('ai_characters_total', 'Characters sent to character-billed translation calls.')
+ai_cost = Counter('ai_cost_usd_total', 'Estimated cost of LLM, embedding and translation calls in USD.')
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **labels) -> Iterator[Span]:
+    """단계 소요 시간 측정
+
+    히스토그램에 기록하고, 요청 안이라면 현재 span 의 하위 단계로 트리에 추가한다.
+    labels 는 provider, attempt 처럼 값의 종류가 적은 것만 사용한다 (시계열 수 증가).
+    """
+    parent = _current.get()
+    node = Span(name, {k: str(v) for k, v in labels.items()})
+    if parent is not None:
+        parent.children.append(node)
+    token = _current.set(node)
+    try:
+        yield node
+    except BaseException as e:
+        node.error = type(e).__name__
+        raise
+    finally:
+        node.finish()
+        _current.reset(token)
+        stage_duration.observe(node.duration, stage=name, **node.labels)
+
+
+@contextmanager
+def request_root(name: str) -> Iterator[Span]:
+    """요청 단위 루트 span (히스토그램에는 미들웨어가 뷰 레이블로 기록)"""
+    root = Span(name)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.finish()
+        _current.reset(token)
+
+
+def server_timing(root: Span) -> str:
+    """루트 바로 아래 단계들을 이름별로 합산한 Server-Timing 헤더 값"""
+    totals: Dict[str, float] = {}
+    for child in root.children:
+        if child.duration is not None:
+            totals[child.name] = totals.get(child.name, 0.0) + child.duration
+    entries = [f'{name.replace(".", "_")};dur={duration * 1000:.1f}' for name, duration in totals.items()]
+    entries.append(f'total;dur={(root.duration or 0) * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def render_prometheus() -> str:
+    """/metrics 응답 본문 (text exposition format 0.0.4)"""
+    from . import db_metrics
+
+    lines = []
+    for metric in (stage_duration, request_duration, ai_call_duration, ai_calls, ai_tokens, ai_characters, ai_cost):
+        lines.extend(metric.render())
+    for key, value in db_metrics.snapshot().items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        metric = f'django_db_{key}'
+        kind = 'counter' if key in ('connections_created', 'requests', 'requests_reused_connection') else 'gauge'
+        if kind == 'counter':
+            metric += '_total'
+        lines.append(f'# TYPE {metric} {kind}')
+        lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
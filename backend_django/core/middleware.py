@@ -0,0 +1,102 @@
+import json
+import time
+import logging
+
+from django.conf import settings
+
+from . import metrics, profiling, usage
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    """요청별 단계 트리 수집
+
+    - Server-Timing 헤더로 단계별 소요 시간 노출
+    - 요청 소요 시간 히스토그램 기록 (뷰 이름 레이블)
+    - SLOW_REQUEST_THRESHOLD_MS 이상 걸린 요청은 전체 단계 트리를 로그로 남김
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metrics.request_root(request.path) as root:
+            response = self.get_response(request)
+
+        # 경로 대신 뷰 이름을 레이블로 사용 (id 가 포함된 경로로 시계열이 늘어나지 않도록)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.request_duration.observe(
+            root.duration, method=request.method, view=view, status=response.status_code
+        )
+
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = metrics.server_timing(root)
+
+        if root.duration * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            logger.warning(
+                f"Slow request {request.method} {request.path} "
+                f"{root.duration * 1000:.0f}ms: {json.dumps(root.to_dict(), ensure_ascii=False)}"
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF Response 렌더링(직렬화)을 serialize 단계로 측정"""
+        parent = metrics.current_span()
+        started = time.perf_counter()
+
+        def record(rendered):
+            node = metrics.Span('serialize')
+            node.start = started
+            node.finish()
+            if parent is not None:
+                parent.children.append(node)
+            metrics.stage_duration.observe(node.duration, stage='serialize')
+
+        response.add_post_render_callback(record)
+        return response
+
+
+class UsageLedgerMiddleware:
+    """요청 중 LLM/임베딩/번역 호출 기록을 모음
+
+    대화에 연결할 수 있는 뷰(process_message)는 직접 저장하고,
+    남은 기록(다른 뷰, 오류로 저장하지 못한 턴)은 응답 후 대화 없이 저장한다.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with usage.collect() as entries:
+            response = self.get_response(request)
+            usage.save(entries)
+        return response
+
+
+class ProfilingMiddleware:
+    """요청 단위 샘플링 프로파일 (PROFILING_ENABLED 일 때만)
+
+    X-Profile 헤더, PROFILING_SAMPLE_RATE 또는 관리자 토글로 선택된 요청의 호출 스택을
+    PROFILING_DIR 에 저장하고 응답에 X-Profile-Id 헤더를 붙인다.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        selected = profiling.select(request) if settings.PROFILING_ENABLED else None
+        if selected is None:
+            return self.get_response(request)
+
+        trigger, memory = selected
+        with profiling.RequestProfile(trigger, memory=memory) as profile:
+            response = self.get_response(request)
+
+        try:
+            profiling.save(profile, profile.metadata(request, response))
+            response['X-Profile-Id'] = profile.id
+        except OSError as e:
+            logger.error(f"Failed to save profile {profile.id}: {e}")
+        return response
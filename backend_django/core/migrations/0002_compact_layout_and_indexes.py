@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='conversation',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='document',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='faq',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='updated_at',
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['country', 'topic'], name='conv_country_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id', 'role'], name='msg_conv_history_idx'),
+        ),
+        # MySQL은 FK 컬럼에 인덱스가 필요하므로 복합 인덱스 생성 후 단일 FK 인덱스 제거
+        migrations.AlterField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='core.conversation'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+import json
+
+from django.db import migrations, models
+
+
+def normalize_references(apps, schema_editor):
+    """JSON 컬럼 변환 전 잘못된 JSON 문자열과 빈 문자열을 NULL로 정리"""
+    Message = apps.get_model('core', 'Message')
+    invalid_ids = []
+    queryset = Message.objects.exclude(references__isnull=True).only('id', 'references')
+    for message in queryset.iterator(chunk_size=2000):
+        try:
+            json.loads(message.references)
+        except (TypeError, ValueError):
+            invalid_ids.append(message.id)
+
+    for i in range(0, len(invalid_ids), 1000):
+        Message.objects.filter(id__in=invalid_ids[i:i + 1000]).update(references=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_compact_layout_and_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_references, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='references',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
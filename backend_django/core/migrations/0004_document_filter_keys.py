@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:44
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Lower, Trim
+
+
+def populate_filter_keys(apps, schema_editor):
+    """기존 문서의 정규화 컬럼 채우기"""
+    Document = apps.get_model('core', 'Document')
+    Document.objects.update(
+        country_key=Lower(Trim('country')),
+        topic_key=Lower(Trim('topic')),
+        source_key=Coalesce(Lower(Trim('source')), models.Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_message_references_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='country_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='source_key',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='topic_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_filter_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['country_key', 'topic_key', 'created_at', 'id'], name='doc_country_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['topic_key', 'created_at', 'id'], name='doc_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['source_key', 'created_at', 'id'], name='doc_source_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['created_at', 'id'], name='doc_created_idx'),
+        ),
+    ]
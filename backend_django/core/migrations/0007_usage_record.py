@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('country', models.CharField(blank=True, max_length=100, null=True)),
+                ('topic', models.CharField(blank=True, max_length=100, null=True)),
+                ('stage', models.CharField(choices=[('llm', 'LLM'), ('embedding', 'Embedding'), ('translation', 'Translation')], max_length=20)),
+                ('provider', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('characters', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.FloatField(default=0)),
+                ('cost', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('success', models.BooleanField(default=True)),
+                ('conversation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usage_records', to='core.conversation')),
+            ],
+            options={
+                'db_table': 'usage_records',
+                'indexes': [models.Index(fields=['created_at', 'provider'], name='usage_created_idx'), models.Index(fields=['country', 'topic', 'created_at'], name='usage_country_topic_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class BaseModel(models.Model):
     """기본 모델 클래스"""
@@ -16,11 +17,48 @@ class Document(BaseModel):
     topic = models.CharField(max_length=100, db_index=True)    # visa, insurance, immigration
     source = models.CharField(max_length=200, null=True, blank=True)  # 출처 정보
     
+    # 소문자로 정규화한 필터용 컬럼 (대소문자 구분 collation에서도 인덱스 사용)
+    country_key = models.CharField(max_length=100, default='', editable=False)
+    topic_key = models.CharField(max_length=100, default='', editable=False)
+    source_key = models.CharField(max_length=200, default='', editable=False)
+    
+    # 대량 등록 작업 (벡터 인덱싱 진행 상황 추적용)
+    ingest_job = models.ForeignKey(
+        'Job',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='documents'
+    )
+    
     class Meta:
         db_table = 'documents'
+        indexes = [
+            models.Index(fields=['country_key', 'topic_key', 'created_at', 'id'], name='doc_country_topic_idx'),
+            models.Index(fields=['topic_key', 'created_at', 'id'], name='doc_topic_idx'),
+            models.Index(fields=['source_key', 'created_at', 'id'], name='doc_source_idx'),
+            models.Index(fields=['created_at', 'id'], name='doc_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.country} - {self.topic}: {self.title}"
+    
+    @staticmethod
+    def normalize_key(value) -> str:
+        return (value or '').strip().lower()
+    
+    def normalize_keys(self):
+        """필터용 정규화 컬럼 갱신 (bulk_create 전에도 호출)"""
+        self.country_key = self.normalize_key(self.country)
+        self.topic_key = self.normalize_key(self.topic)
+        self.source_key = self.normalize_key(self.source)
+    
+    def save(self, *args, **kwargs):
+        self.normalize_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'country_key', 'topic_key', 'source_key'}
+        super().save(*args, **kwargs)
 
 class Conversation(BaseModel):
     """대화 세션"""
@@ -32,6 +70,9 @@ class Conversation(BaseModel):
     
     class Meta:
         db_table = 'conversations'
+        indexes = [
+            models.Index(fields=['country', 'topic'], name='conv_country_topic_idx'),
+        ]
         
     def __str__(self):
         return f"Session {self.session_id} - {self.country}/{self.topic}"
@@ -41,17 +82,23 @@ class Message(BaseModel):
     conversation = models.ForeignKey(
         Conversation, 
         on_delete=models.CASCADE,
-        related_name='messages'
+        related_name='messages',
+        db_index=False  # msg_conv_history_idx 가 대신함
     )
     role = models.CharField(max_length=20)  # user, assistant
     content = models.TextField()
     
-    # RAG 참조 (JSON 형태로 저장)
-    references = models.TextField(null=True, blank=True)  # JSON string
+    # RAG 참조 (JSON 컬럼)
+    references = models.JSONField(null=True, blank=True)
     
     class Meta:
         db_table = 'messages'
         ordering = ['created_at']
+        indexes = [
+            # 대화별 시간순 히스토리 조회 (keyset 페이지네이션 포함)
+            # role까지 포함한 커버링 인덱스 (content는 TEXT라 제외), FK 인덱스도 대신함
+            models.Index(fields=['conversation', 'created_at', 'id', 'role'], name='msg_conv_history_idx'),
+        ]
         
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
@@ -68,6 +115,109 @@ class FAQ(BaseModel):
     def __str__(self):
         return f"{self.country} - {self.topic}: {self.question[:50]}..."
 
+class Job(BaseModel):
+    """백그라운드 작업 (인덱싱 등)"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+    
+    kind = models.CharField(max_length=50, db_index=True)  # index_documents, index_pdfs, generate_qa_pairs 등
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    payload = models.JSONField(default=dict, blank=True)
+    
+    # 진행 상황
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    
+    # 재시도 (실패 시 run_after 까지 대기 후 다시 실행)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    
+    # 실행 중인 워커와 마지막 진행 보고 시각 (중단된 작업 회수용)
+    worker = models.CharField(max_length=100, null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'jobs'
+        indexes = [
+            # 워커의 다음 작업 선택 (status=queued, run_after <= now ORDER BY run_after, id)
+            models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status} {self.progress}/{self.total})"
+
+class JobLock(models.Model):
+    """같은 잠금을 쓰는 작업 종류의 동시 실행 확인용 행 (작업을 가져갈 때 SELECT ... FOR UPDATE)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    
+    class Meta:
+        db_table = 'job_locks'
+        
+    def __str__(self):
+        return self.name
+
+class UsageRecord(BaseModel):
+    """외부 AI 호출 한 건의 토큰/비용/지연 시간 (LLM, 임베딩, 번역)"""
+    STAGE_LLM = 'llm'
+    STAGE_EMBEDDING = 'embedding'
+    STAGE_TRANSLATION = 'translation'
+    STAGE_CHOICES = [
+        (STAGE_LLM, 'LLM'),
+        (STAGE_EMBEDDING, 'Embedding'),
+        (STAGE_TRANSLATION, 'Translation'),
+    ]
+
+    # 대화 밖 호출(인덱싱 등)은 대화 없이 기록, 대화가 삭제되어도 비용 기록은 유지
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='usage_records'
+    )
+    country = models.CharField(max_length=100, null=True, blank=True)
+    topic = models.CharField(max_length=100, null=True, blank=True)
+
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    provider = models.CharField(max_length=50)  # openai, gemini, phi, google_translate
+    model = models.CharField(max_length=100)
+
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    characters = models.PositiveIntegerField(default=0)  # 문자 단위 과금 (번역 API)
+    latency_ms = models.FloatField(default=0)
+    cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)  # USD 추정치 (LLM_PRICING)
+    success = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = 'usage_records'
+        indexes = [
+            # 일별/제공자별 집계, 국가/토픽별 집계
+            models.Index(fields=['created_at', 'provider'], name='usage_created_idx'),
+            models.Index(fields=['country', 'topic', 'created_at'], name='usage_country_topic_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} {self.provider}/{self.model}: {self.prompt_tokens}+{self.completion_tokens} tokens"
+
 # 자주 사용하는 값들
 COUNTRIES = [
     {"emoji": "🇺🇸", "name_kr": "미국", "name_en": "America"},
@@ -0,0 +1,19 @@
+import base64
+import binascii
+from datetime import datetime
+
+# 잘못된 커서 디코딩 시 발생하는 예외
+CURSOR_ERRORS = (ValueError, UnicodeDecodeError, binascii.Error)
+
+
+def encode_cursor(created_at, object_id) -> str:
+    """(created_at, id) keyset 커서 인코딩"""
+    raw = f"{created_at.isoformat()}|{object_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """keyset 커서 디코딩 -> (created_at, id)"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    created_at, object_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(object_id)
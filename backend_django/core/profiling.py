@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hmac
+import random
+import logging
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# 관리자가 켠 샘플링 설정 (공용 캐시면 모든 워커에 적용)
+TOGGLE_CACHE_KEY = 'profiling:toggle'
+# 요청마다 캐시를 조회하지 않도록 프로세스 안에서 잠시 재사용
+_TOGGLE_TTL = 5.0
+_toggle_memo: Tuple[float, Optional[Dict[str, Any]]] = (0.0, None)
+
+# 현재 요청의 프로파일 (trace_memory 가 사용)
+_active: contextvars.ContextVar[Optional['RequestProfile']] = contextvars.ContextVar('request_profile', default=None)
+
+# tracemalloc 을 사용하는 프로파일 수 (모두 끝나면 직접 시작한 추적만 중지)
+_memory_lock = threading.Lock()
+_memory_users = 0
+_memory_started = False
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # 프로젝트 파일은 상대 경로, 라이브러리는 site-packages 이후 경로만
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """다른 스레드의 호출 스택을 주기적으로 샘플링 (wall-clock 기준)
+
+    결과는 flamegraph.pl / speedscope 가 읽는 folded 형식("a;b;c 횟수")으로 반환한다.
+    I/O 대기(select 등) 중인 시간도 그대로 샘플에 포함된다.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """요청 하나의 샘플링 프로파일과 단계별 메모리 할당"""
+
+    def __init__(self, trigger: str, memory: bool = False):
+        # 이름순 = 생성순이 되도록 시각(마이크로초)으로 시작, 워커 간 충돌 방지용 난수 접미사
+        self.id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:6]}"
+        self.trigger = trigger
+        self.memory_enabled = memory
+        self.memory: Dict[str, Dict[str, Any]] = {}
+        self.profiler = SamplingProfiler(interval=settings.PROFILING_INTERVAL_MS / 1000)
+        self.started = 0.0
+        self.duration = 0.0
+
+    def __enter__(self) -> 'RequestProfile':
+        if self.memory_enabled:
+            _start_tracemalloc()
+        self._token = _active.set(self)
+        self.started = time.perf_counter()
+        self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.stop()
+        self.duration = time.perf_counter() - self.started
+        _active.reset(self._token)
+        if self.memory_enabled:
+            _stop_tracemalloc()
+
+    def metadata(self, request, response) -> Dict[str, Any]:
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'id': self.id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else 'unmatched',
+            'status': response.status_code,
+            'duration_ms': round(self.duration * 1000, 2),
+            'trigger': self.trigger,
+            'interval_ms': settings.PROFILING_INTERVAL_MS,
+            'samples': self.profiler.samples,
+            'memory': self.memory,
+        }
+
+
+def _start_tracemalloc():
+    global _memory_users, _memory_started
+    with _memory_lock:
+        if _memory_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+            _memory_started = True
+        _memory_users += 1
+
+
+def _stop_tracemalloc():
+    global _memory_users, _memory_started
+    with _memory_lock:
+        _memory_users -= 1
+        if _memory_users == 0 and _memory_started:
+            tracemalloc.stop()
+            _memory_started = False
+
+
+@contextmanager
+def trace_memory(stage: str) -> Iterator[None]:
+    """메모리 프로파일 중인 요청이면 이 블록의 할당 증가량 상위 위치를 기록
+
+    tracemalloc 은 프로세스 전체를 추적하므로 동시에 처리 중인 다른 요청의 할당도 섞일 수 있다.
+    """
+    profile = _active.get()
+    if profile is None or not profile.memory_enabled or not tracemalloc.is_tracing():
+        yield
+        return
+
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        top = after.compare_to(before, 'lineno')[:settings.PROFILING_TRACEMALLOC_TOP]
+        profile.memory[stage] = {
+            'peak_bytes': peak,
+            'allocated_bytes': sum(stat.size_diff for stat in top if stat.size_diff > 0),
+            'top': [
+                {
+                    'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    'size_diff': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                }
+                for stat in top
+            ],
+        }
+
+
+def get_toggle() -> Optional[Dict[str, Any]]:
+    """관리자가 켠 샘플링 설정 (없으면 None)"""
+    global _toggle_memo
+    now = time.monotonic()
+    if now - _toggle_memo[0] > _TOGGLE_TTL:
+        _toggle_memo = (now, cache.get(TOGGLE_CACHE_KEY))
+    return _toggle_memo[1]
+
+
+def set_toggle(sample_rate: float, memory: bool = False, minutes: float = 30) -> Optional[Dict[str, Any]]:
+    """관리자 샘플링 설정 변경 (sample_rate 0 이면 해제, minutes 후 자동 해제)"""
+    global _toggle_memo
+    if not 0 <= sample_rate <= 1:
+        raise ValueError('sample_rate 는 0~1 사이여야 합니다.')
+    if minutes <= 0:
+        raise ValueError('minutes 는 0보다 커야 합니다.')
+
+    if sample_rate == 0:
+        cache.delete(TOGGLE_CACHE_KEY)
+        toggle = None
+    else:
+        toggle = {
+            'sample_rate': sample_rate,
+            'memory': memory,
+            'expires_at': datetime.fromtimestamp(time.time() + minutes * 60).isoformat(timespec='seconds'),
+        }
+        cache.set(TOGGLE_CACHE_KEY, toggle, timeout=max(1, int(minutes * 60)))
+    _toggle_memo = (time.monotonic(), toggle)
+    return toggle
+
+
+def select(request) -> Optional[Tuple[str, bool]]:
+    """이 요청을 프로파일할지 결정하고 (트리거, tracemalloc 사용 여부) 반환
+
+    - X-Profile 헤더: PROFILING_TOKEN 과 같거나 스태프 로그인 사용자
+    - 관리자 토글 또는 PROFILING_SAMPLE_RATE 비율로 무작위 샘플링
+    """
+    header = request.headers.get('X-Profile')
+    if header:
+        token = settings.PROFILING_TOKEN
+        user = getattr(request, 'user', None)
+        if (token and hmac.compare_digest(header, token)) or (user is not None and user.is_staff):
+            memory = request.headers.get('X-Profile-Memory') == '1' or settings.PROFILING_TRACEMALLOC
+            return 'header', memory
+
+    toggle = get_toggle()
+    if toggle:
+        if random.random() < toggle['sample_rate']:
+            return 'admin', toggle['memory'] or settings.PROFILING_TRACEMALLOC
+    elif settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return 'sample', settings.PROFILING_TRACEMALLOC
+    return None
+
+
+def save(profile: RequestProfile, metadata: Dict[str, Any]):
+    """메타데이터(.json)와 스택(.folded)을 PROFILING_DIR 에 저장하고 오래된 프로파일 정리"""
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{profile.id}.folded"), 'w', encoding='utf-8') as f:
+        f.write(profile.profiler.folded())
+    with open(os.path.join(directory, f"{profile.id}.json"), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    prune(directory, settings.PROFILING_MAX_PROFILES)
+
+
+def prune(directory: str, keep: int) -> List[str]:
+    """최근 keep 개만 남기고 삭제 (id 가 시각으로 시작하므로 이름순 = 생성순)"""
+    ids = sorted(name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json'))
+    removed = ids[:max(0, len(ids) - keep)]
+    for profile_id in removed:
+        for ext in ('.json', '.folded'):
+            try:
+                os.remove(os.path.join(directory, profile_id + ext))
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """저장된 프로파일 메타데이터 (최신순, 메모리 상세 제외)"""
+    directory = settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((n for n in os.listdir(directory) if n.endswith('.json')), reverse=True)[:limit]
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        metadata['memory_stages'] = list(metadata.pop('memory', {}))
+        profiles.append(metadata)
+    return profiles
+
+
+def read_profile(profile_id: str, ext: str = '.json') -> Optional[str]:
+    """저장된 프로파일 파일 내용 (없으면 None)"""
+    path = os.path.join(settings.PROFILING_DIR, os.path.basename(profile_id) + ext)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
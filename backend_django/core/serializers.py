@@ -1,10 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Document, Conversation, Message, FAQ
+from .models import Document, Conversation, Message, FAQ, Job
 
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = '__all__'
+        exclude = ['country_key', 'topic_key', 'source_key']
 
 class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,8 +13,6 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class MessageSerializer(serializers.ModelSerializer):
-    references = serializers.JSONField(required=False)
-    
     class Meta:
         model = Message
         fields = '__all__'
@@ -23,6 +22,11 @@ class FAQSerializer(serializers.ModelSerializer):
         model = FAQ
         fields = '__all__'
 
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        exclude = ['payload']
+
 # 요청/응답 전용 시리얼라이저
 class ConversationCreateSerializer(serializers.Serializer):
     session_id = serializers.CharField(max_length=100)
@@ -41,3 +45,29 @@ class ChatRequestSerializer(serializers.Serializer):
 class ChatResponseSerializer(serializers.Serializer):
     message = MessageSerializer()
     conversation_id = serializers.IntegerField()
+
+class BulkDocumentItemSerializer(serializers.Serializer):
+    """대량 등록 문서 항목 (text, pdf_base64, file 중 하나 필요)"""
+    title = serializers.CharField(max_length=500)
+    url = serializers.URLField(max_length=500, required=False, allow_null=True)
+    country = serializers.CharField(max_length=100)
+    topic = serializers.CharField(max_length=100)
+    source = serializers.CharField(max_length=200, required=False, allow_null=True)
+    text = serializers.CharField(required=False)
+    pdf_base64 = serializers.CharField(required=False)
+    file = serializers.CharField(max_length=100, required=False)  # multipart 파일 필드 이름
+
+    def validate(self, attrs):
+        if sum(1 for key in ('text', 'pdf_base64', 'file') if attrs.get(key)) != 1:
+            raise serializers.ValidationError('Exactly one of text, pdf_base64 or file is required')
+        return attrs
+
+class BulkDocumentIngestSerializer(serializers.Serializer):
+    documents = BulkDocumentItemSerializer(many=True, allow_empty=False)
+
+    def validate_documents(self, value):
+        if len(value) > settings.BULK_INGEST_MAX_DOCUMENTS:
+            raise serializers.ValidationError(
+                f'At most {settings.BULK_INGEST_MAX_DOCUMENTS} documents per request'
+            )
+        return value
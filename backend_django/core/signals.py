@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Document, Conversation, Message
+from .cache import bump_documents_version, bump_history_version, history_cache_key
+from .vector_sync import schedule_delete, schedule_update
+
+# 청크 메타데이터에 반영되는 문서 필드
+VECTOR_METADATA_FIELDS = {'country', 'topic', 'source', 'title'}
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_document_caches(sender, **kwargs):
+    """문서 저장/삭제 시 문서 관련 캐시 무효화"""
+    bump_documents_version()
+
+
+@receiver(post_save, sender=Document)
+def sync_document_chunks(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """문서 메타데이터 변경을 벡터 DB 청크에 반영 (새 문서는 아직 청크가 없음)"""
+    if created or raw or not settings.VECTOR_SYNC_ENABLED:
+        return
+    if update_fields is not None and not VECTOR_METADATA_FIELDS & set(update_fields):
+        return
+    schedule_update(instance)
+
+
+@receiver(post_delete, sender=Document)
+def delete_document_chunks(sender, instance, **kwargs):
+    """문서 삭제 시 벡터 DB의 청크도 삭제"""
+    if settings.VECTOR_SYNC_ENABLED:
+        schedule_delete(instance.id)
+
+
+@receiver(post_delete, sender=Document)
+def delete_ingested_source(sender, instance, **kwargs):
+    """대량 등록 문서 삭제 시 재색인용으로 보관 중인 원문도 삭제 (커밋 후)"""
+    from documents.tasks import remove_sources
+
+    document_id = instance.id
+    transaction.on_commit(lambda: remove_sources(document_id))
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_history_tail(sender, instance, **kwargs):
+    """채팅 흐름 밖에서 메시지가 바뀌면 캐시된 히스토리 무효화 (채팅은 bulk_create 후 직접 갱신)"""
+    bump_history_version(instance.conversation_id)
+    cache.delete(history_cache_key(instance.conversation_id))
+
+
+@receiver(post_delete, sender=Conversation)
+def invalidate_conversation_tail(sender, instance, **kwargs):
+    cache.delete(history_cache_key(instance.id))
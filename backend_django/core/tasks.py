@@ -0,0 +1,154 @@
+import os
+import re
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import usage
+from .jobs import register, update_progress
+from .models import Document
+
+logger = logging.getLogger(__name__)
+
+# 벡터 컬렉션에 쓰는 작업의 잠금 (전체 재색인은 단독, 대량 등록 색인은 공유)
+VECTOR_INDEX_LOCK = 'vector_index'
+
+
+class IndexValidationError(Exception):
+    """새 컬렉션 검증 실패 (별칭을 전환하지 않음)"""
+
+
+def register_pdf_documents(rag, pdf_dir: str) -> Dict[str, int]:
+    """PDF 파일마다 Document 행을 만들거나 찾아 파일명 -> Document.id 반환 (청크의 document_id)"""
+    document_ids = {}
+    for filename in sorted(os.listdir(pdf_dir)):
+        match = re.match(rag.doc_type_pattern, filename)
+        if not match:
+            continue
+        country, doc_type = match.groups()
+        document, _ = Document.objects.get_or_create(
+            source_key=Document.normalize_key(filename),
+            defaults={
+                'title': f"{country} {doc_type}",
+                'country': country,
+                'topic': rag.document_topic(doc_type),
+                'source': filename,
+            }
+        )
+        document_ids[filename] = document.id
+    return document_ids
+
+
+def build_pdf_index(
+    pdf_dir: str,
+    batch_size: int = 500,
+    dedup: bool = True,
+    switch: bool = True,
+    gc_grace_hours: Optional[float] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    rag=None
+) -> Dict[str, Any]:
+    """PDF 디렉토리와 대량 등록 문서를 새 버전 컬렉션에 인덱싱하고 검증 후 별칭 전환"""
+    from ai_services.rag import RAG
+    from ai_services.vector_index import new_version, set_alias, validate_collection, garbage_collect, unique_collection_name
+    from documents.tasks import index_ingested_documents
+
+    rag = rag or RAG()
+    alias = rag.collection_alias
+
+    # 라이브 컬렉션 대신 새 버전 컬렉션에 기록 (검색은 기존 컬렉션을 계속 사용)
+    live_count = rag.vectorstore._collection.count()
+    # 버전은 초 단위라 같은 초에 다시 실행하면 라이브 컬렉션과 이름이 겹칠 수 있음
+    target_name = unique_collection_name(rag.client, f"{alias}-{new_version()}")
+    target = rag.get_vectorstore(target_name)
+    logger.info(f"Indexing into new collection: {target_name}")
+
+    try:
+        report = rag.process_pdf_directory(
+            pdf_dir,
+            batch_size=batch_size,
+            dedup=None if dedup else False,
+            vectorstore=target,
+            progress=progress,
+            document_ids=register_pdf_documents(rag, pdf_dir)
+        )
+        # API 로 대량 등록한 문서도 보관 중인 원문으로 다시 색인 (빠뜨리면 별칭 전환 후 검색에서 사라짐)
+        report['ingested'] = index_ingested_documents(rag, target, batch_size, datetime.now().isoformat())
+
+        # 새 컬렉션 검증
+        errors = validate_collection(
+            target._collection,
+            min_count=max(1, int(live_count * settings.VECTOR_REBUILD_MIN_RATIO)),
+            expected_dimension=settings.EMBEDDING_DIMENSIONS
+        )
+        if errors:
+            raise IndexValidationError('; '.join(errors))
+    except Exception:
+        # 색인/검증 중 실패(취소 포함)하면 만들다 만 컬렉션 삭제 (재시도마다 새 이름으로 디스크에 쌓임)
+        try:
+            rag.client.delete_collection(target_name)
+        except Exception as e:
+            logger.error(f"Failed to delete partial collection {target_name}: {e}")
+        raise
+
+    result = {**report, 'collection': target_name, 'alias': alias, 'switched': False}
+    if not switch:
+        return result
+
+    # 별칭 전환 (워커는 다음 검색부터 새 컬렉션 사용)
+    result['previous'] = set_alias(rag.persist_directory, alias, target_name)
+    result['switched'] = True
+
+    # 유예 기간이 지난 이전 버전 정리
+    if gc_grace_hours is None:
+        gc_grace_hours = settings.VECTOR_GC_GRACE_HOURS
+    result['deleted'] = garbage_collect(rag.client, rag.persist_directory, alias, gc_grace_hours * 3600)
+    return result
+
+
+@register('index_pdfs', exclusive=True, lock=VECTOR_INDEX_LOCK)
+def index_pdfs(job):
+    """PDF 전체 재색인 작업 (별칭 전환이나 대량 등록 색인과 겹치지 않도록 단독 실행)"""
+    payload = job.payload
+    return build_pdf_index(
+        payload.get('pdf_dir', 'data/pdfs'),
+        batch_size=payload.get('batch_size', 500),
+        dedup=payload.get('dedup', True),
+        switch=payload.get('switch', True),
+        gc_grace_hours=payload.get('gc_grace_hours'),
+        progress=lambda done, total: update_progress(job, done, total)
+    )
+
+
+@register('generate_qa_pairs')
+def generate_qa_pairs(job):
+    """파인튜닝용 QA 쌍 생성 작업"""
+    from ai_services.fine_tuning.qa_pair_generator import QAPairGenerator
+
+    payload = job.payload
+
+    def progress(done, total):
+        update_progress(job, done, total)
+        # 오래 걸리는 작업이므로 배치마다 그동안 모인 사용량을 저장
+        usage.flush(usage.pending())
+
+    generator = QAPairGenerator(
+        concurrency_limit=payload.get('concurrency_limit', 8),
+        batch_size=payload.get('batch_size', 50)
+    )
+    qa_pairs = asyncio.run(generator.generate_qa_pairs(
+        payload['questions_file'],
+        payload['output_file'],
+        payload.get('max_pairs'),
+        # 이벤트 루프 안에서는 ORM을 직접 호출할 수 없으므로 스레드에서 실행
+        progress_callback=sync_to_async(progress)
+    ))
+    return {
+        'output_file': payload['output_file'],
+        'generated': len(qa_pairs),
+        'failed': generator.stats['failed']
+    }
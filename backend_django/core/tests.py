@@ -1,7 +1,25 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.core.cache import cache
+from unittest import mock
+from django.db import connection
 from django.urls import reverse
-from core.models import Document, Conversation, Message
+from django.contrib.auth.models import User
+from core.models import Document, Conversation, Message, Job, UsageRecord
+from core import jobs, usage
+import os
 import json
+import time
+import asyncio
+import threading
+import base64
+import tempfile
+import fitz
+import unittest
+import importlib.util
+from ai_services.chunker import StructuredPDFChunker
+from ai_services.dedup import ChunkDeduplicator
+from chat.views import _load_conversation_tail, _append_history_tail, _fetch_message_ids
 
 class CoreModelTestCase(TestCase):
     """핵심 모델 테스트"""
@@ -52,6 +70,14 @@ class APITestCase(TestCase):
         data = response.json()
         self.assertEqual(data['status'], 'healthy')
     
+    def test_db_health(self):
+        """DB 헬스 체크 및 연결 통계"""
+        first = self.client.get(reverse('db_health')).json()
+        second = self.client.get(reverse('db_health')).json()
+        self.assertEqual(second['status'], 'healthy')
+        self.assertEqual(second['requests'], first['requests'] + 1)
+        self.assertIn('reuse_ratio', second)
+    
     def test_app_info(self):
         """앱 정보 엔드포인트 테스트"""
         response = self.client.get(reverse('app_info'))
@@ -67,6 +93,37 @@ class APITestCase(TestCase):
         data = response.json()
         self.assertIsInstance(data, list)
 
+class CatalogAPITestCase(TestCase):
+    """국가/토픽/출처 카탈로그 캐시 테스트"""
+
+    def setUp(self):
+        self.client = Client()
+        Document.objects.create(title="Japan Visa", country="Japan", topic="visa_info", source="Embassy")
+
+    def test_catalog_etag(self):
+        """ETag/Cache-Control 헤더와 304 응답"""
+        response = self.client.get(reverse('countries'))
+        self.assertEqual(response.json(), ["Japan"])
+        self.assertIn('max-age', response['Cache-Control'])
+
+        response = self.client.get(reverse('countries'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_invalidated_on_document_save(self):
+        """문서 저장 시 카탈로그 갱신"""
+        self.assertEqual(self.client.get(reverse('topics')).json(), ["visa"])
+        Document.objects.create(title="Japan Safety", country="Japan", topic="immigration_safety_info")
+        self.assertEqual(self.client.get(reverse('topics')).json(), ["safety", "visa"])
+
+    def test_catalog_expires_without_shared_cache(self):
+        """다른 워커의 변경(버전 증가가 보이지 않음)도 CATALOG_CACHE_TIMEOUT 이 지나면 반영"""
+        self.assertLessEqual(settings.CATALOG_CACHE_TIMEOUT, 60)  # 테스트 환경은 LocMem 캐시
+        with override_settings(CATALOG_CACHE_TIMEOUT=0):
+            self.assertEqual(self.client.get(reverse('topics')).json(), ["visa"])
+            # bulk_create 는 시그널을 보내지 않으므로 이 프로세스의 문서 버전은 그대로
+            Document.objects.bulk_create([Document(title="Japan Safety", country="Japan", topic="immigration_safety_info")])
+            self.assertEqual(self.client.get(reverse('topics')).json(), ["safety", "visa"])
+
 class ChatAPITestCase(TestCase):
     """채팅 API 테스트"""
     
@@ -121,9 +178,665 @@ class ChatAPITestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         data = response.json()
-        self.assertIsInstance(data, list)
-        self.assertEqual(len(data), 1)
-        self.assertEqual(data[0]['content'], "Test question")
+        self.assertIsInstance(data['messages'], list)
+        self.assertEqual(len(data['messages']), 1)
+        self.assertEqual(data['messages'][0]['content'], "Test question")
+        self.assertIsNone(data['next_cursor'])
+
+    def test_conversation_history_pagination(self):
+        """대화 기록 keyset 페이지네이션 테스트"""
+        conversation = Conversation.objects.create(session_id="test_session_3")
+        for i in range(5):
+            Message.objects.create(conversation=conversation, role="user", content=f"question {i}")
+        url = reverse('get_conversation_history', args=[conversation.id])
+
+        contents = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            contents.extend(m['content'] for m in data['messages'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(contents, [f"question {i}" for i in range(5)])
+
+    def test_conversation_history_etag(self):
+        """변경 없는 대화 기록은 304 반환, 새 메시지 후에는 200"""
+        conversation = Conversation.objects.create(session_id="test_session_4")
+        Message.objects.create(conversation=conversation, role="user", content="hello")
+        url = reverse('get_conversation_history', args=[conversation.id])
+
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Message.objects.create(conversation=conversation, role="assistant", content="hi")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conversation_history_ndjson(self):
+        """NDJSON 스트리밍 모드 테스트"""
+        conversation = Conversation.objects.create(session_id="test_session_5")
+        for i in range(3):
+            Message.objects.create(conversation=conversation, role="user", content=f"line {i}")
+
+        response = self.client.get(
+            reverse('get_conversation_history', args=[conversation.id]), {'stream': 'true'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['content'] for line in lines], ["line 0", "line 1", "line 2"])
+
+@override_settings(CHAT_HISTORY_CACHE_TIMEOUT=300)
+class ProcessMessageQueryTestCase(TransactionTestCase):
+    """채팅 한 턴의 DB 쿼리 수 (RAG/LLM 호출은 대체)"""
+
+    def setUp(self):
+        cache.clear()
+        rag = mock.Mock()
+        rag.search_with_translation.return_value = ("context", [{"title": "visa_info", "source": "japan_visa_info.pdf"}])
+        llm = mock.Mock()
+        llm.generate_with_translation = mock.AsyncMock(return_value="answer")
+        for target, value in (('chat.views.get_rag', rag), ('chat.views.get_llm', llm)):
+            patcher = mock.patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.llm = llm
+
+    def send(self, **data):
+        response = self.client.post(
+            reverse('process_message'),
+            data=json.dumps({'session_id': 'query_session', 'country': 'japan', 'topic': 'visa', **data}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_queries_per_turn(self):
+        # SQLite 는 트랜잭션의 BEGIN/COMMIT 도 쿼리로 집계됨
+        overhead = 2 if connection.vendor == 'sqlite' else 0
+        # bulk INSERT 가 id 를 돌려주지 않는 DB(MySQL)는 저장한 메시지 id 를 다시 조회
+        if not connection.features.can_return_rows_from_bulk_insert:
+            overhead += 1
+
+        # 새 대화: 한 트랜잭션에서 대화 INSERT + 메시지 2개 bulk INSERT
+        with self.assertNumQueries(2 + overhead):
+            first = self.send(message="비자 신청 방법은?")
+        conversation_id = first['conversation_id']
+        self.assertIsNotNone(first['message']['id'])
+
+        # 이어지는 턴: 캐시된 히스토리 사용, 메시지 bulk INSERT 만 실행
+        with self.assertNumQueries(1 + overhead):
+            self.send(message="수수료는?", conversation_id=conversation_id)
+        history = self.llm.generate_with_translation.call_args.kwargs['history']
+        self.assertEqual([m['role'] for m in history], ['user', 'assistant'])
+
+        # 캐시가 비어 있으면 히스토리와 대화를 한 번에 조회
+        cache.clear()
+        with self.assertNumQueries(2 + overhead):
+            self.send(message="기간은?", conversation_id=conversation_id)
+        history = self.llm.generate_with_translation.call_args.kwargs['history']
+        self.assertEqual(len(history), 4)
+        self.assertEqual(Message.objects.filter(conversation_id=conversation_id).count(), 6)
+
+    def test_concurrent_turns_do_not_overwrite_history(self):
+        """동시에 진행된 턴이 오래된 히스토리로 캐시를 덮어쓰지 않음"""
+        conversation_id = self.send(message="비자 신청 방법은?")['conversation_id']
+        conversation, history, version = _load_conversation_tail(conversation_id)
+        self.assertEqual(len(history), 2)
+
+        # 같은 캐시를 읽은 다른 턴이 먼저 기록
+        self.send(message="수수료는?", conversation_id=conversation_id)
+
+        # 늦게 끝난 턴은 캐시를 덮어쓰지 않고 지움 -> 다음 턴은 DB 에서 전체 히스토리를 읽음
+        messages = [Message(conversation_id=conversation_id, role="user", content="기간은?"),
+                    Message(conversation_id=conversation_id, role="assistant", content="answer")]
+        Message.objects.bulk_create(messages)
+        _append_history_tail(conversation, history, messages, version)
+        _, history, _ = _load_conversation_tail(conversation_id)
+        self.assertEqual(len(history), 6)
+
+    def test_message_ids_after_bulk_insert(self):
+        """bulk INSERT 가 id 를 돌려주지 않아도 방금 저장한 메시지의 id 를 찾음"""
+        conversation = Conversation.objects.create(session_id="ids_session")
+        Message.objects.create(conversation=conversation, role="assistant", content="later turn")
+        messages = [Message(conversation=conversation, role="user", content="q"),
+                    Message(conversation=conversation, role="assistant", content="a")]
+        Message.objects.bulk_create(messages)
+        expected = [m.pk for m in messages]
+        for message in messages:
+            message.pk = None
+        _fetch_message_ids(conversation, messages)
+        self.assertEqual([m.pk for m in messages], expected)
+
+    def test_usage_ledger(self):
+        """턴의 AI 호출 사용량을 대화와 함께 저장하고 집계"""
+        async def generate(**kwargs):
+            with usage.track('llm', 'openai', 'gpt-4') as entry:
+                entry.prompt_tokens, entry.completion_tokens = 100, 50
+            return "answer"
+        self.llm.generate_with_translation.side_effect = generate
+
+        # 사용량은 메시지와 같은 트랜잭션에서 bulk INSERT 한 번 추가
+        overhead = 2 if connection.vendor == 'sqlite' else 0
+        if not connection.features.can_return_rows_from_bulk_insert:
+            overhead += 1
+        with self.assertNumQueries(3 + overhead):
+            conversation_id = self.send(message="비자 신청 방법은?")['conversation_id']
+
+        record = UsageRecord.objects.get()
+        self.assertEqual(record.conversation_id, conversation_id)
+        self.assertEqual((record.country, record.topic), ('japan', 'visa_info'))
+        self.assertAlmostEqual(float(record.cost), 0.006)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('usage_summary'), {'group_by': 'provider'})
+        self.assertEqual(response.json()['results'][0]['total_prompt_tokens'], 100)
+        self.assertEqual(self.client.get(reverse('usage_summary'), {'group_by': 'x'}).status_code, 400)
+
+    def test_stage_timing(self):
+        """단계별 Server-Timing 헤더와 /metrics 히스토그램"""
+        response = self.client.post(
+            reverse('process_message'),
+            data=json.dumps({'session_id': 'timing_session', 'message': '비자?'}),
+            content_type='application/json'
+        )
+        server_timing = response['Server-Timing']
+        for stage in ('rag;dur=', 'llm;dur=', 'db_write;dur=', 'serialize;dur=', 'total;dur='):
+            self.assertIn(stage, server_timing)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('chat_stage_duration_seconds_count{stage="db.write"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{method="POST",status="200",view="process_message",le="+Inf"}', body)
+        self.assertIn('django_db_connections_created_total', body)
+
+class BenchmarkHarnessTestCase(TestCase):
+    """가짜 AI 서버와 부하 측정 도구"""
+
+    def test_llm_against_fake_server(self):
+        from benchmarks.fake_servers import FakeAIServer
+        from ai_services.llm import LLM
+
+        with FakeAIServer() as server, override_settings(**server.settings(), OPENAI_API_KEY='benchmark'):
+            with usage.collect() as entries:
+                answer = asyncio.run(LLM('gpt-3.5-turbo').generate_with_translation(
+                    query="비자 신청 방법은?", context="context", references=[], translate_to_korean=False
+                ))
+
+        self.assertTrue(answer.startswith("Benchmark answer"))
+        self.assertEqual(server.counts, {'translate': 1, 'openai': 1})
+        llm_entry = next(entry for entry in entries if entry.stage == 'llm')
+        self.assertGreater(llm_entry.prompt_tokens, 0)
+
+    def test_translation_usage_recorded(self):
+        """답변 번역(gpt-3.5) 호출의 토큰 수 기록"""
+        from benchmarks.fake_servers import FakeAIServer
+        from ai_services.llm import LLM
+
+        with FakeAIServer() as server, override_settings(**server.settings(), OPENAI_API_KEY='benchmark'):
+            with usage.collect() as entries:
+                translated = asyncio.run(LLM('gpt-3.5-turbo')._translate_to_korean("Apply for the visa online."))
+
+        self.assertTrue(translated.startswith("Benchmark answer"))
+        entry = next(entry for entry in entries if entry.stage == 'translation')
+        self.assertGreater(entry.prompt_tokens, 0)
+        self.assertGreater(entry.completion_tokens, 0)
+        self.assertGreater(entry.cost, 0)
+
+    def test_run_load(self):
+        from benchmarks.load import run_load, percentile
+
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2)
+        self.assertEqual(percentile([4, 1, 3, 2], 99), 4)
+
+        def call(i):
+            if i % 5 == 0:
+                raise ValueError(i)
+        result = run_load(call, requests=20, concurrency=4)
+        self.assertEqual(result['succeeded'], 16)
+        self.assertEqual(result['errors'], {'ValueError': 4})
+
+    def test_retrieval_scoring(self):
+        from benchmarks.retrieval import items_from_questions, parse_variant, score_item
+
+        items = items_from_questions([{'id': 'q1', 'topic': 'safety', 'question': 'Is it safe?', 'country': 'New Zealand'}])
+        self.assertEqual(items[0]['expected'], [{'source': 'newzealand_immigration_safety_info.pdf'}])
+        self.assertEqual(parse_variant('k3:top_k=3,lambda_mult=0.7'), {'name': 'k3', 'top_k': 3, 'lambda_mult': 0.7})
+        with self.assertRaises(ValueError):
+            parse_variant('bad:chunk_size=10')
+
+        references = [{'source': 'a.pdf', 'page': 1}, {'source': 'b.pdf', 'page': 4}, {'source': 'c.pdf', 'page': 2}]
+        score = score_item(references, [{'source': 'b.pdf', 'page': 4}, {'source': 'c.pdf'}], ks=[1, 2, 3])
+        self.assertEqual(score['recall'], {1: 0.0, 2: 0.5, 3: 1.0})
+        self.assertEqual(score['reciprocal_rank'], 0.5)
+        self.assertEqual(score_item(references, [{'source': 'b.pdf', 'page': 5}], ks=[3])['reciprocal_rank'], 0.0)
+
+        # recall 은 context_docs 개의 references 로 계산하므로 더 큰 k 는 거부
+        from benchmarks.retrieval import check_ks
+        check_ks({'name': 'ctx5', 'context_docs': 5}, [1, 3, 5])
+        with self.assertRaises(ValueError):
+            check_ks({'name': 'ctx3', 'context_docs': 3}, [1, 3, 5])
+
+
+class ProfilingTestCase(TestCase):
+    """요청 단위 샘플링 프로파일"""
+
+    def setUp(self):
+        cache.clear()
+        self.profile_dir = tempfile.mkdtemp()
+        overrides = override_settings(
+            PROFILING_ENABLED=True, PROFILING_TOKEN='secret', PROFILING_DIR=self.profile_dir,
+            PROFILING_MAX_PROFILES=2, PROFILING_INTERVAL_MS=1
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_sampler_collects_folded_stacks(self):
+        from core.profiling import SamplingProfiler
+
+        def busy_work():
+            started = time.perf_counter()
+            while time.perf_counter() - started < 0.05:
+                sum(range(1000))
+
+        profiler = SamplingProfiler(interval=0.001).start()
+        busy_work()
+        profiler.stop()
+        self.assertGreater(profiler.samples, 0)
+        stack, count = profiler.folded().splitlines()[0].rsplit(' ', 1)
+        self.assertIn('busy_work', stack)
+        self.assertGreater(int(count), 0)
+
+    def test_header_triggered_profile(self):
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('health_check'), HTTP_X_PROFILE='wrong'))
+        for _ in range(3):
+            response = self.client.get(reverse('health_check'), HTTP_X_PROFILE='secret', HTTP_X_PROFILE_MEMORY='1')
+        profile_id = response['X-Profile-Id']
+
+        # 보존 개수를 넘는 오래된 프로파일은 삭제
+        self.assertEqual(len([n for n in os.listdir(self.profile_dir) if n.endswith('.json')]), 2)
+
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 403)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        listed = self.client.get(reverse('profiles')).json()['results']
+        self.assertEqual(listed[0]['id'], profile_id)
+        self.assertEqual(listed[0]['trigger'], 'header')
+        stacks = self.client.get(reverse('profile_stacks', args=[profile_id]))
+        self.assertEqual(stacks['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(self.client.get(reverse('profile_detail', args=['missing'])).status_code, 404)
+
+        response = self.client.post(
+            reverse('profiling_toggle'), data=json.dumps({'sample_rate': 1}), content_type='application/json'
+        )
+        self.assertEqual(response.json()['toggle']['sample_rate'], 1)
+        self.assertIn('X-Profile-Id', self.client.get(reverse('health_check')))
+        self.assertEqual(self.client.post(
+            reverse('profiling_toggle'), data=json.dumps({'sample_rate': 2}), content_type='application/json'
+        ).status_code, 400)
+        self.client.post(reverse('profiling_toggle'), data=json.dumps({'sample_rate': 0}), content_type='application/json')
+
+
+class BorrowCheckingTokenizer:
+    """여러 스레드가 동시에 쓰면 fast 토크나이저처럼 'Already borrowed' 오류를 내는 테스트용 토크나이저"""
+
+    def __init__(self):
+        self.threads = set()
+        self._busy = threading.Lock()
+
+    def _use(self, result):
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("Already borrowed")
+        try:
+            self.threads.add(threading.get_ident())
+            time.sleep(0.002)
+            return result
+        finally:
+            self._busy.release()
+
+    def encode(self, text, add_special_tokens=True):
+        return self._use(text.split())
+
+    def decode(self, tokens):
+        return self._use(" ".join(tokens))
+
+class LocalLLMTestCase(TestCase):
+    """파인튜닝 모델 로컬 실행 (모델 호출은 대체)"""
+
+    def test_prompt_format_matches_training(self):
+        from ai_services.fine_tuning.prompts import build_prompt, build_training_text, extract_answer
+
+        prompt = build_prompt("Is insurance mandatory?", "Italy requires insurance.")
+        self.assertTrue(build_training_text("Is insurance mandatory?", "Italy requires insurance.", "Yes.").startswith(prompt))
+        self.assertEqual(extract_answer(" Yes, it is.\nQuestion: Next?"), "Yes, it is.")
+
+    def local_model(self, **kwargs):
+        """모델 대신 BorrowCheckingTokenizer 만 로드하는 LocalModel (load 를 호출한 스레드 기록)"""
+        from ai_services.local_llm import LocalModel
+
+        tokenizer = BorrowCheckingTokenizer()
+        load_threads = set()
+
+        def load(model):
+            load_threads.add(threading.get_ident())
+            model.model, model.tokenizer = object(), tokenizer
+
+        def generate_batch(model, requests):
+            return [
+                {"answer": f"answer to {r.prompt.split()[1]}", "prompt_tokens": len(model.tokenizer.encode(r.prompt)),
+                 "completion_tokens": 3, "batch_size": len(requests)}
+                for r in requests
+            ]
+
+        for name, replacement in (('load', load), ('generate_batch', generate_batch)):
+            patcher = mock.patch.object(LocalModel, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        model = LocalModel('/models/finetuned', **kwargs)
+        self.addCleanup(model.batcher.stop)
+        return model, tokenizer, load_threads
+
+    def test_local_model_tokenizes_on_batcher_thread(self):
+        """동시 요청의 모델 로드와 토큰화는 배처 스레드에서만 (이벤트 루프를 막지 않음)"""
+        from ai_services.llm import LLM
+
+        model, tokenizer, load_threads = self.local_model(max_batch_size=8, batch_wait_ms=100, bucket_width=0)
+
+        async def ask_all():
+            llm = LLM('phi-2')
+            return await asyncio.gather(*(
+                llm._generate_local_response(f"q{i}", "visa context " * 20) for i in range(6)
+            ))
+
+        with mock.patch('ai_services.llm.get_local_model', return_value=model), usage.collect():
+            answers = asyncio.run(ask_all())
+
+        self.assertEqual(answers, [f"answer to q{i}" for i in range(6)])
+        self.assertEqual(load_threads, {model.batcher._thread.ident})
+        self.assertEqual(tokenizer.threads, {model.batcher._thread.ident})
+
+    def test_local_response_timeout_cancels_request(self):
+        """배처가 응답하지 않으면 ai_timeout 후 실패하고 대기 중인 요청을 취소"""
+        from concurrent.futures import Future
+        import httpx
+        from ai_services.llm import LLM
+
+        future = Future()
+        local_model = mock.Mock()
+        local_model.submit.return_value = future
+        llm = LLM('phi-2')
+        llm.ai_timeout = httpx.Timeout(0.05)
+
+        with mock.patch('ai_services.llm.get_local_model', return_value=local_model), usage.collect():
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(llm._generate_local_response("question", "context"))
+        self.assertTrue(future.cancelled())
+
+    def test_model_path_change_stops_previous_batcher(self):
+        """LOCAL_LLM_MODEL_PATH 가 바뀌면 이전 모델의 배처 스레드 종료"""
+        from ai_services import local_llm
+
+        with mock.patch.object(local_llm.LocalModel, 'load'), \
+                mock.patch.object(local_llm, '_local_model', None), \
+                mock.patch.object(local_llm, '_local_model_pid', None):
+            with override_settings(LOCAL_LLM_MODEL_PATH='/models/first'):
+                first = local_llm.get_local_model()
+                self.assertIs(local_llm.get_local_model(), first)
+            with override_settings(LOCAL_LLM_MODEL_PATH='/models/second'):
+                second = local_llm.get_local_model()
+            self.addCleanup(second.batcher.stop)
+
+        self.assertEqual(second.model_path, '/models/second')
+        self.assertFalse(first.batcher._thread.is_alive())
+        self.assertTrue(second.batcher._thread.is_alive())
+
+    def test_batcher_groups_concurrent_requests(self):
+        from concurrent.futures import wait
+        from ai_services.local_llm import DynamicBatcher
+
+        sizes = []
+
+        def run_batch(requests):
+            sizes.append(len(requests))
+            return [r.prompt.upper() for r in requests]
+
+        batcher = DynamicBatcher(run_batch, max_batch_size=4, max_wait=0.2)
+        self.addCleanup(batcher.stop)
+        futures = [batcher.submit(f"q{i}", 8) for i in range(6)]
+        wait(futures, timeout=5)
+        self.assertEqual([f.result() for f in futures], [f"Q{i}" for i in range(6)])
+        self.assertEqual(sizes, [4, 2])
+
+    def test_bucket_by_length(self):
+        from ai_services.local_llm import GenerationRequest, bucket_by_length
+
+        requests = [GenerationRequest(f"p{length}", 8, length) for length in (300, 20, 40, 280, 100)]
+        buckets = bucket_by_length(requests, width=64)
+        self.assertEqual([[r.length for r in b] for b in buckets], [[20, 40], [100], [280, 300]])
+        self.assertEqual(len(bucket_by_length(requests, width=0)), 1)
+
+    def test_inference_server_batches_requests(self):
+        import httpx
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from ai_services.local_llm import LocalModel
+        from ai_services.inference_server import InferenceServer
+
+        def generate_batch(model, requests):
+            return [
+                {"answer": f"answer to {r.prompt.split()[1]}", "prompt_tokens": r.length, "completion_tokens": 3, "batch_size": len(requests)}
+                for r in requests
+            ]
+
+        def fit_prompt(model, question, context):
+            prompt = f"Question: {question} Context: {context}"
+            return prompt, len(prompt.split())
+
+        with mock.patch.object(LocalModel, 'load'), \
+                mock.patch.object(LocalModel, 'fit_prompt', fit_prompt), \
+                mock.patch.object(LocalModel, 'generate_batch', generate_batch):
+            model = LocalModel('/models/finetuned', max_batch_size=8, batch_wait_ms=200, bucket_width=0)
+            self.addCleanup(model.batcher.stop)
+            server = InferenceServer(model, host='127.0.0.1', port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+
+            def ask(i):
+                return httpx.post(f"{url}/api/ask", json={"question": f"q{i}", "context": "ctx"}, timeout=10).json()
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(ask, range(4)))
+
+            self.assertEqual([r["answer"] for r in results], [f"answer to q{i}" for i in range(4)])
+            self.assertTrue(all(r["success"] and r["batch_size"] == 4 for r in results))
+            self.assertEqual(httpx.post(f"{url}/api/ask", json={}, timeout=10).status_code, 400)
+            self.assertEqual(httpx.get(f"{url}/api/health", timeout=10).json()["requests"], 4)
+
+    def test_inference_server_concurrent_submit(self):
+        """HTTP 요청 스레드가 동시에 들어와도 토크나이저는 배처 스레드에서만 사용"""
+        import httpx
+        from concurrent.futures import ThreadPoolExecutor
+        from ai_services.inference_server import InferenceServer
+
+        model, tokenizer, _ = self.local_model(max_batch_size=4, batch_wait_ms=20, bucket_width=16)
+        server = InferenceServer(model, host='127.0.0.1', port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def ask(i):
+            payload = {"question": f"q{i}", "context": "visa context " * (i % 4 * 10)}
+            return httpx.post(f"{url}/api/ask", json=payload, timeout=10).json()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(ask, range(16)))
+
+        self.assertTrue(all(r["success"] for r in results), results)
+        self.assertEqual([r["answer"] for r in results], [f"answer to q{i}" for i in range(16)])
+        self.assertEqual(tokenizer.threads, {model.batcher._thread.ident})
+
+    def test_inference_server_validates_max_new_tokens(self):
+        """max_new_tokens 는 양의 정수만 받고 모델 설정값으로 제한"""
+        import httpx
+        from ai_services.inference_server import InferenceServer
+
+        model, _, _ = self.local_model(max_batch_size=1, max_new_tokens=64)
+        server = InferenceServer(model, host='127.0.0.1', port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/ask"
+
+        for invalid in ("100", 0, -5, 1.5, True):
+            response = httpx.post(url, json={"question": "q1", "max_new_tokens": invalid}, timeout=10)
+            self.assertEqual(response.status_code, 400, invalid)
+
+        with mock.patch.object(model.batcher, 'submit', wraps=model.batcher.submit) as submit:
+            response = httpx.post(url, json={"question": "q1", "max_new_tokens": 100000}, timeout=10)
+        self.assertTrue(response.json()["success"])
+        self.assertEqual(submit.call_args.args[1], 64)
+
+    def test_phi_chain_prefers_local_model(self):
+        from concurrent.futures import Future
+        from ai_services.llm import LLM
+
+        future = Future()
+        future.set_result({"answer": "local answer", "prompt_tokens": 12, "completion_tokens": 3})
+        local_model = mock.Mock()
+        local_model.submit.return_value = future
+
+        with override_settings(LOCAL_LLM_MODEL_PATH='/models/finetuned'), \
+                mock.patch('ai_services.llm.get_local_model', return_value=local_model), \
+                usage.collect() as entries:
+            answer = asyncio.run(LLM('phi-2')._generate_response("question", "context", None, "system"))
+
+        self.assertEqual(answer, "local answer")
+        local_model.submit.assert_called_once_with("question", "context")
+        self.assertEqual((entries[0].provider, entries[0].prompt_tokens), ('local', 12))
+
+
+class FineTuningPreprocessingTestCase(TestCase):
+    """학습 데이터 토큰화 캐시 키와 패킹 (torch 불필요)"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.qa_file = os.path.join(self.tmp_dir.name, 'qa.jsonl')
+        self.write('{"question": "q", "context": "c", "answer": "a"}\n')
+
+    def write(self, content):
+        with open(self.qa_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_cache_key_invalidation(self):
+        from ai_services.fine_tuning.preprocessing import dataset_cache_key, dataset_cache_path
+
+        key = lambda **kwargs: dataset_cache_key(self.qa_file, **{
+            'model_name': 'microsoft/phi-2', 'vocab_size': 50295, 'max_length': 512, 'packing': False, **kwargs
+        })
+        base = key()
+        self.assertEqual(key(), base)
+        self.assertNotEqual(key(prompt_template="Q: {question}\nC: {context}\nA:"), base)
+        self.assertNotEqual(key(max_length=256), base)
+        self.assertNotEqual(key(packing=True), base)
+        self.assertNotEqual(key(vocab_size=50296), base)
+
+        self.write('{"question": "q", "context": "c", "answer": "b"}\n')
+        self.assertNotEqual(key(), base)
+        self.assertEqual(
+            dataset_cache_path(self.qa_file, base),
+            os.path.join(self.tmp_dir.name, '.dataset_cache', base)
+        )
+
+    def test_pack_token_ids(self):
+        from ai_services.fine_tuning.preprocessing import pack_token_ids
+
+        packed = pack_token_ids([[1, 2, 3], [4, 5], [6, 7, 8, 9]], max_length=4, eos_token_id=0)
+        # 1 2 3 EOS 4 5 EOS 6 7 8 9 EOS -> 4개 블록 3개, 남는 토큰 없음
+        self.assertEqual(packed['input_ids'], [[1, 2, 3, 0], [4, 5, 0, 6], [7, 8, 9, 0]])
+        self.assertEqual(packed['attention_mask'], [[1] * 4] * 3)
+
+        # 블록을 채우지 못한 끝부분은 버림
+        packed = pack_token_ids([[1, 2, 3], [4, 5]], max_length=4, eos_token_id=0)
+        self.assertEqual(packed['input_ids'], [[1, 2, 3, 0]])
+        self.assertTrue(all(len(block) == 4 for block in packed['input_ids']))
+
+TRAINING_DEPENDENCIES = ('torch', 'transformers', 'peft', 'datasets')
+
+
+@unittest.skipUnless(
+    all(importlib.util.find_spec(name) for name in TRAINING_DEPENDENCIES),
+    'fine-tuning dependencies (torch, transformers, peft, datasets) are not installed'
+)
+class ModelTrainerTestCase(TestCase):
+    """학습 처리량 측정(collator/callback)과 체크포인트 재개"""
+
+    def test_counting_collator_excludes_padding(self):
+        from tokenizers import Tokenizer, models
+        from transformers import DataCollatorForLanguageModeling, PreTrainedTokenizerFast
+        from ai_services.fine_tuning.model_trainer import TokenCountingCollator
+
+        vocab = {"[PAD]": 0, "[UNK]": 1, "a": 2, "b": 3}
+        tokenizer = PreTrainedTokenizerFast(
+            tokenizer_object=Tokenizer(models.WordLevel(vocab, unk_token="[UNK]")),
+            pad_token="[PAD]"
+        )
+        collator = TokenCountingCollator(DataCollatorForLanguageModeling(tokenizer, mlm=False, pad_to_multiple_of=8))
+
+        batch = collator([{"input_ids": [2, 3, 2]}, {"input_ids": [3, 3, 3, 3, 2]}])
+        self.assertEqual(tuple(batch["input_ids"].shape), (2, 8))
+        self.assertEqual(collator.tokens, 8)
+
+    def test_throughput_callback_excludes_eval(self):
+        from types import SimpleNamespace
+        from ai_services.fine_tuning.model_trainer import ThroughputCallback
+
+        counter = SimpleNamespace(tokens=0)
+        callback = ThroughputCallback(counter)
+        args, state = SimpleNamespace(logging_steps=0), SimpleNamespace(global_step=1)
+
+        callback.on_train_begin(args, state, None)
+        counter.tokens += 100
+        callback.on_step_end(args, state, None)
+
+        # 평가 배치도 같은 collator 를 거치지만 다음 step 에는 포함되지 않음
+        counter.tokens += 500
+        callback.on_evaluate(args, state, None)
+        counter.tokens += 40
+        state.global_step = 2
+        callback.on_step_end(args, state, None)
+
+        self.assertEqual([r["tokens"] for r in callback.history], [100, 40])
+
+    def test_resume_without_checkpoint(self):
+        from ai_services.fine_tuning import model_trainer
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        output_dir = tmp_dir.name
+        dataset = mock.Mock()
+        dataset.train_test_split.return_value = {"train": mock.Mock(), "test": mock.Mock()}
+
+        trainer = model_trainer.ModelTrainer()
+        trainer.model, trainer.tokenizer = mock.Mock(), mock.Mock()
+        with mock.patch.object(model_trainer.ModelTrainer, 'prepare_dataset', return_value=dataset), \
+                mock.patch.object(model_trainer, 'TrainingArguments'), \
+                mock.patch.object(model_trainer, 'Trainer') as trainer_class:
+            # 체크포인트가 없으면 처음부터 학습
+            trainer.train('qa.jsonl', output_dir, resume_from_checkpoint=True)
+            trainer_class.return_value.train.assert_called_once_with(resume_from_checkpoint=None)
+
+            # 있으면 마지막 체크포인트부터
+            os.makedirs(os.path.join(output_dir, 'checkpoint-100'))
+            trainer_class.return_value.train.reset_mock()
+            trainer.train('qa.jsonl', output_dir, resume_from_checkpoint=True)
+            trainer_class.return_value.train.assert_called_once_with(
+                resume_from_checkpoint=os.path.join(output_dir, 'checkpoint-100')
+            )
 
 class DocumentAPITestCase(TestCase):
     """문서 API 테스트"""
@@ -146,6 +859,44 @@ class DocumentAPITestCase(TestCase):
         self.assertIn('count', data)
         self.assertEqual(data['count'], 1)
     
+    def test_list_documents_cursor_and_filters(self):
+        """대소문자 무관 필터와 커서 페이지네이션 테스트"""
+        for i in range(4):
+            Document.objects.create(title=f"Visa {i}", country="Japan", topic="visa")
+
+        ids = []
+        cursor = None
+        while True:
+            params = {'country': 'JAPAN', 'page_size': 3}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('list_documents'), params).json()
+            self.assertEqual(data['count'], 4)
+            ids.extend(doc['id'] for doc in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+
+    @override_settings(DOCUMENT_COUNT_CACHE_TIMEOUT=300)
+    def test_list_documents_count_invalidated(self):
+        """문서 추가/삭제 시 캐시된 개수 갱신 (공용 캐시 설정)"""
+        self.assertEqual(self.client.get(reverse('list_documents')).json()['count'], 1)
+        document = Document.objects.create(title="Other", country="canada", topic="visa")
+        self.assertEqual(self.client.get(reverse('list_documents')).json()['count'], 2)
+        document.delete()
+        self.assertEqual(self.client.get(reverse('list_documents')).json()['count'], 1)
+
+    def test_list_documents_count_uncached_without_shared_cache(self):
+        """LocMem 캐시에서는 개수를 캐시하지 않아 다른 워커의 변경도 바로 반영"""
+        self.assertEqual(settings.DOCUMENT_COUNT_CACHE_TIMEOUT, 0)  # 테스트 환경은 LocMem 캐시
+        self.assertEqual(self.client.get(reverse('list_documents')).json()['count'], 1)
+        # bulk_create 는 시그널을 보내지 않으므로 이 프로세스의 문서 버전은 그대로
+        Document.objects.bulk_create([Document(title="Other", country="canada", topic="visa")])
+        self.assertEqual(self.client.get(reverse('list_documents')).json()['count'], 2)
+
     def test_get_document(self):
         """문서 상세 API 테스트"""
         response = self.client.get(
@@ -171,3 +922,610 @@ class DocumentAPITestCase(TestCase):
         self.assertEqual(response.status_code, 201)
         data = response.json()
         self.assertEqual(data['title'], 'New Document')
+
+
+    def test_bulk_ingest_documents(self):
+        """대량 등록: 일괄 저장 후 인덱싱 작업 예약 및 진행률 조회"""
+        pdf = fitz.open()
+        pdf.new_page().insert_text((72, 72), "Working holiday visa")
+        payload = {'documents': [
+            {'title': 'Text Doc', 'country': 'Japan', 'topic': 'visa', 'text': 'Visa rules'},
+            {'title': 'PDF Doc', 'country': 'Japan', 'topic': 'visa',
+             'pdf_base64': base64.b64encode(pdf.tobytes()).decode('ascii')},
+        ]}
+
+        with tempfile.TemporaryDirectory() as upload_dir, override_settings(INGEST_UPLOAD_DIR=upload_dir):
+            response = self.client.post(
+                reverse('bulk_ingest_documents'),
+                data=json.dumps(payload),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 202)
+
+            job = Job.objects.get(id=response.json()['job_id'])
+            self.assertEqual(job.status, Job.STATUS_QUEUED)
+            self.assertEqual(sorted(os.listdir(os.path.join(upload_dir, str(job.id)))), ['00000.txt', '00001.pdf'])
+            self.assertEqual(list(job.documents.values_list('country_key', flat=True)), ['japan', 'japan'])
+
+            data = self.client.get(reverse('job_status', args=[job.id])).json()
+            self.assertEqual((data['progress'], data['total']), (0, 2))
+
+        # 원문이 PDF가 아니면 아무것도 저장하지 않음
+        payload['documents'][1]['pdf_base64'] = base64.b64encode(b'not a pdf').decode('ascii')
+        response = self.client.post(
+            reverse('bulk_ingest_documents'),
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_bulk_ingest_documents_multipart(self):
+        """multipart 대량 등록: documents JSON 필드 + PDF 파일 필드"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        pdf = fitz.open()
+        pdf.new_page().insert_text((72, 72), "Travel insurance")
+        documents = [
+            {'title': 'Upload', 'country': 'Canada', 'topic': 'insurance', 'file': 'pdf0'},
+            {'title': 'Note', 'country': 'Canada', 'topic': 'insurance', 'text': 'Insurance rules'},
+        ]
+
+        with tempfile.TemporaryDirectory() as upload_dir, override_settings(INGEST_UPLOAD_DIR=upload_dir):
+            response = self.client.post(reverse('bulk_ingest_documents'), data={
+                'documents': json.dumps(documents),
+                'pdf0': SimpleUploadedFile('upload.pdf', pdf.tobytes(), content_type='application/pdf'),
+            })
+            self.assertEqual(response.status_code, 202)
+
+            job = Job.objects.get(id=response.json()['job_id'])
+            with open(os.path.join(upload_dir, str(job.id), '00000.pdf'), 'rb') as f:
+                self.assertTrue(f.read().startswith(b'%PDF'))
+            self.assertEqual(job.documents.count(), 2)
+
+        # 항목이 가리키는 파일 필드가 없으면 400
+        response = self.client.post(reverse('bulk_ingest_documents'), data={'documents': json.dumps(documents)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 1)
+
+@override_settings(JOB_WORKERS=0, JOB_RETRY_BACKOFF_SECONDS=0)
+class JobQueueTestCase(TestCase):
+    """작업 큐 재시도/취소 테스트"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.calls = []
+
+        @jobs.register('test_flaky')
+        def flaky(job):
+            cls.calls.append(job.attempts)
+            if job.attempts < 2:
+                raise RuntimeError('temporary failure')
+            return {'attempts': job.attempts}
+
+        @jobs.register('test_async_usage')
+        def async_usage(job):
+            def search():
+                with usage.track('embedding', 'openai', 'text-embedding-3-small'):
+                    pass
+
+            async def generate():
+                with usage.track('llm', 'openai', 'gpt-4') as entry:
+                    entry.prompt_tokens = 10
+                await asyncio.to_thread(search)
+
+            asyncio.run(generate())
+            return {}
+
+        @jobs.register('test_cancellable')
+        def cancellable(job):
+            Job.objects.filter(id=job.id).update(cancel_requested=True)
+            jobs.update_progress(job, 1)
+            return {'finished': True}
+
+    def test_retry_with_backoff(self):
+        job = jobs.enqueue('test_flaky', max_attempts=3)
+        self.assertEqual(jobs.work(max_jobs=1), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.STATUS_QUEUED, 1, 'temporary failure'))
+
+        self.assertEqual(jobs.work(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, {'attempts': 2})
+
+    def test_cancel(self):
+        queued = jobs.enqueue('test_flaky')
+        response = self.client.post(reverse('cancel_job', args=[queued.id]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], Job.STATUS_CANCELLED)
+        self.assertEqual(jobs.work(), 0)
+
+        # 실행 중 취소 요청은 진행 보고 시점에 반영
+        running = jobs.enqueue('test_cancellable')
+        jobs.work()
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.STATUS_CANCELLED)
+        self.assertEqual(self.client.post(reverse('cancel_job', args=[running.id])).status_code, 409)
+
+    def test_async_job_usage_saved(self):
+        """이벤트 루프 안에서 발생한 작업의 AI 호출 사용량도 저장"""
+        jobs.enqueue('test_async_usage')
+        # 작업이 끝난 뒤 한 번의 bulk INSERT 로 저장
+        with mock.patch.object(usage, 'save', wraps=usage.save) as save:
+            jobs.work()
+        save.assert_called_once()
+        self.assertEqual(
+            sorted(UsageRecord.objects.values_list('stage', flat=True)),
+            ['embedding', 'llm']
+        )
+
+    def test_requeue_stale_respects_max_attempts(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        stale_at = timezone.now() - timedelta(hours=1)
+        retry = Job.objects.create(kind='test_flaky', status=Job.STATUS_RUNNING, attempts=1, max_attempts=2, heartbeat_at=stale_at)
+        exhausted = Job.objects.create(kind='test_flaky', status=Job.STATUS_RUNNING, attempts=2, max_attempts=2, heartbeat_at=stale_at)
+        alive = Job.objects.create(kind='test_flaky', status=Job.STATUS_RUNNING, attempts=2, max_attempts=2, heartbeat_at=timezone.now())
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        statuses = dict(Job.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[retry.id], Job.STATUS_QUEUED)
+        self.assertEqual(statuses[exhausted.id], Job.STATUS_FAILED)
+        self.assertEqual(statuses[alive.id], Job.STATUS_RUNNING)
+
+    def test_shared_and_exclusive_locks(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        jobs.register('test_rebuild', exclusive=True, lock='test_index')(lambda job: None)
+        jobs.register('test_ingest', lock='test_index')(lambda job: None)
+        kinds = ['test_rebuild', 'test_ingest']
+
+        # 단독 작업 실행 중에는 같은 잠금의 공유 작업을 가져가지 않음
+        rebuild = Job.objects.create(kind='test_rebuild', status=Job.STATUS_RUNNING)
+        ingest = jobs.enqueue('test_ingest')
+        self.assertIsNone(jobs.claim_next('worker-1', kinds))
+
+        Job.objects.filter(id=rebuild.id).update(status=Job.STATUS_SUCCEEDED)
+        self.assertEqual(jobs.claim_next('worker-1', kinds).id, ingest.id)
+
+        # 공유 작업끼리는 동시에 실행, 단독 작업은 모두 끝날 때까지 대기
+        second = jobs.enqueue('test_ingest')
+        rebuild = jobs.enqueue('test_rebuild')
+        # 단독 작업이 먼저 대기 중이어도 공유 작업이 실행 중이면 건너뜀
+        Job.objects.filter(id=rebuild.id).update(run_after=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(jobs.claim_next('worker-2', kinds).id, second.id)
+        self.assertIsNone(jobs.claim_next('worker-3', kinds))
+
+class JobHeartbeatTestCase(TransactionTestCase):
+    """진행 보고가 없는 긴 작업도 heartbeat 스레드가 갱신하여 회수되지 않음"""
+
+    def test_heartbeat_keeps_long_job_alive(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        stale_at = timezone.now() - timedelta(hours=1)
+        job = Job.objects.create(kind='index_pdfs', status=Job.STATUS_RUNNING, worker='worker-1', heartbeat_at=stale_at)
+
+        with jobs.Heartbeat(job, interval=0.05):
+            deadline = time.monotonic() + 5
+            while Job.objects.get(id=job.id).heartbeat_at == stale_at and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        self.assertEqual(jobs.requeue_stale(stale_seconds=60), 0)
+        self.assertEqual(Job.objects.get(id=job.id).status, Job.STATUS_RUNNING)
+
+class DBMetricsTestCase(TransactionTestCase):
+    """요청 밖 스레드(작업 워커 등)의 연결도 닫히거나 스레드가 끝나면 열린 연결 수에서 제외"""
+
+    def test_open_connections_outside_requests(self):
+        import gc
+        from django.db import connections
+        from core import db_metrics
+
+        baseline = db_metrics.snapshot()['open_connections']
+        opened = []
+
+        def use_connection(close):
+            connections['default'].ensure_connection()
+            opened.append(db_metrics.snapshot()['open_connections'])
+            if close:
+                connections['default'].close()
+
+        for close in (True, False):
+            thread = threading.Thread(target=use_connection, args=(close,))
+            thread.start()
+            thread.join()
+            gc.collect()
+            self.assertEqual(db_metrics.snapshot()['open_connections'], baseline)
+        self.assertEqual(opened, [baseline + 1, baseline + 1])
+
+class VectorIndexTestCase(TestCase):
+    """버전 컬렉션 이름/스냅샷 복원 테스트"""
+
+    def setUp(self):
+        from chromadb import PersistentClient
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.client = PersistentClient(path=self.tmp_dir.name)
+
+    def test_unique_collection_name(self):
+        from ai_services.vector_index import unique_collection_name
+
+        # 같은 초에 다시 재색인해도 라이브 컬렉션에 쓰지 않음
+        self.assertEqual(unique_collection_name(self.client, 'docs-20260101000000'), 'docs-20260101000000')
+        self.client.create_collection('docs-20260101000000')
+        self.client.create_collection('docs-20260101000000-2')
+        self.assertEqual(unique_collection_name(self.client, 'docs-20260101000000'), 'docs-20260101000000-3')
+
+    def test_restore_live_snapshot_keeps_live_collection(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from ai_services.vector_index import set_alias, write_snapshot, resolve_collection
+
+        live = self.client.create_collection('docs-20260101000000')
+        live.add(ids=['a', 'b'], documents=['a', 'b'], embeddings=[[1.0, 0.0], [0.0, 1.0]], metadatas=[{'n': 1}, {'n': 2}])
+        set_alias(self.tmp_dir.name, 'docs', 'docs-20260101000000')
+        snapshot = os.path.join(self.tmp_dir.name, 'docs.tar')
+        write_snapshot(live, snapshot, version='20260101000000', extra={'alias': 'docs'})
+
+        with override_settings(VECTOR_DB_PATH=self.tmp_dir.name):
+            # 복원이 실패해도 라이브 컬렉션과 별칭은 그대로
+            with mock.patch('ai_services.vector_index._add_records', side_effect=RuntimeError('disk full')):
+                call_command('index_restore', snapshot, stdout=StringIO())
+            self.assertEqual(resolve_collection(self.tmp_dir.name, 'docs'), 'docs-20260101000000')
+            self.assertEqual(self.client.get_collection('docs-20260101000000').count(), 2)
+            self.assertEqual([c.name for c in self.client.list_collections()], ['docs-20260101000000'])
+
+            call_command('index_restore', snapshot, stdout=StringIO())
+        self.assertEqual(resolve_collection(self.tmp_dir.name, 'docs'), 'docs-20260101000000-2')
+        self.assertEqual(self.client.get_collection('docs-20260101000000-2').count(), 2)
+
+class VectorSyncTestCase(TestCase):
+    """문서 수정/삭제의 벡터 DB 반영 및 고아 청크 정리 테스트"""
+
+    def setUp(self):
+        from chromadb import PersistentClient
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        settings_override = override_settings(VECTOR_DB_PATH=self.tmp_dir.name, VECTOR_COLLECTION_NAME='test-documents')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.kept = Document.objects.create(title="Kept", country="japan", topic="visa", source="kept.pdf")
+        self.removed = Document.objects.create(title="Removed", country="japan", topic="visa", source="removed.pdf")
+
+        self.collection = PersistentClient(path=self.tmp_dir.name).create_collection('test-documents')
+        metadatas = [
+            {"document_id": self.kept.id, "country": "japan", "document_type": "visa_info", "tag": "japan_visa_info"},
+            {"document_id": self.removed.id, "country": "japan", "document_type": "visa_info", "tag": "japan_visa_info"},
+            {"document_id": self.removed.id, "country": "japan", "document_type": "visa_info", "tag": "japan_visa_info"},
+            {"document_id": 999999, "country": "japan", "document_type": "visa_info", "tag": "japan_visa_info"},
+        ]
+        self.collection.add(
+            ids=["kept-0", "removed-0", "removed-1", "orphan-0"],
+            documents=["kept", "removed", "removed", "orphan"],
+            metadatas=metadatas,
+            embeddings=[[float(i), 1.0, 0.0] for i in range(4)]
+        )
+
+    def test_delete_and_update_cascade(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.filter(id=self.removed.id).delete()
+        self.assertEqual(sorted(self.collection.get()["ids"]), ["kept-0", "orphan-0"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kept.topic = "insurance"
+            self.kept.save()
+        metadata = self.collection.get(ids=["kept-0"])["metadatas"][0]
+        self.assertEqual(metadata["tag"], "japan_insurance_info")
+        self.assertEqual(metadata["document_id"], self.kept.id)
+
+    def test_flush_reuses_client(self):
+        """커밋마다 새 Chroma 클라이언트를 만들지 않음"""
+        import chromadb
+        from ai_services.vector_index import get_client
+
+        with mock.patch('chromadb.PersistentClient', wraps=chromadb.PersistentClient) as client_class:
+            for topic in ("insurance", "visa"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.kept.topic = topic
+                    self.kept.save()
+        self.assertLessEqual(client_class.call_count, 1)
+        self.assertEqual(self.collection.get(ids=["kept-0"])["metadatas"][0]["tag"], "japan_visa_info")
+        self.assertIs(get_client(self.tmp_dir.name), get_client(os.path.join(self.tmp_dir.name, '.')))
+
+    def test_delete_canonical_owner_rehomes_chunk(self):
+        """다른 문서가 연결된 대표 청크는 소유 문서를 삭제해도 남은 문서로 이전"""
+        other = Document.objects.create(title="Other", country="france", topic="visa", source="other.pdf")
+        self.collection.add(
+            ids=["canonical-0", "kept-1"],
+            documents=["shared boilerplate", "kept boilerplate"],
+            metadatas=[
+                {"document_id": self.removed.id, "country": "japan", "document_type": "visa_info",
+                 "tag": "japan_visa_info", f"linked_document:{other.id}": True, "linked_tag:france_visa_info": True},
+                {"document_id": self.kept.id, "country": "japan", "document_type": "visa_info",
+                 "tag": "japan_visa_info", f"linked_document:{other.id}": True, "linked_tag:france_visa_info": True},
+            ],
+            embeddings=[[4.0, 1.0, 0.0], [5.0, 1.0, 0.0]]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.removed.delete()
+        self.assertEqual(sorted(self.collection.get()["ids"]), ["canonical-0", "kept-0", "kept-1", "orphan-0"])
+        metadata = self.collection.get(ids=["canonical-0"])["metadatas"][0]
+        self.assertEqual(metadata["document_id"], other.id)
+        self.assertEqual(metadata["tag"], "france_visa_info")
+        self.assertEqual(metadata["source"], "other.pdf")
+        self.assertFalse(metadata[f"linked_document:{other.id}"])
+
+        # 연결 문서의 태그가 바뀌면 연결 태그도 다시 계산
+        with self.captureOnCommitCallbacks(execute=True):
+            other.topic = "insurance"
+            other.save()
+        metadata = self.collection.get(ids=["kept-1"])["metadatas"][0]
+        self.assertFalse(metadata["linked_tag:france_visa_info"])
+        self.assertTrue(metadata["linked_tag:france_insurance_info"])
+        self.assertEqual(self.collection.get(ids=["canonical-0"])["metadatas"][0]["tag"], "france_insurance_info")
+
+        # 연결 문서가 삭제되면 연결 해제
+        other_id = other.id
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertNotIn("canonical-0", self.collection.get()["ids"])
+        metadata = self.collection.get(ids=["kept-1"])["metadatas"][0]
+        self.assertFalse(metadata[f"linked_document:{other_id}"])
+        self.assertFalse(metadata["linked_tag:france_insurance_info"])
+
+    def test_reconcile_purges_orphans(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        self.removed.delete()  # 커밋 훅이 실행되지 않아 청크가 남은 상태
+        call_command('reconcile_vectors', stdout=StringIO())
+        self.assertEqual(self.collection.get()["ids"], ["kept-0"])
+
+class WhitespaceTokenizer:
+    """테스트용 공백 단위 토크나이저"""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+class StructuredPDFChunkerTestCase(TestCase):
+    """구조 인식 PDF 청커 테스트"""
+
+    def setUp(self):
+        self.doc = fitz.open()
+        page = self.doc.new_page()
+        page.insert_text((72, 72), "Visa Guide", fontsize=20)
+        page.insert_text((72, 110), "Tourist Visa", fontsize=15)
+        y = 140
+        for i in range(6):
+            page.insert_text((72, y), f"tourist visa body line {i} with some words", fontsize=11)
+            y += 30
+        page = self.doc.new_page()
+        page.insert_text((72, 72), "Work Visa", fontsize=15)
+        page.insert_text((72, 110), "work visa requires a sponsor letter", fontsize=11)
+
+    def tearDown(self):
+        self.doc.close()
+
+    def test_sections_and_pages(self):
+        """제목 기준 분할 및 섹션/페이지 메타데이터"""
+        chunker = StructuredPDFChunker(WhitespaceTokenizer(), max_tokens=200, min_tokens=5)
+        chunks = chunker.chunk_document(self.doc)
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0].section, "Visa Guide > Tourist Visa")
+        self.assertEqual(chunks[0].page, 1)
+        self.assertEqual(chunks[1].section, "Visa Guide > Work Visa")
+        self.assertEqual(chunks[1].page, 2)
+        self.assertTrue(chunks[1].text.startswith("Work Visa"))
+
+    def test_max_tokens(self):
+        """청크 크기는 max_tokens를 넘지 않음"""
+        chunker = StructuredPDFChunker(WhitespaceTokenizer(), max_tokens=20, min_tokens=5, overlap_tokens=0)
+        chunks = chunker.chunk_document(self.doc)
+
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks:
+            self.assertLessEqual(chunk.tokens, 20)
+
+class ChunkDeduplicatorTestCase(TestCase):
+    """근사 중복 청크 제거 테스트"""
+
+    BOILERPLATE = (
+        "The embassy is not responsible for the accuracy of third party information. "
+        "Travellers should confirm entry requirements with the relevant authorities "
+        "before departure and keep copies of all travel documents. "
+        "Insurance must cover medical treatment and repatriation for the full length of stay. "
+        "Consular assistance is limited to nationals holding a valid passport."
+    )
+
+    def test_near_duplicate_linked_to_canonical(self):
+        """근사 중복 청크는 대표 청크에 태그로 연결"""
+        dedup = ChunkDeduplicator()
+        self.assertIsNone(dedup.check("a", self.BOILERPLATE, "france_visa_info"))
+
+        near = self.BOILERPLATE + " Page 3"
+        self.assertEqual(dedup.check("b", near, "germany_visa_info", document_id=7), "a")
+        dedup.commit()
+        self.assertEqual(dedup.linked_tags["a"], {"germany_visa_info"})
+        self.assertEqual(dedup.linked_documents["a"], {7})
+
+        report = dedup.report()
+        self.assertEqual(report["duplicates"], 1)
+        self.assertEqual(report["canonical_chunks"], 1)
+
+    def test_distinct_chunks_kept(self):
+        """서로 다른 청크는 모두 유지"""
+        dedup = ChunkDeduplicator()
+        self.assertIsNone(dedup.check("a", self.BOILERPLATE, "france_visa_info"))
+        self.assertIsNone(dedup.check("b", "Working holiday visas require proof of funds and a return ticket.", "japan_visa_info"))
+        dedup.commit()
+        self.assertEqual(dedup.report()["duplicates"], 0)
+
+    def test_failed_batch_not_registered(self):
+        """저장에 실패한 배치의 청크는 대표 청크로 등록되지 않음"""
+        dedup = ChunkDeduplicator()
+        self.assertIsNone(dedup.check("a", self.BOILERPLATE, "france_visa_info"))
+        dedup.discard()
+
+        near = self.BOILERPLATE + " Page 3"
+        self.assertIsNone(dedup.check("b", near, "germany_visa_info"))
+        dedup.commit()
+        self.assertNotIn("a", dedup.fingerprints)
+        self.assertEqual(dict(dedup.linked_tags), {})
+        self.assertEqual(dedup.report()["canonical_chunks"], 1)
+
+class OfflineEncoding(WhitespaceTokenizer):
+    """tiktoken 인코딩 대신 쓰는 테스트용 인코딩 (인코딩 파일을 내려받지 않음)"""
+
+    def encode(self, text, **kwargs):
+        return text.split()
+
+    def encode_ordinary(self, text):
+        return self.encode(text)
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+@override_settings(JOB_WORKERS=0)
+class IngestRebuildTestCase(TestCase):
+    """대량 등록 문서가 전체 재색인(별칭 전환) 후에도 검색되는지"""
+
+    def setUp(self):
+        from benchmarks.fake_servers import FakeAIServer
+        from ai_services.rag import RAG
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.pdf_dir = os.path.join(self.tmp_dir.name, 'pdfs')
+        os.makedirs(self.pdf_dir)
+        pdf = fitz.open()
+        pdf.new_page().insert_text((72, 72), "Japan visa applications need a valid passport")
+        pdf.save(os.path.join(self.pdf_dir, 'japan_visa_info.pdf'))
+
+        server = FakeAIServer().start()
+        self.addCleanup(server.stop)
+        settings_override = override_settings(
+            **server.settings(),
+            OPENAI_API_KEY='test',
+            VECTOR_DB_PATH=os.path.join(self.tmp_dir.name, 'vector_db'),
+            VECTOR_COLLECTION_NAME='test-rebuild',
+            INGEST_UPLOAD_DIR=os.path.join(self.tmp_dir.name, 'uploads')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for target in ('tiktoken.get_encoding', 'tiktoken.encoding_for_model'):
+            patcher = mock.patch(target, return_value=OfflineEncoding())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.rag = RAG()
+        patcher = mock.patch('chat.views.get_rag', return_value=self.rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ingested_documents_survive_rebuild(self):
+        from core.tasks import build_pdf_index
+        from documents.tasks import source_path
+
+        build_pdf_index(self.pdf_dir, rag=self.rag)
+
+        text = "Canada working holiday insurance must cover the whole stay"
+        response = self.client.post(reverse('bulk_ingest_documents'), data=json.dumps({'documents': [
+            {'title': 'Canada Insurance', 'country': 'Canada', 'topic': 'insurance', 'text': text},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(jobs.work(), 1)
+        document_id = Document.objects.get(title='Canada Insurance').id
+
+        result = build_pdf_index(self.pdf_dir, rag=self.rag, gc_grace_hours=0)
+        self.assertTrue(result['switched'])
+        self.assertNotEqual(result['collection'], result['previous'])
+        self.assertEqual(result['ingested']['indexed'], 1)
+
+        hits = self.rag.vectorstore.similarity_search(text, k=1, filter={'country': 'canada'})
+        self.assertEqual([hit.metadata['document_id'] for hit in hits], [document_id])
+
+        # 문서를 삭제하면 보관 중인 원문도 삭제되어 다음 재색인에서 빠짐
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.get(id=document_id).delete()
+        self.assertFalse(os.path.exists(source_path(document_id, 'text')))
+
+    def test_failed_rebuild_removes_partial_collection(self):
+        """재색인이 도중에 실패하면 새 버전 컬렉션을 남기지 않음"""
+        from core.tasks import build_pdf_index
+
+        build_pdf_index(self.pdf_dir, rag=self.rag)
+        collections = sorted(c.name for c in self.rag.client.list_collections())
+
+        with mock.patch('documents.tasks.index_ingested_documents', side_effect=RuntimeError('embedding failed')):
+            with self.assertRaises(RuntimeError):
+                build_pdf_index(self.pdf_dir, rag=self.rag)
+        self.assertEqual(sorted(c.name for c in self.rag.client.list_collections()), collections)
+
+    def test_deleted_document_does_not_shift_items(self):
+        """색인 전에 삭제된 문서는 건너뛰고, 다음 항목은 자기 문서로 색인"""
+        from documents.tasks import source_path
+
+        response = self.client.post(reverse('bulk_ingest_documents'), data=json.dumps({'documents': [
+            {'title': 'Deleted', 'country': 'Japan', 'topic': 'visa', 'text': 'Deleted before indexing'},
+            {'title': 'Kept', 'country': 'Canada', 'topic': 'insurance', 'text': 'Canada insurance rules'},
+        ]}), content_type='application/json')
+        job = Job.objects.get(id=response.json()['job_id'])
+        kept = Document.objects.get(title='Kept')
+        self.assertEqual([item['document_id'] for item in job.payload['items']],
+                         [Document.objects.get(title='Deleted').id, kept.id])
+
+        Document.objects.filter(title='Deleted').delete()
+        self.assertEqual(jobs.work(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.result['indexed'], job.result['skipped']), (1, 1))
+        self.assertTrue(os.path.exists(source_path(kept.id, 'text')))
+
+        hits = self.rag.vectorstore.similarity_search('Canada insurance rules', k=1)
+        self.assertEqual(hits[0].metadata['document_id'], kept.id)
+        self.assertEqual(hits[0].metadata['country'], 'canada')
+
+class QueryPlanTestCase(TestCase):
+    """히스토리/필터 조회가 복합 인덱스를 사용하는지 확인 (MySQL, SQLite)"""
+
+    def setUp(self):
+        self.conversation = Conversation.objects.create(
+            session_id="plan_session",
+            country="japan",
+            topic="visa"
+        )
+        for i in range(3):
+            Message.objects.create(conversation=self.conversation, role="user", content=f"message {i}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{connection.vendor} plan: {plan}")
+
+    def test_history_uses_composite_index(self):
+        """대화별 시간순 히스토리 조회"""
+        queryset = self.conversation.messages.order_by('created_at', 'id')
+        self.assertUsesIndex(queryset, 'msg_conv_history_idx')
+
+    def test_history_tail_is_covered(self):
+        """role/created_at 만 읽는 조회는 커버링 인덱스로 처리"""
+        queryset = self.conversation.messages.order_by('created_at').values_list('id', 'role', 'created_at')
+        self.assertUsesIndex(queryset, 'msg_conv_history_idx')
+        if connection.vendor == 'sqlite':
+            self.assertIn('COVERING INDEX msg_conv_history_idx', queryset.explain())
+
+    def test_conversation_country_topic_index(self):
+        """국가/주제 조건 대화 조회"""
+        queryset = Conversation.objects.filter(country="japan", topic="visa")
+        self.assertUsesIndex(queryset, 'conv_country_topic_idx')
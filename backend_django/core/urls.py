@@ -3,8 +3,16 @@ from django.urls import path
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
+    path('health/db/', views.db_health, name='db_health'),
     path('', views.app_info, name='app_info'),
     path('countries/', views.countries, name='countries'),
     path('topics/', views.topics, name='topics'),
     path('sources/', views.sources, name='sources'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/cancel/', views.cancel_job, name='cancel_job'),
+    path('usage/summary/', views.usage_summary, name='usage_summary'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/toggle/', views.profiling_toggle, name='profiling_toggle'),
+    path('profiles/<slug:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('profiles/<slug:profile_id>/stacks/', views.profile_stacks, name='profile_stacks'),
 ]
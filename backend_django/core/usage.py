@@ -0,0 +1,200 @@
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDate
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# 요청 중에 발생한 호출 기록 (미들웨어가 요청마다 만들고, 뷰가 대화와 함께 저장)
+_ledger: contextvars.ContextVar[Optional[List['UsageEntry']]] = contextvars.ContextVar('usage_ledger', default=None)
+
+
+class UsageEntry:
+    """저장 전 호출 기록 한 건"""
+
+    __slots__ = ('stage', 'provider', 'model', 'prompt_tokens', 'completion_tokens', 'characters', 'latency', 'success')
+
+    def __init__(self, stage: str, provider: str, model: str):
+        self.stage = stage
+        self.provider = provider
+        self.model = model
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.characters = 0
+        self.latency = 0.0
+        self.success = True
+
+    @property
+    def cost(self) -> Decimal:
+        return estimate_cost(self.model, self.prompt_tokens, self.completion_tokens, self.characters)
+
+
+def estimate_cost(model: str, prompt_tokens: int = 0, completion_tokens: int = 0, characters: int = 0) -> Decimal:
+    """LLM_PRICING (100만 토큰/문자당 USD) 기준 비용 추정, 가격표에 없는 모델은 0"""
+    pricing = settings.LLM_PRICING.get(model)
+    if not pricing:
+        return Decimal(0)
+    cost = (
+        prompt_tokens * pricing.get('input', 0)
+        + completion_tokens * pricing.get('output', 0)
+        + characters * pricing.get('characters', 0)
+    ) / 1_000_000
+    return Decimal(str(round(cost, 6)))
+
+
+@contextmanager
+def collect() -> Iterator[List[UsageEntry]]:
+    """이 블록 안의 호출 기록을 모음 (asyncio.run 안의 호출도 같은 목록에 기록됨)"""
+    entries: List[UsageEntry] = []
+    token = _ledger.set(entries)
+    try:
+        yield entries
+    finally:
+        _ledger.reset(token)
+
+
+def pending() -> List[UsageEntry]:
+    """현재 모으고 있는 호출 기록 (collect 밖이면 빈 목록)"""
+    entries = _ledger.get()
+    return entries if entries is not None else []
+
+
+@contextmanager
+def track(stage: str, provider: str, model: str) -> Iterator[UsageEntry]:
+    """외부 호출 한 건의 지연 시간 측정 및 기록, 토큰 수는 블록 안에서 채움
+
+        with usage.track('llm', 'openai', model) as entry:
+            response = ...
+            entry.prompt_tokens = response.usage.prompt_tokens
+    """
+    entry = UsageEntry(stage, provider, model)
+    started = time.perf_counter()
+    try:
+        yield entry
+    except BaseException:
+        entry.success = False
+        raise
+    finally:
+        entry.latency = time.perf_counter() - started
+        record(entry)
+
+
+def record(entry: UsageEntry):
+    """지표 갱신 후 요청 기록에 추가 (요청 밖에서는 바로 저장)"""
+    labels = {'stage': entry.stage, 'provider': entry.provider, 'model': entry.model}
+    cost = entry.cost
+    metrics.ai_call_duration.observe(entry.latency, **labels)
+    metrics.ai_calls.inc(success=str(entry.success).lower(), **labels)
+    if entry.prompt_tokens:
+        metrics.ai_tokens.inc(entry.prompt_tokens, kind='prompt', **labels)
+    if entry.completion_tokens:
+        metrics.ai_tokens.inc(entry.completion_tokens, kind='completion', **labels)
+    if entry.characters:
+        metrics.ai_characters.inc(entry.characters, **labels)
+    if cost:
+        metrics.ai_cost.inc(float(cost), **labels)
+
+    entries = _ledger.get()
+    if entries is not None:
+        entries.append(entry)
+        return
+
+    # 이벤트 루프 안에서는 ORM 을 호출할 수 없으므로 지표만 남김
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        save([entry])
+    else:
+        logger.debug(f"Usage not persisted outside a request: {entry.stage} {entry.provider}/{entry.model}")
+
+
+def build_records(entries: List[UsageEntry], conversation=None, country: Optional[str] = None, topic: Optional[str] = None):
+    from .models import UsageRecord
+
+    return [
+        UsageRecord(
+            conversation=conversation,
+            country=country,
+            topic=topic,
+            stage=entry.stage,
+            provider=entry.provider,
+            model=entry.model,
+            prompt_tokens=entry.prompt_tokens,
+            completion_tokens=entry.completion_tokens,
+            characters=entry.characters,
+            latency_ms=round(entry.latency * 1000, 2),
+            cost=entry.cost,
+            success=entry.success,
+        )
+        for entry in entries
+    ]
+
+
+def save(entries: List[UsageEntry], conversation=None, country: Optional[str] = None, topic: Optional[str] = None):
+    """호출 기록을 단일 bulk INSERT 로 저장하고 목록을 비움"""
+    from .models import UsageRecord
+
+    if not entries or not settings.USAGE_LEDGER_ENABLED:
+        entries.clear()
+        return
+    try:
+        UsageRecord.objects.bulk_create(build_records(entries, conversation, country, topic))
+    except Exception as e:
+        logger.error(f"Failed to save usage records: {e}")
+    finally:
+        entries.clear()
+
+
+def flush(entries: List[UsageEntry], batch_size: int = 500):
+    """지금까지 모인 호출 기록을 batch_size 건씩 bulk INSERT 로 저장
+
+    이벤트 루프나 다른 스레드가 계속 기록을 추가하는 중에도 호출할 수 있다.
+    (호출 시점까지의 기록만 저장하고 목록 앞에서 제거)
+    """
+    count = len(entries)
+    for start in range(0, count, batch_size):
+        save(entries[start:min(start + batch_size, count)])
+    del entries[:count]
+
+
+# 집계 기준 -> GROUP BY 컬럼
+SUMMARY_GROUPS = {
+    'day': ('day',),
+    'conversation': ('conversation_id',),
+    'country_topic': ('country', 'topic'),
+    'provider': ('stage', 'provider', 'model'),
+}
+
+
+def summarize(queryset, group_by: str = 'day'):
+    """사용량 집계 (호출 수, 토큰, 문자 수, 비용, 평균 지연 시간), 비용이 큰 순서"""
+    if group_by not in SUMMARY_GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(SUMMARY_GROUPS)}")
+    if group_by == 'day':
+        queryset = queryset.annotate(day=TruncDate('created_at'))
+
+    rows = (
+        queryset.values(*SUMMARY_GROUPS[group_by])
+        .annotate(
+            calls=Count('id'),
+            total_prompt_tokens=Sum('prompt_tokens'),
+            total_completion_tokens=Sum('completion_tokens'),
+            total_characters=Sum('characters'),
+            total_cost=Sum('cost'),
+            avg_latency_ms=Avg('latency_ms'),
+        )
+        .order_by('-total_cost', *SUMMARY_GROUPS[group_by])
+    )
+    return [
+        {**row, 'total_cost': float(row['total_cost'] or 0), 'avg_latency_ms': round(row['avg_latency_ms'] or 0, 2)}
+        for row in rows
+    ]
@@ -0,0 +1,106 @@
+import os
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# 스레드별 현재 트랜잭션의 대기 중인 벡터 DB 변경
+_local = threading.local()
+
+
+def chunk_metadata(document) -> Dict[str, Any]:
+    """문서 행에서 파생되는 청크 메타데이터 (검색 필터에 사용)"""
+    from ai_services.rag import RAG
+
+    country, doc_type = RAG.normalize_filters(document.country, document.topic)
+    return {
+        "country": country,
+        "document_type": doc_type,
+        "tag": f"{country}_{doc_type}",
+        "source": document.source or document.title,
+    }
+
+
+def documents_chunk_metadata(document_ids) -> Dict[int, Dict[str, Any]]:
+    """존재하는 문서들의 청크 메타데이터 (대표 청크의 소유권 이전/연결 태그 재계산에 사용)"""
+    from .models import Document
+
+    return {document.id: chunk_metadata(document) for document in Document.objects.filter(id__in=document_ids)}
+
+
+def get_live_collection():
+    """검색에 사용 중인 컬렉션 (벡터 DB가 아직 없으면 None)"""
+    from ai_services.vector_index import get_client, resolve_collection
+
+    persist_directory = os.path.abspath(settings.VECTOR_DB_PATH)
+    if not os.path.exists(os.path.join(persist_directory, 'chroma.sqlite3')):
+        return None
+
+    # 요청마다 새 클라이언트를 만들지 않고 RAG 와 같은 클라이언트 사용
+    client = get_client(persist_directory)
+    try:
+        return client.get_collection(resolve_collection(persist_directory, settings.VECTOR_COLLECTION_NAME))
+    except Exception:
+        return None
+
+
+def flush(batch: Dict[str, Any]):
+    """모아 둔 삭제/갱신을 벡터 DB에 반영 (실패 시 reconcile_vectors 로 정리)"""
+    from ai_services.vector_index import delete_document_chunks, update_document_chunks
+
+    batch['flushed'] = True
+    if not batch['delete'] and not batch['update']:
+        return
+    try:
+        collection = get_live_collection()
+        if collection is None:
+            return
+
+        batch_size = settings.VECTOR_SYNC_BATCH_SIZE
+        if batch['delete']:
+            deleted = delete_document_chunks(collection, sorted(batch['delete']), documents_chunk_metadata, batch_size)
+            logger.info(f"Deleted {deleted} chunks of {len(batch['delete'])} documents")
+        for document_id, fields in batch['update'].items():
+            if document_id not in batch['delete']:
+                update_document_chunks(collection, document_id, fields, documents_chunk_metadata, batch_size)
+    except Exception as e:
+        logger.error(f"Vector store sync failed (run reconcile_vectors): {e}")
+
+
+def _current_batch() -> Optional[Dict[str, Any]]:
+    """현재 트랜잭션의 배치 (트랜잭션 밖이면 None)"""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+
+    # 커밋/롤백 시 run_on_commit 목록이 새로 만들어지므로 목록이 바뀌었거나
+    # 이미 반영된 배치이면 새 배치를 만든다
+    state = getattr(_local, 'state', None)
+    if state is None or state['hooks'] is not connection.run_on_commit or state['batch'].get('flushed'):
+        batch = {'delete': set(), 'update': {}}
+        transaction.on_commit(lambda: flush(batch))
+        state = _local.state = {'hooks': connection.run_on_commit, 'batch': batch}
+    return state['batch']
+
+
+def schedule_delete(document_id: int):
+    """문서 삭제를 커밋 후 벡터 DB에 반영 (같은 트랜잭션의 삭제는 한 번에 처리)"""
+    batch = _current_batch()
+    if batch is None:
+        flush({'delete': {document_id}, 'update': {}})
+    else:
+        batch['delete'].add(document_id)
+
+
+def schedule_update(document):
+    """문서 메타데이터 변경을 커밋 후 해당 청크에 반영"""
+    fields = chunk_metadata(document)
+    batch = _current_batch()
+    if batch is None:
+        flush({'delete': set(), 'update': {document.id: fields}})
+    else:
+        batch['update'][document.id] = fields
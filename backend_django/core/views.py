@@ -1,6 +1,19 @@
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotModified
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from .catalog import get_catalog
+from . import db_metrics, metrics, profiling, usage
+from .models import Job, UsageRecord
+from .jobs import cancel
+from .serializers import JobSerializer
+import time
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +23,32 @@ def health_check(request):
     """헬스 체크"""
     return Response({"status": "healthy"})
 
+@api_view(['GET'])
+def db_health(request):
+    """DB 연결 상태 및 연결 재사용 통계"""
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception as e:
+        logger.error(f"Database health check failed: {e}")
+        return Response(
+            {"status": "unhealthy", "error": str(e), **db_metrics.snapshot()},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    return Response({
+        "status": "healthy",
+        "ping_ms": round((time.perf_counter() - started) * 1000, 2),
+        **db_metrics.snapshot()
+    })
+
+def prometheus_metrics(request):
+    """Prometheus 수집용 지표 (단계별/요청별 소요 시간 히스토그램, DB 연결 통계)"""
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {settings.METRICS_TOKEN}":
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @api_view(['GET'])
 def app_info(request):
     """앱 정보"""
@@ -19,37 +58,25 @@ def app_info(request):
         "status": "running"
     })
 
+def _catalog_response(request, name):
+    """카탈로그 목록 응답 (ETag, Cache-Control 포함, 변경 없으면 304)"""
+    catalog = get_catalog()
+    etag = catalog['etags'][name]
+    
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = Response(catalog[name], status=status.HTTP_200_OK)
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.CATALOG_MAX_AGE}'
+    return response
+
 @api_view(['GET'])
 def countries(request):
     """지원 국가 목록"""
     try:
-        from .models import COUNTRIES, Document
-        
-        # DB에서 실제 등록된 국가들 가져오기
-        db_countries = Document.objects.values_list('country', flat=True).distinct()
-        
-        # 기본 국가 목록 (DB에 데이터가 없는 경우)
-        default_countries = [
-            "America", "Australia", "Austria", "Canada", "China", 
-            "France", "Germany", "Italy", "Japan", "New Zealand", 
-            "Philippines", "Singapore", "UK"
-        ]
-        
-        # DB에 데이터가 있으면 그것을 사용, 없으면 기본값 사용
-        if db_countries:
-            # COUNTRIES 상수에서 일치하는 국가들만 필터링
-            available_countries = []
-            for country in COUNTRIES:
-                if country['name_en'] in db_countries:
-                    available_countries.append(country['name_en'])
-            
-            # 만약 매칭되는 것이 없다면 DB의 모든 국가 반환
-            if not available_countries:
-                available_countries = list(db_countries)
-        else:
-            available_countries = default_countries
-        
-        return Response(available_countries, status=status.HTTP_200_OK)
+        return _catalog_response(request, 'countries')
         
     except Exception as e:
         logger.error(f"Error fetching countries: {e}")
@@ -63,35 +90,7 @@ def countries(request):
 def topics(request):
     """지원 주제 목록"""
     try:
-        from .models import TOPICS, Document
-        
-        # DB에서 실제 등록된 토픽들 가져오기
-        db_topics = Document.objects.values_list('topic', flat=True).distinct()
-        
-        # 기본 토픽 목록
-        default_topics = ["visa", "insurance", "safety", "immigration"]
-        
-        # DB에 데이터가 있으면 그것을 사용, 없으면 기본값 사용
-        if db_topics:
-            # _info 접미사 제거 및 정규화
-            normalized_topics = []
-            for topic in db_topics:
-                if topic.endswith('_info'):
-                    normalized_topic = topic.replace('_info', '')
-                    if normalized_topic == 'immigration_regulations':
-                        normalized_topics.append('immigration')
-                    elif normalized_topic == 'immigration_safety':
-                        normalized_topics.append('safety')
-                    else:
-                        normalized_topics.append(normalized_topic)
-                else:
-                    normalized_topics.append(topic)
-            
-            available_topics = list(set(normalized_topics))
-        else:
-            available_topics = default_topics
-        
-        return Response(available_topics, status=status.HTTP_200_OK)
+        return _catalog_response(request, 'topics')
         
     except Exception as e:
         logger.error(f"Error fetching topics: {e}")
@@ -102,21 +101,132 @@ def topics(request):
 def sources(request):
     """문서 출처 목록"""
     try:
-        from .models import Document
+        return _catalog_response(request, 'sources')
         
-        db_sources = Document.objects.exclude(
-            source__isnull=True
-        ).exclude(
-            source=''
-        ).values_list('source', flat=True).distinct()
-        
-        # 기본 출처 목록 (DB에 데이터가 없는 경우)
-        default_sources = ["Government", "Embassy", "Immigration Department"]
+    except Exception as e:
+        logger.error(f"Error fetching sources: {e}")
+        return Response(["Government", "Embassy", "Immigration Department"], status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+def job_status(request, job_id):
+    """백그라운드 작업 상태 및 진행률 조회"""
+    try:
+        job = Job.objects.defer('payload').get(id=job_id)
+        return Response(JobSerializer(job).data)
         
-        sources = list(db_sources) if db_sources else default_sources
+    except Job.DoesNotExist:
+        return Response(
+            {'error': 'Job not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+@api_view(['POST'])
+def cancel_job(request, job_id):
+    """백그라운드 작업 취소 (실행 중이면 다음 진행 보고 시점에 중단)"""
+    try:
+        job = Job.objects.defer('payload').get(id=job_id)
+    except Job.DoesNotExist:
+        return Response(
+            {'error': 'Job not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if job.status in Job.FINISHED_STATUSES:
+        return Response(
+            {'error': f'Job already {job.status}'}, 
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    job = cancel(job)
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def usage_summary(request):
+    """LLM/임베딩/번역 사용량 및 추정 비용 집계 (관리자 전용)
+
+    - group_by: day, conversation, country_topic, provider (기본 day)
+    - days: 최근 며칠 (기본 7), stage/provider: 필터
+    """
+    try:
+        days = int(request.query_params.get('days', 7))
+        queryset = UsageRecord.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        for field in ('stage', 'provider'):
+            if request.query_params.get(field):
+                queryset = queryset.filter(**{field: request.query_params[field]})
         
-        return Response(sources, status=status.HTTP_200_OK)
+        group_by = request.query_params.get('group_by', 'day')
+        return Response({
+            'group_by': group_by,
+            'days': days,
+            'results': usage.summarize(queryset, group_by)
+        })
         
-    except Exception as e:
-        logger.error(f"Error fetching sources: {e}")
-        return Response(["Government", "Embassy", "Immigration Department"], status=status.HTTP_200_OK)
\ No newline at end of file
+    except ValueError as e:
+        return Response(
+            {'error': str(e)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiles(request):
+    """저장된 요청 프로파일 목록과 현재 관리자 샘플링 설정 (관리자 전용)"""
+    try:
+        limit = int(request.query_params.get('limit', 50))
+    except ValueError:
+        return Response(
+            {'error': 'limit must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({
+        'enabled': settings.PROFILING_ENABLED,
+        'toggle': profiling.get_toggle(),
+        'results': profiling.list_profiles(limit)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_detail(request, profile_id):
+    """프로파일 메타데이터와 단계별 메모리 할당 (관리자 전용)"""
+    content = profiling.read_profile(profile_id)
+    if content is None:
+        return Response(
+            {'error': 'Profile not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(json.loads(content))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_stacks(request, profile_id):
+    """flamegraph.pl / speedscope 용 folded 스택 (관리자 전용)"""
+    content = profiling.read_profile(profile_id, '.folded')
+    if content is None:
+        return Response(
+            {'error': 'Profile not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    response = HttpResponse(content, content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{profile_id}.folded"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def profiling_toggle(request):
+    """샘플링 프로파일 켜기/끄기 (관리자 전용)
+
+    - sample_rate: 0~1 (0 이면 해제), memory: tracemalloc 사용, minutes: 자동 해제까지 시간 (기본 30)
+    """
+    try:
+        toggle = profiling.set_toggle(
+            float(request.data.get('sample_rate', 0)),
+            memory=bool(request.data.get('memory', False)),
+            minutes=float(request.data.get('minutes', 30))
+        )
+    except (TypeError, ValueError) as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({'enabled': settings.PROFILING_ENABLED, 'toggle': toggle})
@@ -0,0 +1,141 @@
+import os
+import shutil
+import logging
+from datetime import datetime
+from typing import Any, Dict
+
+from django.conf import settings
+
+from core.jobs import JobCancelled, register, update_progress
+from core.models import Document
+from core.tasks import VECTOR_INDEX_LOCK
+from core.vector_sync import chunk_metadata
+
+logger = logging.getLogger(__name__)
+
+INDEX_DOCUMENTS = 'index_documents'
+SOURCE_FORMATS = ('pdf', 'text')
+
+
+def upload_dir(job_id: int) -> str:
+    """대량 등록 작업의 원문 임시 저장 경로"""
+    return os.path.join(settings.INGEST_UPLOAD_DIR, str(job_id))
+
+
+def source_path(document_id: int, fmt: str) -> str:
+    """색인을 마친 대량 등록 문서의 원문 보관 경로 (전체 재색인 시 다시 임베딩)"""
+    extension = 'pdf' if fmt == 'pdf' else 'txt'
+    return os.path.join(settings.INGEST_UPLOAD_DIR, 'sources', f"{document_id}.{extension}")
+
+
+def remove_sources(document_id: int):
+    """문서 삭제 시 보관 중인 원문 삭제"""
+    for fmt in SOURCE_FORMATS:
+        try:
+            os.remove(source_path(document_id, fmt))
+        except FileNotFoundError:
+            pass
+
+
+def index_document_file(rag, vectorstore, document, path: str, fmt: str, batch_size: int, updated_at: str) -> int:
+    """원문 파일 하나를 청킹/임베딩하여 vectorstore 에 추가하고 청크 수 반환"""
+    base_metadata = {
+        **chunk_metadata(document),
+        "updated_at": updated_at,
+        "document_id": document.id,
+    }
+    if fmt == 'pdf':
+        chunks = 0
+        for batch_ids, batch_texts, batch_metadatas in rag.iter_pdf_batches(path, base_metadata, batch_size):
+            rag.add_texts(vectorstore, batch_texts, batch_metadatas, batch_ids)
+            chunks += len(batch_texts)
+        return chunks
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    added = rag.add_document(text, base_metadata, vectorstore=vectorstore)
+    if not added:
+        raise RuntimeError('embedding failed')
+    return added
+
+
+def index_ingested_documents(rag, vectorstore, batch_size: int, updated_at: str) -> Dict[str, Any]:
+    """원문을 보관 중인 대량 등록 문서를 모두 vectorstore 에 다시 색인 (전체 재색인용)
+
+    아직 색인 작업이 끝나지 않은 문서는 원문이 작업 디렉토리에 있으며, 작업이 재색인과
+    같은 잠금을 쓰므로 재색인이 끝난 뒤 새 컬렉션에 추가된다.
+    """
+    sources_dir = os.path.join(settings.INGEST_UPLOAD_DIR, 'sources')
+    document_ids = []
+    if os.path.isdir(sources_dir):
+        for name in os.listdir(sources_dir):
+            stem = name.split('.')[0]
+            if stem.isdigit():
+                document_ids.append(int(stem))
+    document_ids.sort()
+
+    indexed, failed, chunks = 0, [], 0
+    for i in range(0, len(document_ids), 500):
+        for document in Document.objects.filter(id__in=document_ids[i:i + 500]).order_by('id'):
+            fmt = 'pdf' if os.path.exists(source_path(document.id, 'pdf')) else 'text'
+            try:
+                chunks += index_document_file(
+                    rag, vectorstore, document, source_path(document.id, fmt), fmt, batch_size, updated_at
+                )
+                indexed += 1
+            except Exception as e:
+                logger.error(f"Error re-indexing ingested document {document.id}: {e}")
+                failed.append({'document_id': document.id, 'error': str(e)})
+
+    return {'indexed': indexed, 'failed': failed, 'chunks': chunks}
+
+
+# 전체 재색인(index_pdfs)이 실행 중이면 새 컬렉션에서 빠지지 않도록 끝날 때까지 대기
+@register(INDEX_DOCUMENTS, lock=VECTOR_INDEX_LOCK)
+def index_documents(job):
+    """대량 등록된 문서를 청킹/임베딩하여 벡터 DB에 추가"""
+    from chat.views import get_rag
+
+    rag = get_rag()
+    vectorstore = rag.vectorstore
+    batch_size = settings.INGEST_EMBED_BATCH_SIZE
+    updated_at = datetime.now().isoformat()
+
+    items = job.payload.get('items', [])
+    # 항목마다 기록된 문서 id 로 매핑 (색인 전에 삭제된 문서는 건너뜀)
+    documents = job.documents.in_bulk([item['document_id'] for item in items])
+
+    # 재시도 시에는 이미 처리한 문서를 건너뜀 (진행률 = 처리한 문서 수)
+    start = job.progress
+
+    indexed, failed, skipped, chunks = 0, [], 0, 0
+    for position, item in enumerate(items, start=1):
+        if position <= start:
+            continue
+        path = os.path.join(upload_dir(job.id), item['file'])
+        document = documents.get(item['document_id'])
+
+        if document is None:
+            skipped += 1
+        else:
+            try:
+                chunks += index_document_file(rag, vectorstore, document, path, item['format'], batch_size, updated_at)
+                # 전체 재색인 때 다시 임베딩하도록 원문 보관
+                target = source_path(document.id, item['format'])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(path, target)
+                indexed += 1
+            except Exception as e:
+                logger.error(f"Error indexing document {document.id}: {e}")
+                failed.append({'document_id': document.id, 'error': str(e)})
+
+        try:
+            update_progress(job, position)
+        except JobCancelled:
+            shutil.rmtree(upload_dir(job.id), ignore_errors=True)
+            raise
+
+    # 색인에 실패한 원문 파일 정리
+    shutil.rmtree(upload_dir(job.id), ignore_errors=True)
+
+    return {'indexed': indexed, 'failed': failed, 'skipped': skipped, 'chunks': chunks, 'resumed_from': start}
@@ -5,5 +5,6 @@ urlpatterns = [
     path('documents/', views.list_documents, name='list_documents'),
     path('documents/<int:document_id>/', views.get_document, name='get_document'),
     path('documents/upload/', views.upload_document, name='upload_document'),
+    path('documents/bulk/', views.bulk_ingest_documents, name='bulk_ingest_documents'),
     path('documents/<int:document_id>/delete/', views.delete_document, name='delete_document'),
 ]
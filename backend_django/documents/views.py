@@ -1,50 +1,85 @@
+import os
+import json
+import base64
+import binascii
+import shutil
 import logging
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
 from django.http import JsonResponse
+from django.urls import reverse
 from core.models import Document
-from core.serializers import DocumentSerializer
+from core.serializers import DocumentSerializer, BulkDocumentIngestSerializer
+from core.cache import documents_cache_key, bump_documents_version
+from core.jobs import enqueue
+from .tasks import INDEX_DOCUMENTS, upload_dir
+from core.pagination import encode_cursor, decode_cursor, CURSOR_ERRORS
 
 logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
 def list_documents(request):
-    """문서 목록 조회"""
+    """문서 목록 조회 (created_at, id 기준 keyset 페이지네이션)"""
     try:
-        # 쿼리 파라미터
-        country = request.GET.get('country')
-        topic = request.GET.get('topic')
-        source = request.GET.get('source')
+        # 쿼리 파라미터 (정규화 컬럼과 같은 방식으로 소문자 변환)
+        country = Document.normalize_key(request.GET.get('country'))
+        topic = Document.normalize_key(request.GET.get('topic'))
+        source = Document.normalize_key(request.GET.get('source'))
+        cursor = request.GET.get('cursor')
+        
+        try:
+            page_size = max(1, min(int(request.GET.get('page_size', 20)), 100))
+            cursor_key = decode_cursor(cursor) if cursor else None
+        except CURSOR_ERRORS:
+            return Response(
+                {'error': 'Invalid cursor or page_size'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # 기본 쿼리셋
         queryset = Document.objects.all()
         
-        # 필터 적용
+        # 필터 적용 (인덱스가 있는 정규화 컬럼 사용)
         if country:
-            queryset = queryset.filter(country__iexact=country)
+            queryset = queryset.filter(country_key=country)
         if topic:
-            queryset = queryset.filter(topic__iexact=topic)
+            queryset = queryset.filter(topic_key=topic)
         if source:
-            queryset = queryset.filter(source__iexact=source)
+            queryset = queryset.filter(source_key=source)
         
-        # 페이지네이션 (간단한 구현)
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        start = (page - 1) * page_size
-        end = start + page_size
+        # 필터별 전체 개수는 공용 캐시일 때만 캐시 (문서 변경 시 버전이 바뀌어 무효화)
+        if settings.DOCUMENT_COUNT_CACHE_TIMEOUT:
+            count_key = documents_cache_key('count', country, topic, source)
+            total_count = cache.get_or_set(count_key, queryset.count, settings.DOCUMENT_COUNT_CACHE_TIMEOUT)
+        else:
+            total_count = queryset.count()
         
-        documents = queryset.order_by('-created_at')[start:end]
-        total_count = queryset.count()
+        # 커서 이후 페이지 (OFFSET 없이 인덱스 범위 탐색)
+        if cursor_key:
+            created_at, document_id = cursor_key
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=document_id)
+            )
+        documents = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        
+        next_cursor = None
+        if len(documents) > page_size:
+            documents = documents[:page_size]
+            next_cursor = encode_cursor(documents[-1].created_at, documents[-1].id)
         
         serializer = DocumentSerializer(documents, many=True)
         
         return Response({
             'results': serializer.data,
             'count': total_count,
-            'page': page,
             'page_size': page_size,
-            'total_pages': (total_count + page_size - 1) // page_size
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -94,6 +129,111 @@ def upload_document(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _read_payload(item, files):
+    """대량 등록 항목의 원문을 (형식, 바이트)로 반환"""
+    if item.get('text'):
+        return 'text', item['text'].encode('utf-8')
+    if item.get('pdf_base64'):
+        content = base64.b64decode(item['pdf_base64'], validate=True)
+    else:
+        upload = files.get(item['file'])
+        if upload is None:
+            raise ValueError(f"Missing file field: {item['file']}")
+        content = upload.read()
+    if not content.startswith(b'%PDF'):
+        raise ValueError(f"Not a PDF document: {item['title']}")
+    return 'pdf', content
+
+@api_view(['POST'])
+@parser_classes([JSONParser, MultiPartParser])
+def bulk_ingest_documents(request):
+    """문서 대량 등록 (DB 일괄 저장 후 벡터 인덱싱은 백그라운드 작업으로 처리)
+    
+    JSON: {"documents": [{title, country, topic, source, url, text | pdf_base64}, ...]}
+    multipart: documents 필드에 같은 JSON 문자열, 항목의 file 에 PDF 파일 필드 이름 지정
+    """
+    data = request.data
+    if request.content_type and request.content_type.startswith('multipart/'):
+        try:
+            data = {'documents': json.loads(request.data.get('documents') or '[]')}
+        except json.JSONDecodeError:
+            return Response(
+                {'error': 'documents must be a JSON array'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    serializer = BulkDocumentIngestSerializer(data=data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    entries = serializer.validated_data['documents']
+    
+    # 원문 검증 (DB 기록 전에 실패시킴)
+    try:
+        payloads = [_read_payload(entry, request.FILES) for entry in entries]
+    except (ValueError, binascii.Error) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    items = [
+        {'file': f"{index:05d}.{'pdf' if fmt == 'pdf' else 'txt'}", 'format': fmt}
+        for index, (fmt, _) in enumerate(payloads)
+    ]
+    
+    job = None
+    try:
+        with transaction.atomic():
+            # 워커 실행은 커밋 이후로 예약됨
+            job = enqueue(INDEX_DOCUMENTS, payload={'items': items}, total=len(items))
+            
+            # 원문은 DB 대신 파일로 전달
+            target_dir = upload_dir(job.id)
+            os.makedirs(target_dir, exist_ok=True)
+            for item, (_, content) in zip(items, payloads):
+                with open(os.path.join(target_dir, item['file']), 'wb') as f:
+                    f.write(content)
+            
+            documents = []
+            for entry in entries:
+                document = Document(
+                    title=entry['title'],
+                    url=entry.get('url'),
+                    country=entry['country'],
+                    topic=entry['topic'],
+                    source=entry.get('source'),
+                    ingest_job=job
+                )
+                # bulk_create 는 save() 를 거치지 않으므로 직접 정규화
+                document.normalize_keys()
+                documents.append(document)
+            Document.objects.bulk_create(documents, batch_size=500)
+            
+            # 항목별 문서 id 를 payload 에 기록 (색인 전에 문서가 삭제되어도 다른 항목과 어긋나지 않음)
+            # bulk INSERT 가 id 를 돌려주지 않는 DB(MySQL)는 저장 순서대로 다시 조회
+            if not connection.features.can_return_rows_from_bulk_insert:
+                documents = list(job.documents.order_by('id'))
+            for item, document in zip(items, documents):
+                item['document_id'] = document.id
+            job.payload = {'items': items}
+            job.save(update_fields=['payload'])
+        
+        # bulk_create 는 post_save 시그널을 보내지 않음
+        bump_documents_version()
+        
+        return Response({
+            'job_id': job.id,
+            'status': job.status,
+            'documents': len(documents),
+            'status_url': reverse('job_status', args=[job.id])
+        }, status=status.HTTP_202_ACCEPTED)
+        
+    except Exception as e:
+        logger.error(f"Error ingesting documents: {str(e)}")
+        if job is not None:
+            shutil.rmtree(upload_dir(job.id), ignore_errors=True)
+        return Response(
+            {'error': str(e)}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['DELETE'])
 def delete_document(request, document_id):
     """문서 삭제"""
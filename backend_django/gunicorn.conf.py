@@ -0,0 +1,19 @@
+"""gunicorn 설정 (gunicorn config.wsgi 실행 시 자동으로 읽음)
+
+gthread 워커: 스레드마다 DB 영구 연결 하나를 CONN_MAX_AGE 동안 재사용하므로
+프로세스당 연결 수는 최대 threads 개이다.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'False').lower() == 'true'
+
+
+def post_fork(server, worker):
+    # preload_app 시 마스터에서 열린 연결을 자식 프로세스가 공유하지 않도록 닫음
+    from django.db import connections
+    connections.close_all()